@@ -29,37 +29,154 @@
 # you should -seriously- look at the Azure AD PowerSheell cmdlets for reporting
 # instead of using this bit of hackery
 #
+# With --tenant-id the report is built from Graph (signInActivity on the cached
+# users, optionally the M365 activity feed) and no exports are needed
+#
 ##############################################################
 
+import argparse
+import numpy as np
 import pandas as pd
 
-usersFile = 'export-users.csv'
-activityFile = 'export-activity.csv'
-outputFile = 'last-activity.csv'
+ACTIVITY_COLUMNS = ['Exchange Last Activity Date', 'OneDrive Last Activity Date', 'SharePoint Last Activity Date', 'Skype For Business Last Activity Date', 'Yammer Last Activity Date', 'Teams Last Activity Date']
+DEFAULT_LAST_ACTIVITY = pd.Timestamp('1970-01-01')   # users with no activity get an old date so something exists
+
+# users export (AzureAD -> users -> export) and activity export (AzureAD -> reports -> M365 active users -> 180 days -> export)
+USERS_NAME     = 'DisplayName'
+USERS_UPN      = 'UserPrincipalName'
+ACTIVITY_NAME  = 'Display Name'
+ACTIVITY_UPN   = 'User Principal Name'
+
+# per display name: latest activity plus enough to tell whether the name belongs to a single user - min / max of a
+# hash of the lower case UPNs (string min / max is pure python in groupby), the row count and the rows without a UPN.
+# all of it folds across chunks (see reduce_last_activity)
+NAME_STATS     = { 'LastActivity': 'max', 'firstUpn': 'min', 'lastUpn': 'max', 'rows': 'sum', 'blankRows': 'sum' }
+
+def activity_maps(activityFrame):
+    # last activity is the max over the per service dates - then one row per user (duplicates keep the latest)
+    activityFrame['LastActivity'] = activityFrame[ACTIVITY_COLUMNS].max(axis=1)
+    byUpn = None
+    upns = pd.Series(pd.NA, index=activityFrame.index, dtype='string')
+    # astype('string') - a chunk where every UPN is blank reads as float and has no .str
+    if ACTIVITY_UPN in activityFrame.columns:
+        upns = activityFrame[ACTIVITY_UPN].astype('string').str.lower()
+        byUpn = activityFrame.groupby(upns)['LastActivity'].max()
+    blank = upns.isna().values
+    hashes = pd.util.hash_pandas_object(upns, index=False).values
+    nameStats = pd.DataFrame({ 'LastActivity': activityFrame['LastActivity'].values,
+                               'firstUpn': np.where(blank, np.iinfo(np.uint64).max, hashes), 'lastUpn': np.where(blank, 0, hashes),
+                               'rows': 1, 'blankRows': blank.astype(int) }, index=activityFrame[ACTIVITY_NAME].values)
+    return byUpn, nameStats.groupby(level=0).agg(NAME_STATS)
+
+def name_map(nameStats):
+    # display name -> last activity, only for names that are one user in the activity export: every row has the same
+    # UPN, or there is a single row without one. "John Smith" twice is two people and neither gets the other's date
+    if nameStats is None:
+        return None
+    sameUpn = (nameStats['firstUpn'] == nameStats['lastUpn']) & (nameStats['blankRows'] == 0)
+    singleRow = (nameStats['rows'] == 1) & (nameStats['blankRows'] == 1)
+    return nameStats.loc[sameUpn | singleRow, 'LastActivity']
+
+def last_activity(activityFrame):
+    byUpn, nameStats = activity_maps(activityFrame)
+    return byUpn, name_map(nameStats)
+
+def add_last_activity(usersFrame, byUpn, byName, duplicateNames=None):
+    # join on UPN where both exports have one - display name only for users without a UPN (or for everyone when the
+    # activity export has no UPN column), and never for a name more than one user has. no per row python
+    # duplicateNames defaults to the names repeated in usersFrame - the chunked mode passes the ones over the whole export
+    lastActivity = pd.Series(pd.NaT, index=usersFrame.index, dtype='datetime64[ns]')
+    byNameRows = pd.Series(True, index=usersFrame.index).values
+    if byUpn is not None and USERS_UPN in usersFrame.columns:
+        upns = usersFrame[USERS_UPN].astype('string').str.lower()
+        lastActivity = upns.map(byUpn).astype('datetime64[ns]')
+        byNameRows = upns.isna().values
+    if duplicateNames is None:
+        duplicateNames = usersFrame.index[usersFrame.index.duplicated()]
+    byNameRows = byNameRows & ~usersFrame.index.isin(duplicateNames)
+    if byName is not None:
+        lastActivity[byNameRows] = usersFrame.index[byNameRows].map(byName)
+    usersFrame['LastActivity'] = lastActivity.fillna(DEFAULT_LAST_ACTIVITY)
+    return usersFrame
+
+def reduce_last_activity(parts):
+    # fold per chunk maps into one, keeping the latest per key (and the name stats per NAME_STATS)
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], pd.DataFrame):
+        return pd.concat(parts).groupby(level=0).agg(NAME_STATS)
+    return pd.concat(parts).groupby(level=0).max()
 
-# load users file (AzureAD -> users -> export), index with DisplayName
-usersFrame = pd.read_csv(usersFile, index_col='DisplayName')
+def last_activity_chunked(activityFile, chunksize):
+    # only the keys and the per service dates are read, everything else in the export is skipped
+    header = pd.read_csv(activityFile, nrows=0).columns
+    usecols = [col for col in [ACTIVITY_NAME, ACTIVITY_UPN] + ACTIVITY_COLUMNS if col in header]
+    dates = [col for col in ACTIVITY_COLUMNS if col in header]
+    upnParts, nameParts = [], []
+    pending = compacted = 0
+    for chunk in pd.read_csv(activityFile, usecols=usecols, parse_dates=dates, chunksize=chunksize):
+        chunkUpn, chunkName = activity_maps(chunk)
+        upnParts.append(chunkUpn)
+        nameParts.append(chunkName)
+        pending += len(chunk)
+        # compact once the pending chunks outgrow the map so far - keeps memory bounded without regrouping every chunk
+        if pending > max(compacted, chunksize * 4):
+            upnParts = [reduce_last_activity(upnParts)]
+            nameParts = [reduce_last_activity(nameParts)]
+            compacted, pending = len(nameParts[0]), 0
+    return reduce_last_activity(upnParts), name_map(reduce_last_activity(nameParts))
 
-# load activity file (AzureAD -> reports -> M365 active users -> 180 days -> export
-activityFrame = pd.read_csv(activityFile, index_col='Display Name', parse_dates=['Exchange Last Activity Date', 'OneDrive Last Activity Date', 'SharePoint Last Activity Date', 'Skype For Business Last Activity Date', 'Yammer Last Activity Date', 'Teams Last Activity Date'])
+def add_last_activity_chunked(usersFile, outputFile, byUpn, byName, chunksize):
+    # users export is never held in full - each chunk is joined and appended to the output
+    # the names more than one user has come from a first pass over just the name column
+    names = pd.read_csv(usersFile, usecols=[USERS_NAME])[USERS_NAME]
+    duplicateNames = pd.Index(names[names.duplicated()].unique())
+    del names
+    mode, header = 'w', True
+    for usersFrame in pd.read_csv(usersFile, index_col=USERS_NAME, chunksize=chunksize):
+        add_last_activity(usersFrame, byUpn, byName, duplicateNames)
+        usersFrame.to_csv(outputFile, mode=mode, index=True, header=header)
+        mode, header = 'a', False
 
-# add last activity field as max on activy from others cols
-activityFrame['LastActivity'] = activityFrame[['Exchange Last Activity Date', 'OneDrive Last Activity Date', 'SharePoint Last Activity Date', 'Skype For Business Last Activity Date', 'Yammer Last Activity Date', 'Teams Last Activity Date']].max(axis=1)
+def main():
+    parser = argparse.ArgumentParser(description='Add the last M365 activity date to an AzureAD users export')
+    parser.add_argument('--users', default='export-users.csv', help='AzureAD users export')
+    parser.add_argument('--activity', default='export-activity.csv', help='M365 active users export')
+    parser.add_argument('--output', default='last-activity.csv', help='users export with LastActivity added')
+    parser.add_argument('--chunksize', type=int, default=0, help='stream both exports this many rows at a time (bounded memory)')
+    parser.add_argument('--tenant-id', help='build the report from Graph for this tenant instead of the exports')
+    parser.add_argument('--client-id', help='service principal for --tenant-id (Azure CLI login otherwise)')
+    parser.add_argument('--client-secret', help='service principal secret for --tenant-id')
+    parser.add_argument('--cache-dir', help='Entra cache directory for --tenant-id')
+    parser.add_argument('--refresh', action='store_true', help='with --tenant-id re-pull users rather than using the cache')
+    parser.add_argument('--m365', action='store_true', help='with --tenant-id also merge in the M365 app activity report')
+    args = parser.parse_args()
 
-# add LastActivity to usersFrame - default to old date so something exists
-usersFrame['LastActivity'] = '01/01/1970'
+    if args.tenant_id:
+        ## only needed for graph mode - the CSV modes run without msal / azure installed
+        from pythonEntraLib import EntraClient
+        client = EntraClient(args.tenant_id, client_id=args.client_id, client_secret=args.client_secret, cache_dir=args.cache_dir)
+        report = client.Users.last_activity_report(FORCE_NEW=args.refresh, M365_ACTIVITY=args.m365)
+        if report is None:
+            raise SystemExit(f"Failed to build the last activity report for {args.tenant_id}")
+        report.to_csv(args.output, index=True, header=True)
+        return
 
-# itterate through source
-for label, row in usersFrame.iterrows():
-    try:
-        lastActivity = activityFrame.loc[label, 'LastActivity']
-    except KeyError:
-        lastActivity = 'Nat'
+    if args.chunksize > 0:
+        byUpn, byName = last_activity_chunked(args.activity, args.chunksize)
+        add_last_activity_chunked(args.users, args.output, byUpn, byName, args.chunksize)
+        return
 
-    # add data to usersFrame
-    if type(lastActivity) is pd.Timestamp:
-        usersFrame.at[label, 'LastActivity'] = lastActivity
+    usersFrame = pd.read_csv(args.users, index_col=USERS_NAME)
+    activityFrame = pd.read_csv(args.activity, parse_dates=ACTIVITY_COLUMNS)
+    byUpn, byName = last_activity(activityFrame)
+    add_last_activity(usersFrame, byUpn, byName)
 
-# export to new file which has new field added
-usersFrame.to_csv(outputFile, index=True, header=True)
+    # export to new file which has new field added
+    usersFrame.to_csv(args.output, index=True, header=True)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+##############################################################
+#
+# Full tenant export (Entra and/or Okta) into the usual cache directory, split
+# over processes instead of one long chained run:
+#
+#   listing shards  - one per object type (entra users / groups / service principals,
+#                     okta users / groups / apps). graph and okta only page these
+#                     one after the other so a type can't be split further
+#   member shards   - the one-call-per-group part (entra group members, okta group
+#                     users) split by a hash of the group id, started as soon as
+#                     that side's group listing is done
+#
+# A coordinator process (multiprocessing manager) is shared by every shard:
+#   okta   - one OktaRateBudget over all --okta-token, every okta shard's calls
+#            draw from it (OktaInfo(RATE_BUDGET=...)) so the per token budget
+#            (--okta-rate-limit) holds across processes however the shards overlap
+#   graph  - the parent logs in once and the coordinator hands that token out,
+#            logging in again with the same credentials once it gets old. shards
+#            pick the new token up while they run
+#
+# Every shard writes one file per object into the shared cache directory, so the
+# cache is the merge - nothing to combine at the end and a re-run only fetches
+# what is missing (--flush to start over). Per shard throughput is printed at
+# the end (and written as json with --output).
+#
+##############################################################
+
+import argparse
+import json
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.managers import BaseManager
+from pythonCommonLogger import CommonLogger, loggerRemoveFileHandlers
+from pythonCommonMetrics import CommonMetrics
+
+ENTRA_LISTINGS = ['users', 'groups', 'servicePrincipals']
+OKTA_LISTINGS  = ['users', 'groups', 'apps']
+GRAPH_TOKEN_REFRESH = 45 * 60   # graph tokens are good for 60-90 minutes - log in again well before that
+GRAPH_TOKEN_CHECK   = 60        # how often a running entra shard asks the coordinator for the current token
+
+def shard_of(id, shards):
+    ## stable across processes (hash() is salted per process)
+    return zlib.crc32(id.encode()) % shards
+
+#####################################################################
+## runs in the coordinator process
+class GraphToken:
+    ## the current graph token for every entra shard - logs in again (same credentials as the parent) once the token
+    ##   is GRAPH_TOKEN_REFRESH old. a token given with --access-token is handed out as is, there is nothing to log in with
+    def __init__(self, tenant_id, client_id, client_secret, graph_url, access_token, REFRESH=True):
+        self.credentials  = (tenant_id, client_id, client_secret, graph_url)
+        self.access_token = access_token
+        self.acquired     = time.time()
+        self.refresh      = REFRESH
+        self.lock         = threading.Lock()
+
+    def token(self):
+        with self.lock:
+            if self.refresh and time.time() - self.acquired > GRAPH_TOKEN_REFRESH:
+                from pythonEntraLib import EntraClient
+                tenant_id, client_id, client_secret, graph_url = self.credentials
+                try:
+                    self.access_token = EntraClient(tenant_id, client_id=client_id, client_secret=client_secret, graph_api_url=graph_url).access_token
+                    self.acquired     = time.time()
+                except Exception as e:
+                    ## keep handing out the old token - the next ask tries again
+                    logging.getLogger('__COMMONLOGGER__').warning(f"GraphToken({tenant_id}) FAILURE_GRAPH_TOKEN_REFRESH {e}")
+            return self.access_token
+
+class ExportCoordinator(BaseManager):
+    pass
+
+#####################################################################
+## runs in the pool processes
+def __shard_init__(DEBUG):
+    logger = logging.getLogger('__COMMONLOGGER__')
+    loggerRemoveFileHandlers(logger)    # forked children inherit the parent's handlers
+    CommonLogger(DEBUG)
+
+def __requests_made__():
+    return sum(value for (name, labels), value in CommonMetrics().counters.items() if name == "http_requests_total")
+
+def __graph_token_refresher__(client, graph_token, stop):
+    ## swaps the coordinator's current token into the client while the shard works (headers is replaced, not edited)
+    while not stop.wait(GRAPH_TOKEN_CHECK):
+        access_token = graph_token.token()
+        if access_token != client.access_token:
+            client.__set_token__(access_token)
+
+def export_shard(shard):
+    CommonMetrics().reset()
+    started = time.time()
+    side, work, index, shards = shard['side'], shard['work'], shard['index'], shard['shards']
+    items = 0
+    if side == 'entra':
+        from pythonEntraLib import EntraClient
+        client = EntraClient(shard['tenant_id'], graph_api_url=shard['graph_url'], cache_dir=shard['cache_dir'], access_token=shard['graph_token'].token(),
+                             cache_codec=shard['cache_codec'])
+        stop = threading.Event()
+        threading.Thread(target=__graph_token_refresher__, args=(client, shard['graph_token'], stop), daemon=True).start()
+        try:
+            if work == 'users':
+                items = len(client.Users.get_all() or [])
+            elif work == 'groups':
+                items = len(client.Groups.get_all() or [])
+            elif work == 'servicePrincipals':
+                items = len(client.Applications.get_all_service_principals() or [])
+            elif work == 'members':
+                ## groups come from the cache the groups listing shard just wrote
+                group_ids = [group['id'] for group in client.Groups.get_all() or [] if shard_of(group['id'], shards) == index]
+                for group_id in group_ids:
+                    client.Groups.get_members(group_id)
+                items = len(group_ids)
+        finally:
+            stop.set()
+    else:
+        from pythonOktaLib import OktaInfo
+        okta = OktaInfo(shard['cache_dir'], OKTA_DOMAIN=shard['okta_domain'], OKTA_TOKEN=shard['okta_tokens'], GLOBAL_RATE_LIMIT=shard['okta_rate_limit'],
+                        CACHE_CODEC=shard['cache_codec'], RATE_BUDGET=shard['okta_budget'])
+        if work == 'users':
+            items = len(okta.users_fetch_all())
+        elif work == 'groups':
+            items = len(okta.groups_fetch_all())
+        elif work == 'apps':
+            items = len(okta.apps_fetch())
+        elif work == 'members':
+            okta.groups_fetch_all()
+            group_ids = [group_id for group_id in okta.cache_groups if shard_of(group_id, shards) == index]
+            for group_id in group_ids:
+                okta.groups_users(group_id)
+            items = len(group_ids)
+    seconds = time.time() - started
+    return {
+        "shard":    f"{side}:{work}" if work != 'members' else f"{side}:members {index + 1}/{shards}",
+        "items":    items,
+        "requests": __requests_made__(),
+        "seconds":  round(seconds, 3),
+        "throttle": round(sum(value for (name, labels), value in CommonMetrics().counters.items() if name == "throttle_wait_seconds_total"), 1),
+    }
+
+#####################################################################
+def export(args, logger):
+    from pythonOktaLib import OktaRateBudget
+    ExportCoordinator.register('GraphToken', GraphToken)
+    ExportCoordinator.register('OktaRateBudget', OktaRateBudget)
+    with ExportCoordinator() as coordinator:
+        return __export__(args, logger, coordinator)
+
+def __export__(args, logger, coordinator):
+    entra_shard = okta_shard = None
+    if args.tenant_id:
+        from pythonEntraLib import EntraClient
+        ## the one interactive / service principal login - the coordinator hands the token out and renews it
+        client = EntraClient(args.tenant_id, client_id=args.client_id, client_secret=args.client_secret, graph_api_url=args.graph_url,
+                             cache_dir=args.cache_dir, FLUSH=args.flush, access_token=args.access_token)
+        graph_token = coordinator.GraphToken(args.tenant_id, args.client_id, args.client_secret, args.graph_url, client.access_token,
+                                             REFRESH=args.access_token is None)
+        entra_shard = { "side": "entra", "tenant_id": args.tenant_id, "graph_url": client.graph_api_url, "cache_dir": args.cache_dir,
+                        "graph_token": graph_token }
+    if args.okta_domain:
+        from pythonOktaLib import OktaInfo
+        if args.flush:
+            OktaInfo(args.cache_dir, FLUSH=True)
+        ## every okta shard gets every token - which one a call uses is up to the shared budget
+        okta_shard = { "side": "okta", "okta_domain": args.okta_domain, "cache_dir": args.cache_dir, "okta_tokens": args.okta_token,
+                       "okta_rate_limit": args.okta_rate_limit, "okta_budget": coordinator.OktaRateBudget(len(args.okta_token), args.okta_rate_limit) }
+
+    def make(base, work, index=0, shards=1):
+        return dict(base, work=work, index=index, shards=shards, cache_codec=args.cache_codec)
+
+    results = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=__shard_init__, initargs=(args.debug,)) as executor:
+        pending = {}
+        for base, listings in ((entra_shard, ENTRA_LISTINGS), (okta_shard, OKTA_LISTINGS)):
+            if base is None:
+                continue
+            for work in listings:
+                shard = make(base, work)
+                pending[executor.submit(export_shard, shard)] = shard
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"export({shard['side']}:{shard['work']}) FAILURE_EXPORT_SHARD {e}")
+                    continue
+                results.append(result)
+                logger.info(f"export({result['shard']}) {result['items']} items {result['requests']} requests {result['seconds']:.1f}s")
+                if shard['work'] == 'groups':
+                    ## the group listing is in the cache - fan out the per group calls for that side
+                    base = entra_shard if shard['side'] == 'entra' else okta_shard
+                    for index in range(args.member_shards):
+                        member_shard = make(base, 'members', index, args.member_shards)
+                        pending[executor.submit(export_shard, member_shard)] = member_shard
+    return results, time.time() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a whole Entra and/or Okta tenant into the cache directory using a pool of processes')
+    parser.add_argument('--cache-dir', required=True, help='shared cache directory - every shard writes here')
+    parser.add_argument('--tenant-id', help='export this Entra tenant')
+    parser.add_argument('--client-id', help='service principal for --tenant-id (Azure CLI login otherwise)')
+    parser.add_argument('--client-secret', help='service principal secret for --tenant-id')
+    parser.add_argument('--access-token', help='graph token to use instead of logging in')
+    parser.add_argument('--graph-url', help='graph endpoint (default https://graph.microsoft.com)')
+    parser.add_argument('--okta-domain', help='export this Okta org')
+    parser.add_argument('--okta-token', action='append', default=[], help='okta api token (repeat to spread the load over several)')
+    parser.add_argument('--okta-rate-limit', type=int, default=250, help='requests per minute per okta token, shared by every okta shard')
+    parser.add_argument('--processes', type=int, default=4, help='shards running at the same time')
+    parser.add_argument('--member-shards', type=int, default=4, help='how many shards the per group member calls are split into (per side)')
+    parser.add_argument('--flush', action='store_true', help='empty the cache first instead of only fetching what is missing')
+    parser.add_argument('--cache-codec', choices=['none', 'gzip', 'zstd'], help='how the cache files are written (reads handle any of them)')
+    parser.add_argument('--output', help='write the per shard results as json here')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+    if not args.tenant_id and not args.okta_domain:
+        parser.error('nothing to export - give --tenant-id and/or --okta-domain')
+    if args.okta_domain and not args.okta_token:
+        parser.error('--okta-domain needs at least one --okta-token')
+
+    logger = CommonLogger(args.debug)
+    results, seconds = export(args, logger)
+
+    print(f"{'shard':<28} {'items':>8} {'requests':>9} {'seconds':>9} {'items/s':>9} {'req/s':>8} {'throttled':>9}")
+    for result in results:
+        rate = lambda count: count / result['seconds'] if result['seconds'] > 0 else 0.0
+        print(f"{result['shard']:<28} {result['items']:>8} {result['requests']:>9} {result['seconds']:>9.2f} "
+              f"{rate(result['items']):>9.1f} {rate(result['requests']):>8.1f} {result['throttle']:>8.1f}s")
+    total_requests = sum(result['requests'] for result in results)
+    print(f"{'total':<28} {'':>8} {total_requests:>9} {seconds:>9.2f} {'':>9} {total_requests / seconds if seconds > 0 else 0.0:>8.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({ "seconds": round(seconds, 3), "shards": results }, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## AppTracker.__encode_json__ against the old sanitize-then-dumps path, for a record shaped like a
+##   big okta_info (settings, float lists, profile dicts) with and without NaN / Inf in it
+##
+##   python3 benchmarks/bench_apptracker_encode.py [--repeat 200]
+##
+##############################################################
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pythonOktaLib
+from pythonOktaLib import AppTracker
+
+def make_record(bad_floats):
+    okta_info = {
+        "settings": { f"setting_{i}": f"value {i}" for i in range(200) },
+        "scores":   [[i * 0.5 + j for j in range(10)] for i in range(50)],
+        "profiles": [{ "name": f"profile {i}", "weight": i / 3, "tags": ["a", "b", "c"] } for i in range(200)],
+    }
+    if bad_floats:
+        okta_info["scores"][10][3]         = math.nan
+        okta_info["profiles"][5]["weight"] = math.inf
+    return { "okta_id": "0oa1234567890", "okta_info": okta_info, "tenant_id": "mock" }
+
+def sanitize(data):
+    ## what write() did before __encode_json__ - a full copy of the record on every call
+    if isinstance(data, dict):
+        return { key: sanitize(value) for key, value in data.items() }
+    if isinstance(data, list):
+        return [sanitize(value) for value in data]
+    if isinstance(data, float) and (math.isnan(data) or math.isinf(data)):
+        return None
+    return data
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AppTracker json encoding')
+    parser.add_argument('--repeat', type=int, default=200, help='encodes per measurement')
+    args = parser.parse_args()
+
+    tracker = AppTracker("http://127.0.0.1", "bench")
+    orjson  = pythonOktaLib.orjson
+    print(f"{'encoder':<24} {'clean ms':>9} {'nan ms':>9}")
+    rows = [("sanitize + json.dumps", lambda record: json.dumps(sanitize(record)))]
+    rows.append(("__encode_json__ stdlib", None))
+    if orjson is not None:
+        rows.append(("__encode_json__ orjson", None))
+    for name, function in rows:
+        pythonOktaLib.orjson = orjson if name.endswith("orjson") else None
+        function = function or tracker.__encode_json__
+        clean = timed(lambda: function(make_record(False)), args.repeat) - timed(lambda: make_record(False), args.repeat)
+        bad   = timed(lambda: function(make_record(True)), args.repeat) - timed(lambda: make_record(True), args.repeat)
+        print(f"{name:<24} {clean:>9.3f} {bad:>9.3f}")
+    pythonOktaLib.orjson = orjson
+
+if __name__ == '__main__':
+    main()
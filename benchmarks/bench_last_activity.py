@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## AzureAD-LastActivity.py on synthetic exports - wall clock (including interpreter start) and peak RSS of the
+##   full load and of each --chunksize, optionally the old iterrows loop for comparison (slow past ~50k users)
+##
+##   python3 benchmarks/bench_last_activity.py --users 500000 --chunksize 50000 --chunksize 10000 [--repeat 4] [--old]
+##
+##   the exports: 90% of users show up in the activity export (--repeat times each), 30% of the per service
+##   dates are blank, every 20th user has the same display name as the one before. the full load output is
+##   checked against the dates the exports were made with and every other mode's output is compared to it
+##
+##############################################################
+
+import argparse
+import csv
+import filecmp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "AzureAD-LastActivity.py")
+ACTIVITY_COLUMNS = ['Exchange Last Activity Date', 'OneDrive Last Activity Date', 'SharePoint Last Activity Date',
+                    'Skype For Business Last Activity Date', 'Yammer Last Activity Date', 'Teams Last Activity Date']
+
+## the loop AzureAD-LastActivity.py had before it was vectorized - LastActivity forced to object so it runs on pandas 3
+OLD_SCRIPT = """
+import pandas as pd
+usersFrame = pd.read_csv('export-users.csv', index_col='DisplayName')
+activityFrame = pd.read_csv('export-activity.csv', index_col='Display Name', parse_dates=%r)
+activityFrame['LastActivity'] = activityFrame[%r].max(axis=1)
+usersFrame['LastActivity'] = pd.Series('01/01/1970', index=usersFrame.index, dtype=object)
+for label, row in usersFrame.iterrows():
+    try:
+        lastActivity = activityFrame.loc[label, 'LastActivity']
+    except KeyError:
+        lastActivity = 'Nat'
+    if type(lastActivity) is pd.Timestamp:
+        usersFrame.at[label, 'LastActivity'] = lastActivity
+usersFrame.to_csv('last-activity-old.csv', index=True, header=True)
+""" % (ACTIVITY_COLUMNS, ACTIVITY_COLUMNS)
+
+## runs a script as __main__ and reports its own peak RSS (RUSAGE_CHILDREN would be the max over every run so far)
+RUNNER = """
+import resource, runpy, sys
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+runpy.run_path(script, run_name='__main__')
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def make_exports(work_dir, users, repeat, seed=1):
+    ## returns upn -> the LastActivity the report should have for it
+    rng = random.Random(seed)
+    expected = {}
+    users_path    = os.path.join(work_dir, "export-users.csv")
+    activity_path = os.path.join(work_dir, "export-activity.csv")
+    with open(users_path, 'w', newline='') as users_file, open(activity_path, 'w', newline='') as activity_file:
+        users_csv    = csv.writer(users_file)
+        activity_csv = csv.writer(activity_file)
+        users_csv.writerow(['DisplayName', 'UserPrincipalName', 'Department', 'JobTitle', 'AccountEnabled'])
+        activity_csv.writerow(['Report Refresh Date', 'User Principal Name', 'Display Name', 'Is Deleted'] + ACTIVITY_COLUMNS)
+        for index in range(users):
+            ## same name as the previous user - a different person, who must not get that user's activity
+            name = f"Mock User {index - 1 if index % 20 == 1 else index:07d}"
+            upn  = f"Mock.User{index:07d}@example.com"
+            users_csv.writerow([name, upn, f"Dept {index % 40}", f"Title {index % 15}", "True"])
+            expected[upn] = "1970-01-01"
+            if rng.random() >= 0.9:
+                continue
+            for _ in range(repeat):
+                dates = ["" if rng.random() < 0.3 else f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in ACTIVITY_COLUMNS]
+                activity_csv.writerow(["2024-12-31", upn.lower(), name, "False"] + dates)
+                expected[upn] = max([expected[upn]] + [date for date in dates if date])
+    return expected
+
+def wrong_dates(output, expected):
+    ## users whose LastActivity is not the one the exports were made with
+    with open(output, newline='') as f:
+        return sum(1 for row in csv.DictReader(f) if row['LastActivity'][:10] != expected[row['UserPrincipalName']])
+
+def run(work_dir, script, args):
+    start  = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", RUNNER, script] + args, cwd=work_dir, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, int(result.stdout.split()[-1]) / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AzureAD-LastActivity.py on synthetic exports')
+    parser.add_argument('--users', type=int, default=20000, help='users in the users export')
+    parser.add_argument('--repeat', type=int, default=1, help='rows per active user in the activity export')
+    parser.add_argument('--chunksize', type=int, action='append', default=[], help='also run with this --chunksize (repeatable)')
+    parser.add_argument('--old', action='store_true', help='also run the old iterrows loop')
+    parser.add_argument('--keep', action='store_true', help='keep the working directory')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-last-activity-")
+    try:
+        expected = make_exports(work_dir, args.users, args.repeat)
+        print(f"{args.users} users, {args.repeat} activity rows per active user - {work_dir}")
+        print(f"{'mode':<16} {'seconds':>9} {'peak MB':>9} {'same output':>12}")
+        full_output = os.path.join(work_dir, "last-activity.csv")
+        seconds, peak = run(work_dir, SCRIPT, [])
+        print(f"{'full':<16} {seconds:>9.2f} {peak:>9.0f} {'-':>12}   {wrong_dates(full_output, expected)} wrong dates")
+        for chunksize in args.chunksize:
+            output = f"last-activity-{chunksize}.csv"
+            seconds, peak = run(work_dir, SCRIPT, ["--chunksize", str(chunksize), "--output", output])
+            same = filecmp.cmp(full_output, os.path.join(work_dir, output), shallow=False)
+            print(f"{f'chunk {chunksize}':<16} {seconds:>9.2f} {peak:>9.0f} {str(same):>12}")
+        if args.old:
+            old_script = os.path.join(work_dir, "old-last-activity.py")
+            with open(old_script, 'w') as f:
+                f.write(OLD_SCRIPT)
+            seconds, peak = run(work_dir, old_script, [])
+            print(f"{'old loop':<16} {seconds:>9.2f} {peak:>9.0f} {'-':>12}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
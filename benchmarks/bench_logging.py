@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## pythonCommonLogger hot path costs - the old f-string + __caller_info__() + json.dumps lines against
+##   CommonLoggerAdapter + LazyJson, with DEBUG off and on, direct handlers against loggerUseQueue()
+##   with a slow sink, and the JsonLinesHandler sink on its own. a "call" is the pair the converted hot paths
+##   log: an id line and a json payload line
+##
+##   python3 benchmarks/bench_logging.py [--calls 20000] [--threads 5]
+##
+##############################################################
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pythonCommonLogger import CommonLoggerAdapter, CommonFormatter, LazyJson, LOG_FORMAT, loggerUseQueue, loggerRemoveFileHandlers, JsonLinesHandler
+
+PAYLOAD = { "id": "00000000-0000-0000-0000-000000000001", "displayName": "Mock Group", "members": [f"user{i}" for i in range(20)] }
+
+class Library:
+    ## the two logging styles side by side, called from a method so funcName / __caller_info__ have a frame to look at
+    def __init__(self, logger):
+        self.logger = logger
+        self.log    = CommonLoggerAdapter(logger, self.__class__.__name__)
+
+    def __caller_info__(self):
+        return inspect.currentframe().f_back.f_code.co_name
+
+    def old_style(self, name):
+        self.logger.debug(f"{self.__class__.__name__}.{self.__caller_info__()}({name}) found with ID {PAYLOAD['id']}")
+        self.logger.debug(f"{json.dumps(PAYLOAD, indent=4)}")
+
+    def adapter(self, name):
+        self.log.debug("(%s) found with ID %s", name, PAYLOAD['id'])
+        self.log.debug("%s", LazyJson(PAYLOAD))
+
+class SlowHandler(logging.Handler):
+    ## a sink that takes sink_seconds per record (network share, busy disk, remote syslog)
+    def __init__(self, sink_seconds):
+        super().__init__()
+        self.sink_seconds = sink_seconds
+
+    def emit(self, record):
+        self.format(record)
+        time.sleep(self.sink_seconds)
+
+def fresh_logger(level, *handlers):
+    logger = logging.getLogger('__BENCHLOGGER__')
+    loggerRemoveFileHandlers(logger)
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in handlers:
+        handler.setFormatter(CommonFormatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    return logger
+
+def threaded(threads, calls, function):
+    ## seconds for `threads` threads to make `calls` calls between them
+    per_thread = calls // threads
+    workers = [threading.Thread(target=lambda: [function(i) for i in range(per_thread)]) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pythonCommonLogger hot path helpers')
+    parser.add_argument('--calls', type=int, default=20000, help='logging calls per measurement')
+    parser.add_argument('--threads', type=int, default=5, help='threads for the threaded measurements')
+    parser.add_argument('--work', type=float, default=0.002, help='seconds of "http" per call for the slow sink run')
+    parser.add_argument('--sink', type=float, default=0.0005, help='seconds the slow sink takes per record')
+    args = parser.parse_args()
+    work_dir = tempfile.mkdtemp(prefix="bench-logging-")
+    try:
+        ## DEBUG off - what a disabled debug line costs the caller
+        library = Library(fresh_logger(logging.INFO))
+        for name in ("old_style", "adapter"):
+            function = getattr(library, name)
+            start = time.perf_counter()
+            for i in range(args.calls):
+                function(i)
+            print(f"debug off   {name:<10} {(time.perf_counter() - start) / args.calls * 1e6:>8.1f}us per call")
+
+        ## DEBUG on - every line formatted into a file, threads contending for the handler
+        for name in ("old_style", "adapter"):
+            library  = Library(fresh_logger(logging.DEBUG, logging.FileHandler(os.path.join(work_dir, f"{name}.log"))))
+            seconds  = threaded(args.threads, args.calls, getattr(library, name))
+            print(f"debug on    {name:<10} {seconds / args.calls * 1e6:>8.1f}us per call ({args.threads} threads, file handler)")
+
+        ## slow sink - handlers in the request threads against behind loggerUseQueue()
+        calls = min(args.calls, 2000)
+        for QUEUE in (False, True):
+            logger   = fresh_logger(logging.INFO, SlowHandler(args.sink))
+            listener = loggerUseQueue(logger) if QUEUE else None
+            def request(i):
+                time.sleep(args.work)
+                logger.info("(%s) request done", i)
+                logger.info("(%s) SUCCESS_BENCH", i)
+            start   = time.perf_counter()
+            seconds = threaded(args.threads, calls, request)
+            if listener is not None:
+                listener.stop()     # drains the queue
+            flushed = time.perf_counter() - start
+            print(f"slow sink   {'queued' if QUEUE else 'direct':<10} {seconds:>8.2f}s for {calls} calls of {args.work * 1000:.0f}ms work, "
+                  f"{flushed:.2f}s until logged ({args.threads} threads, {args.sink * 1000:.1f}ms per record)")
+
+        ## json lines sink on its own (no queue) - format, size count and buffered write per record, rotating every 10MB
+        logger = fresh_logger(logging.INFO)
+        logger.addHandler(JsonLinesHandler(os.path.join(work_dir, "run.jsonl"), maxBytes=10 * 1024 * 1024))
+        start = time.perf_counter()
+        for i in range(args.calls):
+            logger.info("(%s)(%s) FAILURE_BENCH failed", i, PAYLOAD['id'])
+        print(f"json sink   {'direct':<10} {(time.perf_counter() - start) / args.calls * 1e6:>8.1f}us per record")
+        loggerRemoveFileHandlers(logging.getLogger('__BENCHLOGGER__'))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+from pythonCommonMetrics import CommonMetrics
+try:
+    import orjson       # optional - much faster encode / decode
+except ImportError:
+    orjson = None
+try:
+    import zstandard    # optional - only needed for the zstd codec (or to read zstd files)
+except ImportError:
+    zstandard = None
+
+## what a cut off or damaged cache file can raise while being decoded
+CORRUPT_ERRORS = (ValueError, EOFError, OSError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+#####################################################################
+## one way to read and write the json cache files for both libraries (same idea as the common logger / metrics)
+##    CommonCache().write(filename, data)  - encoded with the codec, written to a tmp file and renamed into place so a
+##                                           killed run never leaves half a file behind
+##    CommonCache().read(filename)         - None when the file is missing OR damaged (the damaged file is removed and
+##                                           logged) so the caller simply fetches it again
+##
+##    codec: "none" (plain json), "gzip" or "zstd" (needs zstandard, gzip without it) - CommonCache(codec) sets it
+##           for the process. reads sniff the magic bytes so any mix of codecs in a cache directory is fine and
+##           switching codec never needs a flush. file names don't change, except "*.gz" names are always gzip
+
+CODECS      = ("none", "gzip", "zstd")
+GZIP_MAGIC  = b'\x1f\x8b'
+ZSTD_MAGIC  = b'\x28\xb5\x2f\xfd'
+GZIP_LEVEL  = 6
+ZSTD_LEVEL  = 3
+
+class CacheIO:
+    def __init__(self, codec="none"):
+        self.logger  = logging.getLogger('__COMMONLOGGER__')
+        self.metrics = CommonMetrics()
+        self.codec   = "none"
+        self.set_codec(codec)
+
+    def set_codec(self, codec):
+        if codec not in CODECS:
+            raise ValueError(f"cache codec must be one of {CODECS} - not {codec}")
+        if codec == "zstd" and zstandard is None:
+            self.logger.warning("CacheIO(zstd) zstandard is not installed - writing gzip instead")
+            codec = "gzip"
+        self.codec = codec
+
+    ###################################################################################
+    def encode(self, data):
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass    # e.g. ints over 64 bits - let the standard encoder deal with it
+        return json.dumps(data).encode()
+
+    def decode(self, raw):
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+    def compress(self, raw, codec):
+        if codec == "gzip":
+            return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+        if codec == "zstd":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        return raw
+
+    def decompress(self, raw):
+        if raw[:2] == GZIP_MAGIC:
+            return gzip.decompress(raw)
+        if raw[:4] == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("zstd file but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(raw)
+        return raw
+
+    ###################################################################################
+    def write(self, filename, data, codec=None):
+        codec = codec if codec is not None else ("gzip" if filename.endswith(".gz") else self.codec)
+        raw   = self.compress(self.encode(data), codec)
+        tmp_filename = f"{filename}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_filename, filename)
+        except OSError:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+        return len(raw)
+
+    def read(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            if not raw:
+                raise ValueError("empty file")
+            return self.decode(self.decompress(raw))
+        except CORRUPT_ERRORS as e:
+            ## json / gzip / zstd all fail loudly on a cut off file - drop it so the caller fetches it again
+            layer = os.path.basename(os.path.dirname(filename))
+            self.logger.warning(f"CacheIO.read({filename}) FAILURE_CACHE_CORRUPT {type(e).__name__}: {e} - removed, will re-fetch")
+            self.metrics.inc("cache_corrupt_total", layer=layer)
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+
+#####################################################################
+__cache_io__ = CacheIO(os.environ.get("ADSCRIPTS_CACHE_CODEC", "none"))
+
+def CommonCache(codec=None):
+    if codec is not None:
+        __cache_io__.set_codec(codec)
+    return __cache_io__
@@ -20,8 +20,21 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import atexit
+import glob
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import re
 import sys
+try:
+    import orjson       # optional - faster encode/decode of the json lines
+except ImportError:
+    orjson = None
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
 #####################################################################
 def CommonLogger(DEBUG=False):
@@ -35,7 +48,7 @@ def CommonLogger(DEBUG=False):
 def loggerAddFileHandle(logger, filename):
     loggerRemoveFileHandlers(logger)
     handler = logging.FileHandler(filename)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    formatter = CommonFormatter(LOG_FORMAT)
     handler.setFormatter(formatter)
     logger.addHandler(handler)
     loggerAddStreamHandle(logger)
@@ -48,7 +61,7 @@ def loggerAddFileHandle(logger, filename):
 # Function to add a stream handler to the logger
 def loggerAddStreamHandle(logger):
     handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    formatter = CommonFormatter(LOG_FORMAT)
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
@@ -57,3 +70,191 @@ def loggerRemoveFileHandlers(logger):
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
         handler.close()
+
+#####################################################################
+## cheap logging for hot paths
+##    self.log = CommonLoggerAdapter(logger, self.__class__.__name__)
+##    self.log.debug("(%s) found with ID %s", name, id)      -> "Groups.get_id(name) found with ID ..."
+##    self.log.debug("%s", LazyJson(payload))                 -> json.dumps only if the record is emitted
+## the class comes from the adapter and the method from the record (funcName) - both only looked at when a
+## handler formats the record, so a disabled debug() costs one level check (no f-string, no frame walking)
+
+class CommonLoggerAdapter(logging.LoggerAdapter):
+    def __init__(self, logger, classname):
+        super().__init__(logger, { "classname": classname })
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = { **self.extra, **kwargs.get("extra", {}) }
+        return msg, kwargs
+
+class CommonFormatter(logging.Formatter):
+    ## records from a CommonLoggerAdapter get "Class.method" in front of the message - same text the f-strings used to build
+    def formatMessage(self, record):
+        classname = getattr(record, "classname", None)
+        if classname is not None:
+            separator = "" if record.message.startswith("(") else " "
+            record.message = f"{classname}.{record.funcName}{separator}{record.message}"
+        return super().formatMessage(record)
+
+class LazyJson:
+    ## json.dumps(data, indent=4) deferred until the log record is actually formatted
+    def __init__(self, data, indent=4):
+        self.data   = data
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.data, indent=self.indent, default=str)
+
+def loggerUseQueue(logger, maxsize=0):
+    ## move every handler of the logger behind a queue - the request threads only enqueue, a listener thread
+    ##   does the formatting of timestamps and the file/console writes (messages themselves are rendered at enqueue
+    ##   so later changes to the logged objects don't show up). returns the listener, stopped (flushed) at exit
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, logging.handlers.QueueHandler)]
+    if not handlers:
+        return None
+    for handler in handlers:
+        logger.removeHandler(handler)
+    log_queue = queue.Queue(maxsize)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    def stop():
+        if listener._thread is not None:
+            listener.stop()
+    atexit.register(stop)
+    return listener
+
+#####################################################################
+## structured log sink - one json object per line next to (not instead of) the text log
+##    loggerAddJsonHandle(logger, "run.jsonl")
+##    { "ts", "level", "class", "func", "event": "FAILURE_GROUP_APP", "ids": ["grp", "app"], "duration": 1.2, "message" }
+## event is the FAILURE_/SUCCESS_ code in the message, ids are the leading "(a)(b)" of the message (the convention every
+## library line follows), duration comes from extra={"duration": seconds}. run reports then come from jsonLogSummary()
+## instead of grepping the text logs
+
+EVENT_RE   = re.compile(r'\b((?:FAILURE|SUCCESS)_[A-Z0-9_]+)\b')
+CONTEXT_RE = re.compile(r'^([\w.]*)((?:\([^()]*\))+)')
+IDS_RE     = re.compile(r'\(([^()]*)\)')
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        message   = record.getMessage()
+        classname = getattr(record, "classname", None)
+        function  = record.funcName
+        ids       = []
+        context   = CONTEXT_RE.match(message)
+        if context is not None:
+            ## old style "Class.method(a)(b) ..." / "function(a)(b) ..." - the prefix is in the message itself
+            if context.group(1):
+                prefix_class, _, function = context.group(1).rpartition(".")
+                classname = prefix_class or None
+            ids = IDS_RE.findall(context.group(2))
+        event = EVENT_RE.search(message)
+        data  = {
+            "ts":       round(record.created, 3),
+            "level":    record.levelname,
+            "class":    classname,
+            "func":     function,
+            "event":    event.group(1) if event is not None else None,
+            "ids":      ids,
+            "duration": getattr(record, "duration", None),
+            "thread":   record.threadName,
+            "message":  message,
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        ## compact separators either way - jsonLogSummary() skips non event lines on the raw bytes
+        if orjson is not None:
+            return orjson.dumps(data, default=str).decode()
+        return json.dumps(data, default=str, separators=(",", ":"))
+
+class JsonLinesHandler(logging.handlers.RotatingFileHandler):
+    ## size based rotation (run.jsonl, run.jsonl.1 ..) and buffered writes - flushed every flush_every records,
+    ##   on anything ERROR and up, and on close (the queue listener closes it at exit)
+    ##   the file size is counted here - RotatingFileHandler.shouldRollover() formats every record a second time and
+    ##   seeks (so flushes) the stream to find it
+    def __init__(self, filename, maxBytes=100 * 1024 * 1024, backupCount=10, flush_every=500):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8")
+        self.setFormatter(JsonLinesFormatter())
+        self.flush_every   = flush_every
+        self.pending       = 0
+        self.bytes_written = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + self.terminator
+            size = len(line.encode("utf-8"))
+            if self.maxBytes > 0 and self.bytes_written > 0 and self.bytes_written + size > self.maxBytes:
+                self.doRollover()
+                self.bytes_written = 0
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(line)
+            self.bytes_written += size
+            self.pending       += 1
+            if self.pending >= self.flush_every or record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.pending = 0
+        super().flush()
+
+def loggerAddJsonHandle(logger, filename, maxBytes=100 * 1024 * 1024, backupCount=10, QUEUE=True):
+    ## the json sink goes behind its own queue (QUEUE=False to write from the calling thread)
+    handler = JsonLinesHandler(filename, maxBytes=maxBytes, backupCount=backupCount)
+    if not QUEUE:
+        logger.addHandler(handler)
+        return handler
+    log_queue = queue.Queue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    def stop():
+        if listener._thread is not None:
+            listener.stop()
+        handler.close()
+    atexit.register(stop)
+    return listener
+
+def jsonLogSummary(filename):
+    ## run report from the json log (and its rotations) - events x level with counts and durations, as a DataFrame
+    import pandas as pd
+    filenames = sorted(glob.glob(f"{glob.escape(filename)}.*")) + [filename]
+    columns   = { "ts": [], "level": [], "class": [], "func": [], "event": [], "duration": [], "id": [] }
+    loads     = orjson.loads if orjson is not None else json.loads
+    for my_filename in filenames:
+        try:
+            f = open(my_filename, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            for line in f:
+                ## most lines carry no event - skip them without parsing, then only keep the columns the report needs
+                if b'"event":null' in line:
+                    continue
+                try:
+                    data = loads(line)
+                except ValueError:
+                    continue            # a half written last line from a killed run
+                columns["ts"].append(data.get("ts"))
+                columns["level"].append(data.get("level"))
+                columns["class"].append(data.get("class"))
+                columns["func"].append(data.get("func"))
+                columns["event"].append(data.get("event"))
+                columns["duration"].append(data.get("duration"))
+                ids = data.get("ids") or [None]
+                columns["id"].append(ids[0])
+    frame = pd.DataFrame(columns)
+    frame["duration"] = pd.to_numeric(frame["duration"])
+    return frame.groupby(["event", "level"]).agg(
+        count         = ("event", "size"),
+        objects       = ("id", "nunique"),
+        duration_sum  = ("duration", "sum"),
+        duration_max  = ("duration", "max"),
+        first         = ("ts", "min"),
+        last          = ("ts", "max"),
+    ).sort_values("count", ascending=False)
@@ -0,0 +1,246 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+#####################################################################
+## process wide counters and latency histograms - one registry shared by every module (same idea as the common logger)
+##    every http call the libraries make goes through a requests.Session from metricsSession(api) so it is counted
+##    by endpoint template (ids folded to {id}), method and status with latency and bytes
+##    cache lookups, retries and throttle waits are recorded by the libraries where they happen
+##
+##    CommonMetrics().log_summary()                      - where the time went, at the end of a run
+##    CommonMetrics().export_prometheus("/path/x.prom")  - node_exporter textfile collector format
+##    CommonMetrics().export_json("/path/x.json")
+##    metricsSummaryAtExit(...)                          - all of the above when the process exits
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+UUID_RE    = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+OKTA_ID_RE = re.compile(r'/[0-9A-Za-z]{20}(?=/|$)')
+ARG_RE     = re.compile(r"\('[^']*'\)")
+
+def endpoint_template(url):
+    ## https://graph.microsoft.com/v1.0/users/<uuid>/owners -> /v1.0/users/{id}/owners  (okta ids and function args too)
+    path = urllib.parse.urlsplit(url).path
+    path = UUID_RE.sub('{id}', path)
+    path = OKTA_ID_RE.sub('/{id}', path)
+    path = ARG_RE.sub('({arg})', path)
+    return path
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts  = [0] * (len(buckets) + 1)    # last one is +Inf
+        self.count   = 0
+        self.sum     = 0.0
+        self.max     = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum   += value
+        self.max    = max(self.max, value)
+
+    def quantile(self, q):
+        ## upper bound of the bucket the quantile falls in (max for the +Inf bucket) - good enough to rank endpoints
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen   = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+class Metrics:
+    def __init__(self):
+        self.lock       = threading.Lock()
+        self.counters   = {}    # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> Histogram
+        self.started    = time.time()
+
+    def __key__(self, name, labels):
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        key = self.__key__(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self.__key__(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    ## what the libraries call
+    def http(self, api, method, url, status, seconds, size):
+        endpoint = endpoint_template(url)
+        self.inc("http_requests_total", api=api, method=method, endpoint=endpoint, status=status)
+        self.inc("http_response_bytes_total", size, api=api, endpoint=endpoint)
+        self.observe("http_request_seconds", seconds, api=api, endpoint=endpoint)
+
+    def cache(self, layer, result):
+        ## result: "memory" / "disk" (hits at that level) or "miss" (went to the api)
+        self.inc("cache_lookups_total", layer=layer, result=result)
+
+    def retry(self, api, reason):
+        self.inc("http_retries_total", api=api, reason=reason)
+
+    def throttle(self, api, seconds):
+        self.inc("throttle_waits_total", api=api)
+        self.inc("throttle_wait_seconds_total", seconds, api=api)
+
+    def response_hook(self, api):
+        ## requests response hook - latency is time to the response headers (requests' own elapsed)
+        def hook(response, *args, **kwargs):
+            size = response.headers.get('Content-Length')
+            size = int(size) if size is not None and size.isdigit() else len(response.content or b'')
+            self.http(api, response.request.method, response.request.url, response.status_code, response.elapsed.total_seconds(), size)
+            return response
+        return hook
+
+    ###################################################################################
+    def __snapshot__(self):
+        with self.lock:
+            return dict(self.counters), { key: (hist.count, hist.sum, hist.max, hist.quantile(0.5), hist.quantile(0.95), list(hist.counts))
+                                          for key, hist in self.histograms.items() }
+
+    def summary(self):
+        ## lines sorted by where the time went: endpoints by total seconds, then caches, retries and throttling
+        counters, histograms = self.__snapshot__()
+        lines = [f"METRICS_SUMMARY {time.time() - self.started:.1f}s run"]
+        rows  = []
+        for (name, labels), (count, total, maximum, p50, p95, buckets) in histograms.items():
+            if name != "http_request_seconds":
+                continue
+            labels = dict(labels)
+            errors = sum(value for (counter, counter_labels), value in counters.items() if counter == "http_requests_total"
+                         and dict(counter_labels).get('endpoint') == labels['endpoint'] and dict(counter_labels).get('api') == labels['api']
+                         and not dict(counter_labels).get('status', '').startswith('2'))
+            size = counters.get(self.__key__("http_response_bytes_total", labels), 0)
+            rows.append((total, f"  {labels['api']:<10} {labels['endpoint']:<60} {count:>7} calls {errors:>5} non-2xx {total:>9.2f}s total "
+                                f"p50<={p50:.3f}s p95<={p95:.3f}s max {maximum:.3f}s {size / 1024:>10.1f}KB"))
+        lines.extend(line for total, line in sorted(rows, reverse=True))
+        caches = {}
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if name == "cache_lookups_total":
+                caches.setdefault(labels['layer'], {})[labels['result']] = value
+        for layer, results in sorted(caches.items()):
+            total = sum(results.values())
+            hits  = total - results.get('miss', 0)
+            lines.append(f"  cache {layer:<40} {hits}/{total} hits ({100.0 * hits / total:.1f}%) {results}")
+        for (name, labels), value in sorted(counters.items()):
+            if name in ("http_retries_total", "throttle_waits_total", "throttle_wait_seconds_total"):
+                lines.append(f"  {name} {dict(labels)} {value:.1f}" if isinstance(value, float) else f"  {name} {dict(labels)} {value}")
+        return lines
+
+    def log_summary(self, logger=None):
+        logger = logger if logger is not None else logging.getLogger('__COMMONLOGGER__')
+        for line in self.summary():
+            logger.info(line)
+
+    def export_json(self, filename):
+        counters, histograms = self.__snapshot__()
+        data = {
+            "started":    self.started,
+            "seconds":    round(time.time() - self.started, 3),
+            "counters":   [{ "name": name, "labels": dict(labels), "value": value } for (name, labels), value in counters.items()],
+            "histograms": [{ "name": name, "labels": dict(labels), "count": count, "sum": round(total, 6), "max": round(maximum, 6),
+                             "p50": p50, "p95": p95, "buckets": dict(zip([str(bucket) for bucket in LATENCY_BUCKETS] + ["+Inf"], buckets)) }
+                           for (name, labels), (count, total, maximum, p50, p95, buckets) in histograms.items()],
+        }
+        self.__write_atomic__(filename, json.dumps(data, indent=4))
+
+    def export_prometheus(self, filename, prefix="adscripts_"):
+        ## text exposition format - written to a tmp file and renamed so the textfile collector never reads half a file
+        counters, histograms = self.__snapshot__()
+        def labels_str(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in items]
+            return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+        lines = []
+        for name in sorted({ name for name, labels in counters }):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{prefix}{name}{labels_str(labels)} {value}")
+        for name in sorted({ name for name, labels in histograms }):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for (histogram, labels), (count, total, maximum, p50, p95, buckets) in sorted(histograms.items()):
+                if histogram != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip([str(bucket) for bucket in LATENCY_BUCKETS] + ["+Inf"], buckets):
+                    cumulative += bucket_count
+                    lines.append(f"{prefix}{name}_bucket{labels_str(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{labels_str(labels)} {total}")
+                lines.append(f"{prefix}{name}_count{labels_str(labels)} {count}")
+        self.__write_atomic__(filename, "\n".join(lines) + "\n")
+
+    def __write_atomic__(self, filename, text):
+        tmp_filename = f"{filename}.tmp.{os.getpid()}"
+        with open(tmp_filename, 'w') as f:
+            f.write(text)
+        os.replace(tmp_filename, filename)
+
+#####################################################################
+__metrics__ = Metrics()
+
+def CommonMetrics():
+    return __metrics__
+
+def metricsSession(api):
+    ## requests.Session with the metrics hook on it - also keeps connections alive between calls (no new tls handshake per call)
+    import requests
+    session = requests.Session()
+    session.hooks['response'].append(__metrics__.response_hook(api))
+    return session
+
+def metricsSummaryAtExit(logger=None, json_file=None, prometheus_file=None):
+    def at_exit():
+        __metrics__.log_summary(logger)
+        if json_file is not None:
+            __metrics__.export_json(json_file)
+        if prometheus_file is not None:
+            __metrics__.export_prometheus(prometheus_file)
+    atexit.register(at_exit)
@@ -22,8 +22,6 @@ SOFTWARE.
 
 import msal
 import logging
-import json
-import requests
 import uuid
 import re
 import time
@@ -31,25 +29,38 @@ import urllib
 import os
 import glob
 import inspect
+import bisect
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 from azure.identity import AzureCliCredential
+from pythonCommonMetrics import CommonMetrics, metricsSession
+from pythonCommonCache import CommonCache
+from pythonCommonLogger import CommonLoggerAdapter
 
 from .pythonEntraLib_users import Users
 from .pythonEntraLib_applications import Applications
 from .pythonEntraLib_groups import Groups
 from .pythonEntraLib_passwordSSO import PasswordSSO
 
+COMPLETE_MARKER = ".complete"   # left in a type's cache directory by a finished __get_all__ pull
+
 class EntraClient:
-    def __init__(self, tenant_id, client_id=None, client_secret=None, required_scopes=None, graph_api_url=None, cache_dir=None, FLUSH=False):
+    def __init__(self, tenant_id, client_id=None, client_secret=None, required_scopes=None, graph_api_url=None, cache_dir=None, FLUSH=False, access_token=None, cache_codec=None):
         ## make sure that other modules are calling with same logger name
         self.logger          = logging.getLogger('__COMMONLOGGER__')
+        self.log             = CommonLoggerAdapter(self.logger, self.__class__.__name__)
+        self.metrics         = CommonMetrics()
+        self.session         = metricsSession("graph")   # every graph call goes through here - keep alive + metrics
+        self.cache_io        = CommonCache(cache_codec)   # cache files: codec none/gzip/zstd, atomic writes (see pythonCommonCache)
         self.tenant_id       = tenant_id
         self.client_id       = client_id
         self.client_secret   = client_secret
         self.required_scopes = required_scopes if required_scopes else ["https://graph.microsoft.com/.default"]
         self.graph_api_url   = graph_api_url if graph_api_url else "https://graph.microsoft.com"
         self.cache_dir = f"{cache_dir}/{tenant_id}" if cache_dir else None
+        self.loaded_all      = set()   # types __get_all__ has fully loaded into their cache - prefix search can stay local
+        self.prefix_index    = {}      # type -> (cache generation, sorted lower case names, items) see __prefix_local__
+        self.cache_generation = {}     # type -> bumped on every write into that type's cache (see __cache_changed__)
 
         if FLUSH:
             self.flush()
@@ -59,7 +70,18 @@ class EntraClient:
         self.Applications    = Applications(self)
         self.Groups          = Groups(self)
         self.PasswordSSO     = PasswordSSO(self)
-        self.authenticate()
+        if access_token is not None:
+            ## token acquired elsewhere (another process, or any string against pythonMockServer) - no msal / cli login
+            self.__set_token__(access_token)
+        else:
+            self.authenticate()
+
+    def __set_token__(self, access_token):
+        self.access_token = access_token
+        self.headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
 
     def authenticate(self):
         ## 
@@ -80,11 +102,7 @@ class EntraClient:
                 )
                 result = app.acquire_token_for_client(scopes=self.required_scopes)
                 if "access_token" in result:
-                    self.access_token = result["access_token"]
-                    self.headers = {
-                        "Authorization": f"Bearer {result['access_token']}",
-                        "Content-Type": "application/json",
-                    }
+                    self.__set_token__(result["access_token"])
                     self.logger.info("Service principal authentication successful")
                     return
                 else:
@@ -97,11 +115,7 @@ class EntraClient:
             self.logger.info("Attempting Azure CLI authentication")
             credential = AzureCliCredential()
             token = credential.get_token("https://graph.microsoft.com/.default")
-            self.access_token = token.token
-            self.headers = {
-                "Authorization": f"Bearer {token.token}",
-                "Content-Type": "application/json",
-            }
+            self.__set_token__(token.token)
             self.logger.info("Azure CLI authentication successful")
             return
         except Exception as e:
@@ -173,7 +187,7 @@ class EntraClient:
     
     def get_graph_scopes(self):
         graph_app_id = "00000003-0000-0000-c000-000000000000"
-        response = requests.get(
+        response = self.session.get(
             f"{self.graph_api_url}/v1.0/servicePrincipals?$filter=appId eq '{graph_app_id}'",
             headers=self.headers
         )
@@ -194,29 +208,147 @@ class EntraClient:
         return scopes
     
     def http_get(self, url):
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         if response.status_code == 200:
             return response.json()
         self.logger.warning(f"HTTP GET failed: {response.status_code}")
         return None
     
+    def __batch__(self, batch_requests):
+        ## Graph $batch - sends the requests 20 at a time (the graph limit) and returns { request id: {"status": .., "body": ..} }
+        ##    each request is a dict with id (string) / method / url (relative, e.g. "/users/{id}") and optional body
+        ##    throttled (429) sub requests - or a whole chunk when the $batch POST itself gets 429 / 503 - are resent after
+        ##    the largest Retry-After seen
+        results  = {}
+        pending  = [dict(request) for request in batch_requests]
+        for request in pending:
+            if 'body' in request and 'headers' not in request:
+                request['headers'] = { "Content-Type": "application/json" }
+        attempts = 0
+        while pending and attempts < 5:
+            attempts   += 1
+            throttled   = []
+            retry_after = 0
+            for i in range(0, len(pending), 20):
+                chunk = pending[i:i + 20]
+                response = self.session.post(f"{self.graph_api_url}/v1.0/$batch", headers=self.headers, json={ "requests": chunk })
+                if response.status_code in (429, 503):
+                    throttled.extend(chunk)
+                    retry_after = max(retry_after, int(response.headers.get('Retry-After', 5)))
+                    continue
+                if response.status_code != 200:
+                    self.log.warning("() FAILURE_BATCH %s (%s)", response.status_code, response.text)
+                    for request in chunk:
+                        results[request['id']] = { "status": response.status_code, "body": None }
+                    continue
+                chunk_by_id = { request['id']: request for request in chunk }
+                for item in response.json().get('responses', []):
+                    if item.get('status') == 429:
+                        throttled.append(chunk_by_id[item['id']])
+                        retry_after = max(retry_after, int(item.get('headers', {}).get('Retry-After', 5)))
+                        continue
+                    results[item['id']] = { "status": item.get('status'), "body": item.get('body') }
+            pending = throttled
+            if pending:
+                self.log.debug("() RATE_LIMIT_PAUSE %s throttled, waiting %ss", len(pending), retry_after)
+                self.metrics.retry("graph", "batch_429")
+                self.metrics.throttle("graph", retry_after)
+                time.sleep(retry_after)
+        for request in pending:
+            results[request['id']] = { "status": 429, "body": None }
+        return results
+
+    def __get_paged__(self, next_uri, query=None):
+        ## every page of a graph collection (follows @odata.nextLink) - None on failure
+        my_list = []
+        while next_uri:
+            response = self.session.get(next_uri, headers=self.headers, params=query)
+            if response.status_code != 200:
+                self.log.warning("() FAILURE_GET_PAGED %s (%s)", response.status_code, next_uri)
+                return None
+            data = response.json()
+            my_list.extend(data.get('value', []))
+            next_uri = data.get('@odata.nextLink')
+            query    = None   # the nextLink already carries the query
+        return my_list
+
+    def __owners_get__(self, function, ids):
+        ## owner ids of many objects (applications / servicePrincipals / groups) - 20 objects per $batch read,
+        ##   any further pages are followed directly. returns { id: set(owner ids) or None }
+        ids     = list(ids)
+        batch   = [{ "id": str(index), "method": "GET", "url": f"/{function}/{id}/owners?$select=id" } for index, id in enumerate(ids)]
+        owners  = {}
+        for request_id, result in self.__batch__(batch).items():
+            id = ids[int(request_id)]
+            if result['status'] != 200:
+                self.log.warning("(%s)(%s) FAILURE_OWNERS_FETCH %s", id, function, result['status'])
+                owners[id] = None
+                continue
+            values = result['body'].get('value', [])
+            if result['body'].get('@odata.nextLink'):
+                more = self.__get_paged__(result['body']['@odata.nextLink'])
+                if more is None:
+                    owners[id] = None
+                    continue
+                values.extend(more)
+            owners[id] = { owner['id'] for owner in values }
+        return owners
+
+    def __owners_set_chunk__(self, function, desired_by_id, operation):
+        ## one read (batched) and one set of batched writes for up to 20 objects - see __owners_set__
+        current_by_id = self.__owners_get__(function, desired_by_id.keys())
+        results  = {}
+        changes  = {}
+        for id, desired in desired_by_id.items():
+            current = current_by_id.get(id)
+            if current is None:
+                results[id] = False
+                continue
+            results[id] = True
+            to_add    = desired - current if operation in ("set", "add") else set()
+            to_remove = current - desired if operation == "set" else current & desired if operation == "remove" else set()
+            for user_oid in sorted(to_add):
+                changes[str(len(changes))] = (id, user_oid, "added", { "method": "POST", "url": f"/{function}/{id}/owners/$ref",
+                    "body": { "@odata.id": f"{self.graph_api_url}/v1.0/directoryObjects/{user_oid}" } })
+            for user_oid in sorted(to_remove):
+                changes[str(len(changes))] = (id, user_oid, "removed", { "method": "DELETE", "url": f"/{function}/{id}/owners/{user_oid}/$ref" })
+        batch = [dict(request, id=request_id) for request_id, (id, user_oid, action, request) in changes.items()]
+        for request_id, result in self.__batch__(batch).items():
+            id, user_oid, action, request = changes[request_id]
+            if result['status'] == 204:
+                self.log.info("(%s)(%s)(%s) %s owner", id, function, user_oid, action)
+                continue
+            self.log.warning("(%s)(%s)(%s) FAILURE_OWNERS owner not %s %s (%s)", id, function, user_oid, action, result['status'], result['body'])
+            results[id] = False
+        return results
+
+    def __owners_set__(self, function, desired_by_id, operation="set", max_workers=5):
+        ## owners for many objects from { id: [user oids] } - owners are read once per object, only the difference is written
+        ##   operation: "set" (add missing, remove the rest), "add" (add missing only), "remove" (remove the listed ones)
+        ##   objects go 20 at a time (one $batch read, batched writes) across max_workers threads
+        ##   returns { id: True/False }
+        desired_by_id = { id: set(user_oids or []) for id, user_oids in desired_by_id.items() }
+        ids     = list(desired_by_id)
+        chunks  = [{ id: desired_by_id[id] for id in ids[i:i + 20] } for i in range(0, len(ids), 20)]
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_results in executor.map(lambda chunk: self.__owners_set_chunk__(function, chunk, operation), chunks):
+                results.update(chunk_results)
+        return results
+
     def __read_from_cache__(self, cache_file):
-        with open(cache_file, "r") as f:
-            data = json.load(f)
-            return data
+        ## None if the file is missing or was damaged (removed) - fetch it again
+        return self.cache_io.read(cache_file)
         
     def __write_to_cache__(self, cache_file, data):
         if self.cache_dir is None: return
         self.logger.debug(f"-e-e-e- Writing into disk cache: {cache_file}")
-        with open(cache_file, "w") as f:
-            json.dump(data, f)
+        self.cache_io.write(cache_file, data)
 
     def __load_json_file__(self, file_path):
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError, IOError) as e:
-            self.logger.warning(f"Failed to load JSON from {file_path}: {e}")
+        data = self.cache_io.read(file_path)
+        if data is None:
+            self.logger.warning(f"Failed to load JSON from {file_path}")
             data = {}
         return data
     
@@ -225,16 +357,20 @@ class EntraClient:
 
         # is it in memory already?
         if not FORCE_NEW and my_request in my_cache:
+            self.metrics.cache(f"entra.{my_type}", "memory")
             return my_cache[my_request]
         
         if my_cache_dir is not None and self.__is_valid_uuid__(my_request):
             my_filename = f"{my_cache_dir}/{urllib.parse.quote(my_request, safe='')}.json"
             if not FORCE_NEW:
-                if os.path.exists(my_filename):
-                    data = self.__read_from_cache__(my_filename)
+                data = self.__read_from_cache__(my_filename)
+                if data is not None:
                     my_cache[data['id']]   = data
                     my_cache[data[my_key]] = data
+                    self.__cache_changed__(my_type)
+                    self.metrics.cache(f"entra.{my_type}", "disk")
                     return data
+        self.metrics.cache(f"entra.{my_type}", "miss")
 
         next_uri = f"{self.graph_api_url}/v1.0/{my_type}"
         if self.__is_valid_uuid__(my_request):
@@ -247,7 +383,7 @@ class EntraClient:
             ## if change here - change in bulk below
             query["$select"] = 'businessPhones,displayName,givenName,jobTitle,mail,mobilePhone,officeLocation,preferredLanguage,surname,userPrincipalName,id,proxyAddresses,mailNickname,accountEnabled,signInActivity,lastPasswordChangeDateTime'
             
-        response = requests.get(next_uri, headers=self.headers, params=query)
+        response = self.session.get(next_uri, headers=self.headers, params=query)
         if response.status_code != 200:
             self.logger.debug(f"{self.__class__.__name__}.{self.__caller_info__()}({my_request}) Failed to retrieve {my_type} ({response.json()})")
             return None
@@ -268,31 +404,49 @@ class EntraClient:
             my_cache[my_item[my_key].lower()] = my_item
         else:
             my_cache[my_item[my_key]] = my_item
+        self.__cache_changed__(my_type)
         return my_item
     
-    def __get_all__(self, my_type, my_cache, my_cache_dir, my_key, STOP_LIMIT=None):
+    def __get_all__(self, my_type, my_cache, my_cache_dir, my_key, STOP_LIMIT=None, FORCE_NEW=False):
         count      = 0
         my_list    = []
         my_limit   = 100000
         if STOP_LIMIT is not None: my_limit = STOP_LIMIT
-        if my_cache_dir is not None:
+        ## FORCE_NEW skips the disk cache and pulls everything again (the files are rewritten below)
+        ##   the directory is only a full listing once the marker a completed pull leaves is there - get_details() and
+        ##   prefix lookups write single objects into it too
+        complete_marker = f"{my_cache_dir}/{COMPLETE_MARKER}" if my_cache_dir is not None else None
+        if my_cache_dir is not None and not FORCE_NEW and os.path.exists(complete_marker):
             json_files = glob.glob(os.path.join(my_cache_dir, "*.json"))
             if (len(json_files) > 0):
                 self.logger.debug(f"USING CACHED FILES ({my_type}): {len(json_files)}")
+                self.metrics.cache(f"entra.{my_type}.all", "disk")
+                complete = True
                 for json_file in json_files:
                     if count >= my_limit:
                         self.logger.debug(f"STOP_LIMIT reached for {my_type} ({my_limit})")
+                        complete = False
                         break
                     count += 1
-                    data = self.__load_json_file__(json_file)
+                    data = self.__read_from_cache__(json_file)
+                    if data is None:
+                        ## damaged file - the listing can't be trusted to be whole any more, pull it again below
+                        my_list  = []
+                        complete = None
+                        break
                     my_list.append(data)
                     my_cache[data['id']]   = data
                     if my_type == "users":
                         my_cache[data[my_key].lower()] = data
                     else:
                         my_cache[data[my_key]] = data
-                return my_list
+                self.__cache_changed__(my_type)
+                if complete:
+                    self.loaded_all.add(my_type)
+                if complete is not None:
+                    return my_list
             
+        self.metrics.cache(f"entra.{my_type}.all", "miss")
         ## TODO: implement stoplimit properly
         next_uri = f"{self.graph_api_url}/v1.0/{my_type}"
         query = {}
@@ -301,7 +455,7 @@ class EntraClient:
             query["$select"] = 'businessPhones,displayName,givenName,jobTitle,mail,mobilePhone,officeLocation,preferredLanguage,surname,userPrincipalName,id,proxyAddresses,mailNickname,accountEnabled,signInActivity,lastPasswordChangeDateTime'
         while next_uri:
             self.logger.debug(f"Getting {my_type} from {next_uri}")
-            response = requests.get(next_uri, headers=self.headers, params=query)
+            response = self.session.get(next_uri, headers=self.headers, params=query)
             if response.status_code != 200:
                 self.logger.warning(f"{self.__class__.__name__}.{self.__caller_info__()}() Failed to retrieve all {my_type} ({response.json()})")
                 return None
@@ -314,7 +468,75 @@ class EntraClient:
             my_cache[data[my_key]] = data
             if my_cache_dir is not None:
                 self.__write_to_cache__(f"{my_cache_dir}/{urllib.parse.quote(data['id'], safe='').lower()}.json", data)
+        self.__cache_changed__(my_type)
+        if complete_marker is not None:
+            with open(complete_marker, 'w') as f:
+                f.write(f"{len(my_list)} {my_type} {datetime.now().isoformat()}\n")
+        self.loaded_all.add(my_type)
         return my_list
+
+    def __cache_changed__(self, my_type):
+        ## called after every write into a type's cache (new objects, renames, objects replaced in place) - the size
+        ##   alone does not show a rename, so __prefix_local__ compares this instead
+        self.cache_generation[my_type] = self.cache_generation.get(my_type, 0) + 1
+
+    def __prefix_local__(self, my_type, my_cache, my_key, prefix):
+        ## prefix match against an already complete cache - sorted lower case names + bisect, rebuilt after any cache write
+        generation = self.cache_generation.get(my_type, 0)
+        index      = self.prefix_index.get(my_type)
+        if index is None or index[0] != generation:
+            items = list({ item['id']: item for item in my_cache.values() if item is not None }.values())
+            items.sort(key=lambda item: (item.get(my_key) or '').lower())
+            index = (generation, [(item.get(my_key) or '').lower() for item in items], items)
+            self.prefix_index[my_type] = index
+        generation, names, items = index
+        prefix = prefix.lower()
+        position = bisect.bisect_left(names, prefix)
+        while position < len(names) and names[position].startswith(prefix):
+            yield items[position]
+            position += 1
+
+    def __get_prefix__(self, my_type, my_cache, my_cache_dir, my_key, prefix, FORCE_NEW=False):
+        ## generator over every object whose my_key starts with prefix (graph startswith is case insensitive, so is the local one)
+        ##   answered from the cache without a call when __get_all__ has loaded the whole type, else all pages from graph
+        ##   ($count + ConsistencyLevel: eventual is the advanced query mode) with each object put in the caches on the way
+        ##   the generator returns False if graph fails part way - see __get_prefix_list__
+        if not FORCE_NEW and my_type in self.loaded_all:
+            self.metrics.cache(f"entra.{my_type}.prefix", "memory")
+            yield from self.__prefix_local__(my_type, my_cache, my_key, prefix)
+            return True
+        self.metrics.cache(f"entra.{my_type}.prefix", "miss")
+        next_uri = f"{self.graph_api_url}/v1.0/{my_type}"
+        query    = { "$filter": f"startswith({my_key}, '{prefix.replace(chr(39), chr(39) * 2)}')", "$count": "true", "$top": 999 }
+        headers  = dict(self.headers, ConsistencyLevel="eventual")
+        while next_uri:
+            response = self.session.get(next_uri, headers=headers, params=query)
+            if response.status_code != 200:
+                self.log.warning("(%s) FAILURE_PREFIX %s %s (%s)", prefix, my_type, response.status_code, response.text)
+                return False
+            data = response.json()
+            if query:
+                self.log.debug("(%s) %s %s match", prefix, data.get('@odata.count'), my_type)
+            for item in data.get('value', []):
+                my_cache[item['id']] = item
+                my_cache[item[my_key].lower() if my_type == "users" else item[my_key]] = item
+                if my_cache_dir is not None:
+                    self.__write_to_cache__(f"{my_cache_dir}/{urllib.parse.quote(item['id'], safe='').lower()}.json", item)
+                self.__cache_changed__(my_type)
+                yield item
+            next_uri = data.get('@odata.nextLink')
+            query    = None   # the nextLink already carries the query
+        return True
+
+    def __get_prefix_list__(self, my_type, my_cache, my_cache_dir, my_key, prefix, FORCE_NEW=False):
+        ## __get_prefix__ as a list - None if graph failed part way (same as the old single page versions)
+        my_list   = []
+        generator = self.__get_prefix__(my_type, my_cache, my_cache_dir, my_key, prefix, FORCE_NEW)
+        while True:
+            try:
+                my_list.append(next(generator))
+            except StopIteration as done:
+                return my_list if done.value else None
     
     def __caller_info__(self):
         # Dynamically fetch the class and method names
@@ -21,15 +21,26 @@ SOFTWARE.
 """
 
 import json
-import requests
+import urllib
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pythonCommonLogger import CommonLoggerAdapter
+
+## the "custom" application template - what the portal uses for "Create your own application" (non-gallery)
+NON_GALLERY_TEMPLATE_ID = "8adf8e6e-67b2-4cf2-a259-e3dc5476c621"
+
+## every group assigned to an app gets its own appRole named "{group name} EntraAppRole"
+APP_ROLE_SUFFIX = " EntraAppRole"
 
 class Applications:
     def __init__(self, client):
         self.client           = client
+        self.log              = CommonLoggerAdapter(client.logger, self.__class__.__name__)
         self.cache            = {}
         self.sp_cache         = {}
+        self.assignments      = {}    # service principal id -> appRoleAssignedTo map (see __assignments__)
+        self.notes_cache      = {}    # application id -> { "notes": parsed notes, "etag": .. } (see __notes_fetch__)
         self.apps_cache_dir = None
         self.sp_cache_dir   = None
         if (self.client.cache_dir is not None):
@@ -76,7 +87,7 @@ class Applications:
         self.client.logger.info(f"Disabling SSO for service principal {service_principal_id}")
         next_uri = f"{self.client.graph_api_url}/v1.0/servicePrincipals/{service_principal_id}"
         payload = { "preferredSingleSignOnMode": "notSupported"  }
-        response = requests.patch(next_uri, headers=self.client.headers, json=payload)
+        response = self.client.session.patch(next_uri, headers=self.client.headers, json=payload)
         if response.status_code != 204:
             self.client.logger.error("Failed to disable SSO")
             self.client.logger.error(f"URI: {next_uri}")
@@ -84,152 +95,282 @@ class Applications:
             exit(1)
         self.client.logger.info(f"SSO disabled for service principal {service_principal_id}")
 
-    def delete_group(self, service_principal_id, group_id):
+    def __assignments__(self, service_principal_id, FORCE_NEW=False):
+        ## every appRoleAssignedTo entry of a service principal (all pages), read once and then kept up to date in place
+        ##   { "by_id": { assignment id: assignment }, "by_principal": { principalId: [..] }, "by_role": { appRoleId: [..] } }
+        if not FORCE_NEW and service_principal_id in self.assignments:
+            self.client.metrics.cache("entra.appRoleAssignedTo", "memory")
+            return self.assignments[service_principal_id]
+        self.client.metrics.cache("entra.appRoleAssignedTo", "miss")
+        my_map   = { "by_id": {}, "by_principal": {}, "by_role": {} }
         next_uri = f"{self.client.graph_api_url}/v1.0/servicePrincipals/{service_principal_id}/appRoleAssignedTo"
-        response = requests.get(next_uri, headers=self.client.headers)
-        if response.status_code != 200:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({service_principal_id})({group_id}) Error (1) deleting group from service principal response code: {response.status_code}")
-            return False
-        for value in response.json()['value']:
-            if value['principalId'] == group_id:
-                next_uri = f"{self.client.graph_api_url}/v1.0/servicePrincipals/{service_principal_id}/appRoleAssignedTo/{value['id']}"
-                response = requests.delete(next_uri, headers=self.client.headers)
-                if response.status_code != 204:
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({service_principal_id})({group_id}) Error (2) deleting group from service principal response code: {response.status_code}")
-                    return False
+        query    = { "$top": 999 }
+        while next_uri:
+            response = self.client.session.get(next_uri, headers=self.client.headers, params=query)
+            if response.status_code != 200:
+                self.log.info("(%s) FAILURE_GROUP_APP Failed to retrieve users/groups assigned %s", service_principal_id, response.status_code)
+                return None
+            data = response.json()
+            for assignment in data.get('value', []):
+                self.__assignment_added__(my_map, assignment)
+            next_uri = data.get('@odata.nextLink')
+            query    = {}
+        self.assignments[service_principal_id] = my_map
+        return my_map
+
+    def __assignment_added__(self, my_map, assignment):
+        my_map["by_id"][assignment['id']] = assignment
+        my_map["by_principal"].setdefault(assignment['principalId'], []).append(assignment)
+        my_map["by_role"].setdefault(assignment['appRoleId'], []).append(assignment)
+
+    def __assignment_removed__(self, my_map, assignment):
+        my_map["by_id"].pop(assignment['id'], None)
+        for index, key in (("by_principal", assignment['principalId']), ("by_role", assignment['appRoleId'])):
+            remaining = [item for item in my_map[index].get(key, []) if item['id'] != assignment['id']]
+            if remaining:
+                my_map[index][key] = remaining
+            else:
+                my_map[index].pop(key, None)
+
+    def get_assignments(self, service_principal_id, principal_id=None, app_role_id=None, FORCE_NEW=False):
+        ## assignments of a service principal, optionally only those of one principal (user/group) or one appRole
+        my_map = self.__assignments__(service_principal_id, FORCE_NEW)
+        if my_map is None: return None
+        if principal_id is not None:
+            return list(my_map["by_principal"].get(principal_id, []))
+        if app_role_id is not None:
+            return list(my_map["by_role"].get(app_role_id, []))
+        return list(my_map["by_id"].values())
+
+    def delete_groups(self, service_principal_id, group_ids):
+        ## unassign many groups from a service principal - one (cached) read of the assignments and the DELETEs in $batch
+        ##   returns { group_id: True/False } - False also when the group was not assigned
+        my_map = self.__assignments__(service_principal_id)
+        if my_map is None:
+            self.log.warning("(%s) Error (1) deleting group from service principal", service_principal_id)
+            return { group_id: False for group_id in group_ids }
+        results  = {}
+        requests_by_id = {}
+        for group_id in dict.fromkeys(group_ids):
+            assigned = my_map["by_principal"].get(group_id, [])
+            if not assigned:
+                self.log.info("(%s)(%s) Group not assigned to application", service_principal_id, group_id)
+                results[group_id] = False
+                continue
+            results[group_id] = True
+            for assignment in assigned:
+                requests_by_id[str(len(requests_by_id))] = (group_id, assignment)
+        batch = [{ "id": request_id, "method": "DELETE", "url": f"/servicePrincipals/{service_principal_id}/appRoleAssignedTo/{assignment['id']}" }
+                 for request_id, (group_id, assignment) in requests_by_id.items()]
+        for request_id, result in self.client.__batch__(batch).items():
+            group_id, assignment = requests_by_id[request_id]
+            ## 404 - already gone (removed elsewhere) so the map was stale, either way it is not assigned anymore
+            if result['status'] in (204, 404):
+                self.__assignment_removed__(my_map, assignment)
+                continue
+            self.log.warning("(%s)(%s) Error (2) deleting group from service principal response code: %s", service_principal_id, group_id, result['status'])
+            results[group_id] = False
+        for group_id, status in results.items():
+            if status:
                 self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({service_principal_id})({group_id}) Group deleted from application")
-                return True
-        self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({service_principal_id})({group_id}) Group not assigned to application")
-        return False
+        return results
+
+    def delete_group(self, service_principal_id, group_id):
+        return self.delete_groups(service_principal_id, [group_id])[group_id]
     
-    def get_users_groups(self, app_name, service_principal_id):
+    def get_users_groups(self, app_name, service_principal_id, FORCE_NEW=False):
         self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}() Getting Users/Groups assigned to {app_name}")
-        next_uri = f"{self.client.graph_api_url}/v1.0/servicePrincipals/{service_principal_id}/appRoleAssignedTo"
-        response = requests.get(next_uri,headers=self.client.headers,)
-        if response.status_code != 200:
-            self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_name}) FAILURE_GROUP_APP Failed to retrieve users/groups assigned {response.status_code}")
+        assignments = self.get_assignments(service_principal_id, FORCE_NEW=FORCE_NEW)
+        if assignments is None:
+            self.log.info("(%s) FAILURE_GROUP_APP Failed to retrieve users/groups assigned", app_name)
             return None
-        response_json = response.json()
-        # logger.debug(json.dumps(response_json, indent=4))
-        if "value" in response_json and len(response_json["value"]) > 0:
-            return response_json["value"]
-        self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}() No users/groups assigned to ({app_name}) ({service_principal_id})")
-        return []
+        if len(assignments) == 0:
+            self.log.debug("() No users/groups assigned to (%s) (%s)", app_name, service_principal_id)
+        return assignments
     
-    def __add_role__(self, names, app_id, app_details): 
-        ## you have to do this in bulk - otherwise you have to wait a long time between
-        if app_details is not None:
-            if "appRoles" in app_details:
-                new_app_details = app_details["appRoles"]
-            else:
-                new_app_details = []
+    def __app_role_name__(self, name):
+        ## canonical displayName / description of the appRole we create per group - __add_group__ looks roles up by it
+        return f"{name}{APP_ROLE_SUFFIX}"
 
-        for name in names:
-            # Check if the name is already in the description field of any existing roles
-            if any(name in role['description'] for role in new_app_details):
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({names}) - Role with description containing '{name}' already exists.")
+    def __plan_roles__(self, names, app_details):
+        ## existing roles indexed by canonical name (displayName, or description for roles made by older versions)
+        ##   returns (full appRoles list with the missing ones appended, new roles, { name: role id })
+        existing = list(app_details.get("appRoles") or [])
+        by_key   = {}
+        for role in existing:
+            for key in (role.get('displayName'), role.get('description')):
+                if key and key.endswith(APP_ROLE_SUFFIX):
+                    by_key.setdefault(key, role['id'])
+        new_roles = []
+        role_ids  = {}
+        for name in dict.fromkeys(names):
+            key = self.__app_role_name__(name)
+            if key in by_key:
+                role_ids[name] = by_key[key]
                 continue
-
             appRoleUUID = str(uuid.uuid4())
-            new_app_role = {
+            new_roles.append({
                 "id": appRoleUUID,  # Generate a unique GUID for this role
                 "allowedMemberTypes": ["User"],  # only works with User as option
-                "description": f"{name} EntraAppRole", 
-                "displayName": f"{name} EntraAppRole",  ## NOTE if you change here look for the same in self.add_group()
+                "description": key, 
+                "displayName": key,
                 "isEnabled": True,
                 "value": f"{appRoleUUID}"  
-            }
-            new_app_details.append(new_app_role)
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({names}) new_app_role: {new_app_role}")
+            })
+            by_key[key]    = appRoleUUID
+            role_ids[name] = appRoleUUID
+        return existing + new_roles, new_roles, role_ids
 
-        if new_app_details != app_details:
+    def __add_role__(self, names, app_id, app_details): 
+        ## you have to do this in bulk - otherwise you have to wait a long time between
+        ##   every missing role goes in one PATCH; returns { name: appRole id } for all names, None on failure
+        ##   app_details (normally the cache entry) gets the new appRoles so a retry does not add them again
+        if app_details is None:
+            app_details = self.get_details(app_id, True)
+            if app_details is None:
+                self.log.warning("(%s) FAILURE_GROUP_APPROLE app %s not found", names, app_id)
+                return None
+        for attempt in (1, 2):
+            app_roles, new_roles, role_ids = self.__plan_roles__(names, app_details)
+            if not new_roles:
+                self.log.debug("(%s) - all roles already exist.", names)
+                return role_ids
+            self.log.debug("(%s) new_app_roles: %s", names, new_roles)
             next_uri = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
-            response = requests.patch(next_uri,headers=self.client.headers,json={"appRoles": new_app_details})
+            response = self.client.session.patch(next_uri,headers=self.client.headers,json={"appRoles": app_roles})
             if response.status_code == 204:
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({names}) New appRole added {app_id}")
-                return new_app_details
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({names}) FAILURE_GROUP_APPROLE to add new appRole(s)")
-            return None
-        return app_details
+                app_details["appRoles"] = app_roles
+                self.log.debug("(%s) %s new appRole(s) added %s", names, len(new_roles), app_id)
+                return role_ids
+            if attempt == 1:
+                ## most likely planned from a stale cache entry (graph refuses to drop enabled roles) - re-read and plan again
+                self.log.debug("(%s) appRoles PATCH %s - re-reading %s", names, response.status_code, app_id)
+                fresh = self.get_details(app_id, True)
+                if fresh is None:
+                    break
+                app_details.clear()
+                app_details.update(fresh)
+        self.log.warning("(%s) FAILURE_GROUP_APPROLE to add new appRole(s)", names)
+        return None
     
     def __add_group__(self, group_name, app_name, app_id, app_details):
         service_principal_id = self.get_service_principal_id(app_name)
-        existing_assignments = self.get_users_groups(app_name, service_principal_id)
-        self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) existing_assignments: {existing_assignments}")
-        if existing_assignments is None:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) FAILURE_GROUP_APP Failed to retrieve existing assignments - WHY?")
+        my_map = self.__assignments__(service_principal_id)
+        if my_map is None:
+            self.log.warning("(%s) FAILURE_GROUP_APP Failed to retrieve existing assignments - WHY?", group_name)
             return False           
         if not isinstance(group_name, list):
             groups = [group_name]
         else:
             groups = group_name
-        appRoleResponse = self.__add_role__(groups, app_id, app_details)
-        if appRoleResponse is None:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) FAILURE_GROUP_APPROLE Failed to add to {app_name}")
+        role_ids = self.__add_role__(groups, app_id, app_details)
+        if role_ids is None:
+            self.log.warning("(%s) FAILURE_GROUP_APPROLE Failed to add to %s", group_name, app_name)
             return False
-        for my_group_name in groups:
+        batch    = []
+        groups_by_request = {}
+        for my_group_name in dict.fromkeys(groups):
             group_id = self.client.Groups.get_id(my_group_name)
             if group_id is None:
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name})({my_group_name}) FAILURE_GROUP_APP not found")
+                self.log.warning("(%s)(%s) FAILURE_GROUP_APP not found", group_name, my_group_name)
                 continue
-            if any(assignment["principalId"] == group_id for assignment in existing_assignments):
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name})({my_group_name}) is already attached to application {app_name}")
+            if group_id in my_map["by_principal"]:
+                self.log.debug("(%s)(%s) is already attached to application %s", group_name, my_group_name, app_name)
                 continue
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name})({my_group_name}) found with ID {group_id}")
-            # note if this changes in __add_role__ need to fix here
-            for appRole in appRoleResponse:
-                if f"{my_group_name} EntraAppRole" == appRole['displayName']:
-                    appRoleUUID = appRole['id']
+            appRoleUUID = role_ids.get(my_group_name)
+            if appRoleUUID is None:
+                self.log.warning("(%s)(%s) FAILURE_GROUP_APPROLE no appRole on %s", group_name, my_group_name, app_name)
+                return False
+            self.log.debug("(%s)(%s) found with ID %s", group_name, my_group_name, group_id)
             add_group_body = {
                 "principalId": group_id,
                 "resourceId": service_principal_id,  ## service principal ID
                 "appRoleId": appRoleUUID
             }
-            next_uri = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/appRoleAssignments"
-            response = requests.post( next_uri,headers=self.client.headers,json=add_group_body)
-            if response.status_code == 201:
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name})({my_group_name}) Group added to {app_name}")
+            groups_by_request[str(len(batch))] = my_group_name
+            batch.append({ "id": str(len(batch)), "method": "POST", "url": f"/groups/{group_id}/appRoleAssignments", "body": add_group_body })
+        status = True
+        for request_id, result in self.client.__batch__(batch).items():
+            my_group_name = groups_by_request[request_id]
+            if result['status'] == 201:
+                self.__assignment_added__(my_map, result['body'])
+                self.log.debug("(%s)(%s) Group added to %s", group_name, my_group_name, app_name)
             else:
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name})({my_group_name}) FAILURE_GROUP_APP Failed to add group to ({app_name}) - {response.status_code} - {add_group_body}")
-                return False
-        return True
+                self.log.warning("(%s)(%s) FAILURE_GROUP_APP Failed to add group to (%s) - %s - %s", group_name, my_group_name, app_name, result['status'], result['body'])
+                status = False
+        return status
 
     def add_group(self, group_name, app_name, app_id, app_details):
+        ## new appRoles take a few seconds to show up on the service principal - retry with a growing wait
+        ##   a retry only redoes what is missing (roles and assignments are cached as they are made)
         status = self.__add_group__(group_name, app_name, app_id, app_details)
-        if not status:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_name}) FAILURE_GROUP_APP Failed to add group to - sleep for 15s and try again")
-            time.sleep(15)
+        for wait in (5, 10, 20):
+            if status:
+                return True
+            self.log.warning("(%s) FAILURE_GROUP_APP Failed to add group to - sleep for %ss and try again", app_name, wait)
+            time.sleep(wait)
             status = self.__add_group__(group_name, app_name, app_id, app_details)
-            if not status:
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_name}) FAILURE_GROUP_APP Failed to add group")
-                return False
+        if not status:
+            self.log.warning("(%s) FAILURE_GROUP_APP Failed to add group", app_name)
+            return False
         return True
     
-    def get_with_prefix(self, app_prefix):
-        limit = 250
-        url = f"{self.client.graph_api_url}/v1.0/applications?$filter=startswith(displayName, '{app_prefix}')&$top={limit}"
-        response = requests.get( url, headers=self.client.headers)
-        if response.status_code == 200:
-            return response.json()['value']
-        return None
+    def create_non_gallery(self, app_name):
+        ## the graph version of the portal "Create your own application" - instantiating the custom (non-gallery)
+        ##   template makes the app registration and its service principal in a single call
+        ##   returns the application, or the existing one if an app with that name is already there
+        app_info = self.get_details(app_name, True)
+        if app_info is not None:
+            self.log.debug("(%s) already exists", app_name)
+            return app_info
+        next_uri = f"{self.client.graph_api_url}/v1.0/applicationTemplates/{NON_GALLERY_TEMPLATE_ID}/instantiate"
+        started  = time.time()
+        response = self.client.session.post(next_uri, headers=self.client.headers, json={ "displayName": app_name })
+        if response.status_code != 201:
+            self.log.warning("(%s) FAILURE_APP_CREATE %s - %s", app_name, response.status_code, response.text, extra={ "duration": round(time.time() - started, 3) })
+            return None
+        data     = response.json()
+        app_info = data.get('application')
+        sp_info  = data.get('servicePrincipal')
+        ## straight into the caches - a lookup right after the create can miss while graph replicates
+        for my_type, my_cache, my_cache_dir, item in (("applications", self.cache, self.apps_cache_dir, app_info), ("servicePrincipals", self.sp_cache, self.sp_cache_dir, sp_info)):
+            if item is None:
+                continue
+            my_cache[item['id']]          = item
+            my_cache[item['displayName']] = item
+            if my_cache_dir is not None:
+                self.client.__write_to_cache__(f"{my_cache_dir}/{urllib.parse.quote(item['id'], safe='').lower()}.json", item)
+            self.client.__cache_changed__(my_type)
+        self.log.info("(%s) SUCCESS_APP_CREATE", app_name, extra={ "duration": round(time.time() - started, 3) })
+        return app_info
+
+    def create_non_gallery_bulk(self, app_names, max_workers=5):
+        ## create_non_gallery() for many apps in parallel - returns { app_name: application or None }
+        app_names = list(dict.fromkeys(app_names))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.create_non_gallery, app_names))
+        created = sum(1 for app_info in results if app_info is not None)
+        self.log.info("() %s/%s apps created or already there", created, len(app_names))
+        return dict(zip(app_names, results))
+
+    def iter_with_prefix(self, app_prefix, FORCE_NEW=False):
+        ## every app registration whose name starts with app_prefix (all pages) - local when get_all() has loaded the apps
+        return self.client.__get_prefix__("applications", self.cache, self.apps_cache_dir, "displayName", app_prefix, FORCE_NEW)
+
+    def get_with_prefix(self, app_prefix, FORCE_NEW=False):
+        return self.client.__get_prefix_list__("applications", self.cache, self.apps_cache_dir, "displayName", app_prefix, FORCE_NEW)
 
     def delete(self, app_name, app_id):
         url = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
         self.client.logger.info (f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_name})({app_id})")
-        response = requests.delete( url, headers=self.client.headers)
+        response = self.client.session.delete( url, headers=self.client.headers)
         if response.status_code != 204:
             self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_name})({app_id}) Error deleting app response code: {response.status_code}")
             return False
         return True
     
     def __owners_fetch__(self, id, function):
-        next_uri = f"{self.client.graph_api_url}/v1.0/{function}/{id}/owners"
-        # print(f"FETCH next_uri: {next_uri}")
-        response = requests.get(next_uri, headers=self.client.headers)
-        if response.status_code != 200:
-            return None
-        owners= response.json().get('value', [])
-        return owners
+        return self.client.__get_paged__(f"{self.client.graph_api_url}/v1.0/{function}/{id}/owners")
     def owners_fetch_appregistration(self, app_id):
         return self.__owners_fetch__(app_id, "applications")
     def owners_fetch(self, service_principal_id):
@@ -250,142 +391,156 @@ class Applications:
 
     def __owners_add__(self, id, function, user_oids):
         ### owners can only be users, groups not an option (ugh...)
-        ### also while would be nice to add multiple owners at once, it's not an option
+        ### graph takes one owner per POST - they go through $batch (see client.__owners_set__)
         ### https://learn.microsoft.com/en-us/graph/api/serviceprincipal-post-owners?view=graph-rest-1.0&tabs=http    
-        status = True
-        current_owners = self.__owners_fetch__(id, function)
-        if current_owners is None:
-            current_owners = []
-        # print(f"current_owners: {current_owners}")
-        for user_oid in user_oids:
-            if any(owner['id'] == user_oid for owner in current_owners):
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({id})({function})({user_oid}) is already an owner")
-                continue
-            next_uri = f"{self.client.graph_api_url}/v1.0/{function}/{id}/owners/$ref"
-            payload = { "@odata.id" : f"https://graph.microsoft.com/v1.0/directoryObjects/{user_oid}" }
-            # print(f"next_uri: {next_uri}")
-            # print(f"payload: {payload}")
-            response = requests.post(next_uri, headers=self.client.headers, json=payload)
-            if response.status_code == 204:
-                self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({id})({user_oid}) added owner")
-            else:
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({id})({user_oid}) Error adding owner")
-                status = False
-        return status
+        return self.client.__owners_set__(function, { id: user_oids }, "add")[id]
     def owners_add_appregistration(self, app_id, user_oids):
         return self.__owners_add__(app_id, "applications", user_oids)
     def owners_add(self, service_principal_id, user_oids):
         return self.__owners_add__(service_principal_id, "servicePrincipals", user_oids)
 
     def __owners_remove__(self, id, function, user_oids):
-        status = True
-        current_owners = self.__owners_fetch__(id, function)
-        if current_owners is None:
-            return True    ## nothing to do if no owners
-        for user_oid in user_oids:
-            if any(owner['id'] == user_oid for owner in current_owners):
-                next_uri = f"{self.client.graph_api_url}/v1.0/{function}/{id}/owners/{user_oid}/$ref"
-                response = requests.delete(next_uri, headers=self.client.headers)
-                if response.status_code == 204:
-                    self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({id})({function})({user_oid}) removed owner")
-                else:
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({id})({function})({user_oid}) Error removing owner")
-                    status = False
-        return status
+        return self.client.__owners_set__(function, { id: user_oids }, "remove")[id]
     def owners_remove_appregistration(self, app_id, user_oids):
         return self.__owners_remove__(app_id, "applications", user_oids)
     def owners_remove(self, service_principal_id, user_oids):
         return self.__owners_remove__(service_principal_id, "servicePrincipals", user_oids)
 
+    ## owners become exactly user_oids - the bulk versions take { id: [user oids] } and return { id: True/False }
+    def set_owners_appregistration(self, app_id, user_oids):
+        return self.client.__owners_set__("applications", { app_id: user_oids })[app_id]
+    def set_owners(self, service_principal_id, user_oids):
+        return self.client.__owners_set__("servicePrincipals", { service_principal_id: user_oids })[service_principal_id]
+    def set_owners_appregistration_bulk(self, owners_by_app_id, max_workers=5):
+        return self.client.__owners_set__("applications", owners_by_app_id, max_workers=max_workers)
+    def set_owners_bulk(self, owners_by_service_principal_id, max_workers=5):
+        return self.client.__owners_set__("servicePrincipals", owners_by_service_principal_id, max_workers=max_workers)
+
     def __rename__(self, id, function, new_name):
         next_uri = f"{self.client.graph_api_url}/v1.0/{function}/{id}"
         payload = { "displayName": new_name }
-        response = requests.patch(next_uri, headers=self.client.headers, json=payload)
+        response = self.client.session.patch(next_uri, headers=self.client.headers, json=payload)
         if response.status_code != 204:
             return False
+        ## the cached object (and file) follow the rename - the old name must not find it any more
+        my_cache, my_cache_dir = (self.cache, self.apps_cache_dir) if function == "applications" else (self.sp_cache, self.sp_cache_dir)
+        item = my_cache.get(id)
+        if item is not None:
+            if my_cache.get(item.get('displayName')) is item:
+                del my_cache[item['displayName']]
+            item['displayName'] = new_name
+            my_cache[new_name]  = item
+            if my_cache_dir is not None:
+                self.client.__write_to_cache__(f"{my_cache_dir}/{urllib.parse.quote(id, safe='').lower()}.json", item)
+            self.client.__cache_changed__(function)
         return True
     def rename_appregistration(self, app_id, new_name):
         return self.__rename__(app_id, "applications", new_name)
     def rename(self, service_principal_id, new_name):
         return self.__rename__(service_principal_id, "servicePrincipals", new_name)
     
-    def set_note(self, app, key, value):
-        if self.client.__is_valid_uuid__(app):
-            app_id = self.get_id(app)
-        else:
-            app_id = app
-        if not app_id:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) app_id required")
-            return False
-        
-        # get the current notes field - this is a string value, we happen to put json into it
+    ## notes - the application "notes" field is a string, we happen to put json into it and use it as a key/value store
+    ##   parsed once per app (one GET) and kept in notes_cache, then updated from our own writes so reads cost nothing
+    def __parse_notes__(self, current_notes_str):
+        if not current_notes_str:
+            return {}
+        try:
+            return json.loads(current_notes_str)
+        except json.JSONDecodeError:
+            return {"original_notes_string": current_notes_str}
+
+    def __notes_fetch__(self, app_id, FORCE_NEW=False):
+        if not FORCE_NEW and app_id in self.notes_cache:
+            self.client.metrics.cache("entra.notes", "memory")
+            return self.notes_cache[app_id]
+        cached = self.cache.get(app_id)
+        if not FORCE_NEW and cached is not None and "notes" in cached:
+            ## the application object get_details() / get_all() already holds has the notes - no GET for them
+            self.client.metrics.cache("entra.notes", "memory")
+            entry = { "notes": self.__parse_notes__(cached["notes"]), "etag": cached.get("@odata.etag") }
+            self.notes_cache[app_id] = entry
+            return entry
+        self.client.metrics.cache("entra.notes", "miss")
         next_uri = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
-        response = requests.get(next_uri, headers=self.client.headers)
+        response = self.client.session.get(next_uri, headers=self.client.headers, params={ "$select": "id,notes" })
         if response.status_code != 200:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) failed to get notes {response.status_code}/{response.json()}")
-            return False
+            self.log.warning("(%s) failed to get notes %s/%s", app_id, response.status_code, response.text)
+            return None
         current_info = response.json()
-        current_notes_str = current_info.get("notes", "{}")
+        ## graph only hands out an etag for some objects - when there is one the PATCH below is made conditional on it
+        entry = { "notes": self.__parse_notes__(current_info.get("notes")),
+                  "etag":  response.headers.get("ETag") or current_info.get("@odata.etag") }
+        self.notes_cache[app_id] = entry
+        return entry
 
-        if not current_notes_str:
-            current_notes = {}
-        else: 
-            try:
-                current_notes = json.loads(current_notes_str)
-            except json.JSONDecodeError:
-                current_notes = {"original_notes_string": current_notes_str}
-
-        # (b) Update or add the key/value pair && convert back to a string
-        current_notes[key] = value
-        payload = {"notes": json.dumps(current_notes)}
-        next_uri = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
-        response = requests.patch(next_uri, headers=self.client.headers, json=payload)
-        if response.status_code == 204:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) note with ({key})/({value}) set")
-        else:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) note setting {response.status_code}/{response.json()}")
+    def __resolve_app_id__(self, app):
+        ## app name or id -> application object id (get_details handles both)
+        app_id = self.get_id(app) if app else None
+        if not app_id:
+            self.log.debug("(%s) app_id required", app)
+        return app_id
+
+    def set_notes(self, app, updates, FORCE_NEW=False):
+        ## set several note keys in a single PATCH - nothing is sent when every key already has that value
+        app_id = self.__resolve_app_id__(app)
+        if not app_id:
+            return False
+        for attempt in (1, 2):
+            entry = self.__notes_fetch__(app_id, FORCE_NEW or attempt > 1)
+            if entry is None:
+                return False
+            if all(key in entry["notes"] and entry["notes"][key] == value for key, value in updates.items()):
+                self.log.debug("(%s) notes already set (%s)", app_id, list(updates))
+                return True
+            new_notes = dict(entry["notes"], **updates)
+            headers   = dict(self.client.headers)
+            if entry["etag"]:
+                headers["If-Match"] = entry["etag"]
+            payload   = {"notes": json.dumps(new_notes)}
+            next_uri  = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
+            response  = self.client.session.patch(next_uri, headers=headers, json=payload)
+            if response.status_code == 204:
+                ## etag is now stale - drop it so the next write does not get a 412 on our own change
+                self.notes_cache[app_id] = { "notes": new_notes, "etag": None }
+                app_info = self.cache.get(app_id)
+                if app_info is not None:
+                    ## same dict is in the cache under the name too - and the file, so the next run starts from our write
+                    app_info["notes"] = payload["notes"]
+                    app_info.pop("@odata.etag", None)
+                    if self.apps_cache_dir is not None:
+                        self.client.__write_to_cache__(f"{self.apps_cache_dir}/{urllib.parse.quote(app_id, safe='').lower()}.json", app_info)
+                self.log.debug("(%s) notes set (%s)", app_id, updates)
+                return True
+            if response.status_code == 412 and attempt == 1:
+                ## someone else wrote the app since we read it - re-read and apply our keys on top once
+                self.log.debug("(%s) notes changed underneath us - retrying", app_id)
+                continue
+            self.log.warning("(%s) note setting %s/%s", app_id, response.status_code, response.text)
             return False
+        return False
+
+    def set_note(self, app, key, value):
+        return self.set_notes(app, { key: value })
     
-    def get_note(self, app):
-        if self.client.__is_valid_uuid__(app):
-            app_id = self.get_id(app)
-        else:
-            app_id = app
+    def get_note(self, app, FORCE_NEW=False):
+        app_id = self.__resolve_app_id__(app)
         self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id})")
         if not app_id:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) app_id required")
             return None
-        
-        # get the current notes field - this is a string value, we happen to put json into it
-        next_uri = f"{self.client.graph_api_url}/v1.0/applications/{app_id}"
-        response = requests.get(next_uri, headers=self.client.headers)
-        if response.status_code != 200:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) failed to get notes {response.status_code}/{response.json()}")
+        entry = self.__notes_fetch__(app_id, FORCE_NEW)
+        if entry is None:
             return None
-        current_info = response.json()
-        current_notes_str = current_info.get("notes", "{}")
+        return dict(entry["notes"])
 
-        if not current_notes_str:
-            current_notes = {}
-        else: 
-            try:
-                current_notes = json.loads(current_notes_str)
-            except json.JSONDecodeError:
-                current_notes = {"original_notes_string": current_notes_str}
-        return current_notes
-
-    def confirm_note(self, app, key, value):
-        if self.client.__is_valid_uuid__(app):
-            app_id = self.get_id(app)
-        else:
-            app_id = app
-        self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) {key} / {value}")
-        current_notes = self.get_note(app_id)
+    def confirm_note(self, app, key, value, FORCE_NEW=False):
+        ## answered from the notes cache (our own writes included) unless FORCE_NEW
+        self.log.debug("(%s) %s / %s", app, key, value)
+        current_notes = self.get_note(app, FORCE_NEW)
         if current_notes is None:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) no note found")
+            self.log.debug("(%s) no note found", app)
             return False
         if key in current_notes and current_notes[key] == value:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) key/value matched")
+            self.log.debug("(%s) key/value matched", app)
             return True
-        self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({app_id}) key/value not matched")
+        self.log.debug("(%s) key/value not matched", app)
         return False
@@ -21,7 +21,6 @@ SOFTWARE.
 """
 
 import json
-import requests
 import re
 import urllib
 
@@ -38,7 +37,7 @@ class DynamicGroups:
         next_uri = f"{self.client.graph_api_url}/v1.0/groups"
         encoded_dyn_group_name = urllib.parse.quote(dyn_group_name)
         check_uri = f"{next_uri}?$filter=displayName eq '{encoded_dyn_group_name}'"
-        response = requests.get(check_uri, headers=self.client.headers)
+        response = self.client.session.get(check_uri, headers=self.client.headers)
         if response.status_code == 200:
             groups = response.json().get('value', [])
             if groups:
@@ -63,7 +62,7 @@ class DynamicGroups:
                     "membershipRuleProcessingState": "On"
                 }
                 # print(payload)
-                create_response = requests.post(next_uri, headers=self.client.headers, json=payload)
+                create_response = self.client.session.post(next_uri, headers=self.client.headers, json=payload)
                 if create_response.status_code == 201:
                     self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({dyn_group_name}) SUCCESS_GROUP_DYNAMIC_CREATE")
                     return create_response.json()
@@ -92,7 +91,7 @@ class DynamicGroups:
     def add_group(self, dyn_group_id, group_id):
         # Step 1: Get the current group details
         group_details_url = f"{self.client.graph_api_url}/v1.0/groups/{dyn_group_id}"
-        response = requests.get(group_details_url, headers=self.client.headers)
+        response = self.client.session.get(group_details_url, headers=self.client.headers)
         if response.status_code != 200:
             self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({dyn_group_id}) FAILURE_GET_GROUP_DETAILS {response.text}")
             return None
@@ -115,7 +114,7 @@ class DynamicGroups:
         updated_membership_rule = f"user.memberOf -any (group.objectId -in [{group_ids_str}])"
         payload = { "membershipRule": updated_membership_rule, }
         update_url = f"{self.client.graph_api_url}/v1.0/groups/{dyn_group_id}"
-        update_response = requests.patch(update_url, headers=self.client.headers, data=json.dumps(payload))
+        update_response = self.client.session.patch(update_url, headers=self.client.headers, data=json.dumps(payload))
         if update_response.status_code != 204:
             self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({dyn_group_id}) FAILURE_UPDATE_MEMBERSHIP_RULE {update_response.text}")
             return None
@@ -20,14 +20,15 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import requests
 import urllib
 import os
 from concurrent.futures import ThreadPoolExecutor
+from pythonCommonLogger import CommonLoggerAdapter
 
 class Groups:
     def __init__(self, client):
         self.client           = client
+        self.log              = CommonLoggerAdapter(client.logger, self.__class__.__name__)
         self.cache            = {}
         self.groups_cache_dir = None
         self.groups_members_cache_dir = None
@@ -43,10 +44,10 @@ class Groups:
     
     def get_all_members(self, STOP_LIMIT=None):
         if self.groups_cache_dir is None:
-            self.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}() requires cache to be set - otherwise no point")
+            self.log.warning("() requires cache to be set - otherwise no point")
             return False
 
-        self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}() loading all groups")
+        self.log.debug("() loading all groups")
         groups = self.get_all(STOP_LIMIT)
         if groups is None:
             return None
@@ -88,17 +89,20 @@ class Groups:
             group_members_filename = f"{self.groups_members_cache_dir}/{urllib.parse.quote(group_id, safe='')}.json"
             if os.path.exists(group_members_filename):
                 if not FORCE_NEW:
-                    return self.client.__read_from_cache__(group_members_filename)
-                os.remove(group_members_filename)
+                    cached = self.client.__read_from_cache__(group_members_filename)
+                    if cached is not None:
+                        return cached
+                else:
+                    os.remove(group_members_filename)
         next_uri = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/members"
         while next_uri:
-            response = requests.get(next_uri, headers=self.client.headers)
+            response = self.client.session.get(next_uri, headers=self.client.headers)
             if response.status_code == 200:
                 data = response.json()
                 members.extend([member['id'] for member in data.get('value', [])])
                 next_uri = data.get('@odata.nextLink')
             else:
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}() Failed to get members for group '{group_id}': {response.text}")
+                self.log.warning("() Failed to get members for group '%s': %s", group_id, response.text)
                 return []
         if self.groups_cache_dir is not None:
             self.client.__write_to_cache__(group_members_filename, members)
@@ -115,13 +119,13 @@ class Groups:
             for chunk in chunks(membership_list, 19):
                 next_uri = f"{self.client.graph_api_url}/v1.0/groups/{group_id}"
                 payload = {"members@odata.bind": chunk}
-                response = requests.patch(next_uri, headers=self.client.headers, json=payload)
+                response = self.client.session.patch(next_uri, headers=self.client.headers, json=payload)
                 if response.status_code == 204:
-                    self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) added {len(chunk)} users successfully.")
+                    self.log.debug("(%s) added %s users successfully.", group_id, len(chunk))
                     total_added += len(chunk)
                 else:
                     # logger but keep going)
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) FAILURE_GROUP_USER failed to add {len(chunk)} users: {response.text}")
+                    self.log.warning("(%s) FAILURE_GROUP_USER failed to add %s users: %s", group_id, len(chunk), response.text)
             return total_added
         return 0
     
@@ -139,7 +143,7 @@ class Groups:
         if len(membership_list) > 0:
             return self.__add_users__(group_id, membership_list)
         else:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) No new users to add to group")
+            self.log.debug("(%s) No new users to add to group", group_id)
         return 0
     
     def remove_users(self, group_id, user_oids):
@@ -149,23 +153,22 @@ class Groups:
         for user_oid in user_oids:
             if user_oid in current_members:
                 next_uri = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/members/{user_oid}/$ref"
-                response = requests.delete(next_uri, headers=self.client.headers)
+                response = self.client.session.delete(next_uri, headers=self.client.headers)
                 if response.status_code == 204:
-                    self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) removed {user_oid} user successfully")
+                    self.log.debug("(%s) removed %s user successfully", group_id, user_oid)
                     removed_users = True
                 else:
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) FAILURE_GROUP_USER failed to remove {user_oid} user: {response.text}")
+                    self.log.warning("(%s) FAILURE_GROUP_USER failed to remove %s user: %s", group_id, user_oid, response.text)
         if not removed_users:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) No users to remove")
+            self.log.debug("(%s) No users to remove", group_id)
         return True
     
     def owners_fetch(self, group_id):
-        url = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/owners"
-        response = requests.get(url, headers=self.client.headers)
-        if response.status_code != 200:
-            self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) No group owners")
+        owners = self.client.__get_paged__(f"{self.client.graph_api_url}/v1.0/groups/{group_id}/owners")
+        if owners is None:
+            self.log.info("(%s) No group owners", group_id)
             return None
-        return response.json()
+        return { 'value': owners }
     def owners_fetch_oids(self, group_id):
         owners = self.owners_fetch(group_id)
         if owners is None:
@@ -173,57 +176,42 @@ class Groups:
         return [owner['id'] for owner in owners['value']]
     
     def owners_add(self, group_id, user_oids):
-        group_owners = self.owners_fetch(group_id)
-        if user_oids:
-            for user_oid in user_oids:
-                if any(owner['id'] == user_oid for owner in group_owners['value']):
-                    self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) {user_oid} is already an owner")
-                    continue
-                url = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/owners/$ref"
-                payload = { "@odata.id": f"{self.client.graph_api_url}/v1.0/users/{user_oid}" }
-                response = requests.post(url, headers=self.client.headers, json=payload)
-                if response.status_code != 204:
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) {user_oid} Error adding owner to group")
-                else:
-                    self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) {user_oid} is now a group owner")
-        return True
+        if not user_oids: return True
+        return self.client.__owners_set__("groups", { group_id: user_oids }, "add")[group_id]
     
     def owners_remove(self, group_id, user_oids):
-        group_owners = self.owners_fetch(group_id)
-        if user_oids:
-            for user_oid in user_oids:
-                if any(owner['id'] == user_oid for owner in group_owners['value']):
-                    # DELETE https://graph.microsoft.com/v1.0/groups/{id}/owners/{id}/$ref 
-                    url = f"{self.client.graph_api_url}/v1.0/groups/{group_id}/owners/{user_oid}/$ref"
-                    response = requests.delete(url, headers=self.client.headers)
-                    if response.status_code != 204: 
-                        self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) {user_oid} Error removing owner from group")
-                    else:
-                        self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id}) {user_oid} removed as group owner")
-        return True
+        if not user_oids: return True
+        return self.client.__owners_set__("groups", { group_id: user_oids }, "remove")[group_id]
+
+    def set_owners(self, group_id, user_oids):
+        ## owners become exactly user_oids - one read and only the difference written
+        return self.client.__owners_set__("groups", { group_id: user_oids })[group_id]
+
+    def set_owners_bulk(self, owners_by_group_id, max_workers=5):
+        ## set_owners() for { group_id: [user oids] } - returns { group_id: True/False }
+        return self.client.__owners_set__("groups", owners_by_group_id, max_workers=max_workers)
     
     def update_name(self, group_id, modified_group_name):
         url = f"{self.client.graph_api_url}/v1.0/groups/{group_id}"
         payload = { "displayName": modified_group_name }
-        response = requests.patch(url, headers=self.client.headers, json=payload)
+        response = self.client.session.patch(url, headers=self.client.headers, json=payload)
         if response.status_code != 204:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id})({modified_group_name}) Error updating group name response: ({response.text})")
+            self.log.warning("(%s)(%s) Error updating group name response: (%s)", group_id, modified_group_name, response.text)
             return False
-        self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_id})({modified_group_name}) Updated group name)")
+        self.log.info("(%s)(%s) Updated group name)", group_id, modified_group_name)
         return True
 
-    def get_prefix(self, groups_prefix):
-        limit = 250
-        url = f"{self.client.graph_api_url}/v1.0/groups?$filter=startswith(displayName, '{groups_prefix}')&$top={limit}"
-        response = requests.get( url, headers=self.client.headers)
-        if response.status_code == 200:
-            return  response.json()['value']
-        return None
+    def iter_prefix(self, groups_prefix, FORCE_NEW=False):
+        ## every group whose name starts with groups_prefix (all pages) - local when get_all() has loaded the groups
+        return self.client.__get_prefix__("groups", self.cache, self.groups_cache_dir, "displayName", groups_prefix, FORCE_NEW)
+
+    def get_prefix(self, groups_prefix, FORCE_NEW=False):
+        return self.client.__get_prefix_list__("groups", self.cache, self.groups_cache_dir, "displayName", groups_prefix, FORCE_NEW)
                     
     def delete(self, group_name, group_id):
         url = f"{self.client.graph_api_url}/v1.0/groups/{group_id}"
         self.client.logger.info (f"Deleting group ({group_name}) ({group_id})")
-        response = requests.delete( url, headers=self.client.headers)
+        response = self.client.session.delete( url, headers=self.client.headers)
         if response.status_code != 204:
             self.client.logger.warning(f"Error deleting group ({group_name}) ({group_id}) response code: {response.status_code}")
             return False    
@@ -233,15 +221,15 @@ class Groups:
         next_uri = f"{self.client.graph_api_url}/v1.0/groups"
         encoded_group_name = urllib.parse.quote(group_name)
         check_uri = f"{next_uri}?$filter=displayName eq '{encoded_group_name}'"
-        response = requests.get(check_uri, headers=self.client.headers)
+        response = self.client.session.get(check_uri, headers=self.client.headers)
 
         if response.status_code == 200:
             groups = response.json().get('value', [])
             if groups:
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) already exists.")
+                self.log.debug("(%s) already exists.", group_name)
                 return groups[0]  # Return the existing group
             else:
-                self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) Creating new group.")
+                self.log.debug("(%s) Creating new group.", group_name)
                 # Create the group
                 payload = {
                     "displayName": group_name,
@@ -250,25 +238,25 @@ class Groups:
                     "securityEnabled": True,
                     # "group_types": []   ## this could be "Unified" - but not sure what we need here
                 }
-                create_response = requests.post(next_uri, headers=self.client.headers, json=payload)
+                create_response = self.client.session.post(next_uri, headers=self.client.headers, json=payload)
                 if create_response.status_code == 201:
-                    self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) created successfully.")
+                    self.log.debug("(%s) created successfully.", group_name)
                     return create_response.json()
                 else:
-                    self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) FAILURE_GROUP_CREATE {create_response.text}")
+                    self.log.warning("(%s) FAILURE_GROUP_CREATE %s", group_name, create_response.text)
                     return None
         else:
-            self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) FAILURE_GROUP_CREATE Failed to check if group exists: {response.text}")
+            self.log.warning("(%s) FAILURE_GROUP_CREATE Failed to check if group exists: %s", group_name, response.text)
             return None
         
     def create(self, group_name):
         entra_group_info = self.get_details(group_name)
         if entra_group_info is None:
-            self.client.logger.info(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) Creating entra group")
+            self.log.info("(%s) Creating entra group", group_name)
             if not self.__create__(group_name):
-                self.client.logger.warning(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) FAILURE_GROUP_CREATE")
+                self.log.warning("(%s) FAILURE_GROUP_CREATE", group_name)
                 return None
         else:
-            self.client.logger.debug(f"{self.__class__.__name__}.{self.client.__caller_info__()}({group_name}) Entra group exists")
+            self.log.debug("(%s) Entra group exists", group_name)
         return group_name
     
@@ -20,7 +20,6 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import requests
 
 ###########################################################################################
 ## THIS IS NOT IN USE - NEVER GOT THIS TO WORK ... sigh ms does not expose these
@@ -37,7 +36,7 @@ class PasswordSSO:
 
     def credential_get(self, oid, type):
         next_url = f"{self.client.graph_api_url}/beta/{type}/{oid}/getPasswordSingleSignOnCredentials"
-        response = requests.post(next_url, headers=self.client.headers)
+        response = self.client.session.post(next_url, headers=self.client.headers)
         if response.status_code != 200:
             self.client.logger.warning(f"Failed to get passwordless credentials for {type} {oid}")
             return None
@@ -46,7 +45,7 @@ class PasswordSSO:
     def credential_remove(self, credential_id, oid, type):
         next_url = f"{self.client.graph_api_url}/beta/{type}/{oid}/deletePasswordSingleSignOnCredentials"
         payload = { "id": credential_id }
-        response = requests.post(next_url, headers=self.client.headers, json=payload)
+        response = self.client.session.post(next_url, headers=self.client.headers, json=payload)
         if response.status_code != 204:
             self.client.logger.warning(f"Failed to remove passwordless credentials for {type} {oid}")
             return False
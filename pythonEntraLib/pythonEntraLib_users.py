@@ -21,7 +21,8 @@ SOFTWARE.
 """
 
 import json
-import requests
+import urllib
+from pythonCommonLogger import CommonLoggerAdapter, LazyJson
 
 class Users:
     ## this class exists to cache the user OIDs to avoid repeated calls to the graph API
@@ -30,6 +31,7 @@ class Users:
     ##   This -will- cache None values, so if you get a None value, it will not try again on invalid email
     def __init__(self, client, user_emails=None):
         self.client          = client
+        self.log             = CommonLoggerAdapter(client.logger, self.__class__.__name__)
         self.cache           = {}
         self.users_cache_dir = None
         if (self.client.cache_dir is not None):
@@ -65,8 +67,60 @@ class Users:
                 oids.append(oid)
         return oids
     
-    def get_all(self, STOP_LIMIT=None):
-        return self.client.__get_all__("users", self.cache, self.users_cache_dir, 'userPrincipalName', STOP_LIMIT)
+    def get_all(self, STOP_LIMIT=None, FORCE_NEW=False):
+        return self.client.__get_all__("users", self.cache, self.users_cache_dir, 'userPrincipalName', STOP_LIMIT, FORCE_NEW)
+
+    def __m365_activity__(self, period='D180'):
+        ## per user last M365 activity date (the feed behind the portal "active users" export) - { upn lower: 'YYYY-MM-DD' }
+        ##   needs Reports.Read.All; if the tenant conceals user names in reports the UPNs are hashed and nothing will match
+        activity = {}
+        next_uri = f"{self.client.graph_api_url}/v1.0/reports/getM365AppUserDetail(period='{period}')"
+        query    = { "$format": "application/json" }
+        while next_uri:
+            response = self.client.session.get(next_uri, headers=self.client.headers, params=query)
+            if response.status_code != 200:
+                self.log.warning("(%s) FAILURE_M365_ACTIVITY %s (%s)", period, response.status_code, response.text)
+                return None
+            data = response.json()
+            for item in data.get('value', []):
+                upn = item.get('userPrincipalName')
+                if upn and item.get('lastActivityDate'):
+                    activity[upn.lower()] = max(activity.get(upn.lower(), ''), item['lastActivityDate'])
+            next_uri = data.get('@odata.nextLink')
+            query    = {}
+        return activity
+
+    def last_activity_report(self, FORCE_NEW=False, M365_ACTIVITY=False):
+        ## last activity table straight from the users cache (signInActivity / lastPasswordChangeDateTime are in the $select)
+        ##   replaces the two portal exports AzureAD-LastActivity.py joins - FORCE_NEW re-pulls the users rather than using the disk cache
+        ##   (users delta does not return signInActivity so there is no cheaper refresh than a full pull)
+        ##   M365_ACTIVITY also merges in reports/getM365AppUserDetail so mailbox / teams / etc usage counts as activity
+        import pandas as pd
+
+        users = self.get_all(FORCE_NEW=FORCE_NEW)
+        if users is None: return None
+        users = list({ user['id']: user for user in users }.values())
+        sign_in = [user.get('signInActivity') or {} for user in users]
+        report = pd.DataFrame({
+            'DisplayName':                      [user.get('displayName') for user in users],
+            'UserPrincipalName':                [user.get('userPrincipalName') for user in users],
+            'id':                               [user.get('id') for user in users],
+            'accountEnabled':                   [user.get('accountEnabled') for user in users],
+            'lastSignInDateTime':               pd.to_datetime([item.get('lastSignInDateTime') for item in sign_in], utc=True),
+            'lastNonInteractiveSignInDateTime': pd.to_datetime([item.get('lastNonInteractiveSignInDateTime') for item in sign_in], utc=True),
+            'lastPasswordChangeDateTime':       pd.to_datetime([user.get('lastPasswordChangeDateTime') for user in users], utc=True),
+        })
+        activity_columns = ['lastSignInDateTime', 'lastNonInteractiveSignInDateTime']
+
+        if M365_ACTIVITY:
+            activity = self.__m365_activity__()
+            if activity is not None:
+                report['m365LastActivityDate'] = pd.to_datetime(report['UserPrincipalName'].str.lower().map(activity), utc=True)
+                activity_columns.append('m365LastActivityDate')
+
+        ## same default as the CSV report so the two outputs line up
+        report['LastActivity'] = report[activity_columns].max(axis=1).fillna(pd.Timestamp('1970-01-01', tz='UTC'))
+        return report.set_index('DisplayName')
     
     def user_fields_lower_case(self, id):
         if id is None: return False     
@@ -79,14 +133,35 @@ class Users:
             # self.client.logger.info(f"Skipping disabled user {id} / {user_data['userPrincipalName']}")
             return False
 
+        data_before, data_after = self.__plan_lower_case__(user_data)
+        if data_after:
+            next_uri = f"{self.client.graph_api_url}/v1.0/users/{id}"
+            combined_dict = {
+                "next_url": next_uri,
+                "before": data_before,
+                "payload": data_after
+            }
+            self.log.debug("(%s) %s", id, LazyJson(combined_dict))
+
+            # actually update
+            response = self.client.session.patch(next_uri, headers=self.client.headers, json=data_after)
+            if response.status_code != 204:
+                self.log.warning("(%s) Failed to lowercase for user: %s - %s", id, response.status_code, response.text)
+                return False
+
+            # the PATCH payload is all that changed - no need to re-fetch the user
+            self.__update_cache__(user_data, data_after)
+            return True
+        return False
+
+    def __plan_lower_case__(self, user_data):
+        ## works out what user_fields_lower_case would change - returns (before, payload), payload empty if nothing to do
         data_before = {}
         data_after = {}
-        FLIP=False
         if 'userPrincipalName' in user_data and user_data['userPrincipalName'] is not None:
             if any(char.isupper() for char in user_data['userPrincipalName']):
                 data_before['userPrincipalName']  = user_data['userPrincipalName']
                 data_after['userPrincipalName']   = user_data['userPrincipalName'].lower()
-                FLIP=True
 
         # mail thinks it can be changed but it doesn't take effect
         # if 'mail' in user_data and user_data['mail'] is not None:
@@ -99,7 +174,6 @@ class Users:
             if any(char.isupper() for char in user_data['mailNickname']):
                 data_before["mailNickname"]       = user_data['mailNickname']
                 data_after["mailNickname"]        = user_data['mailNickname'].lower()
-                FLIP=True
 
         # Error : "Property 'proxyAddresses' is read-only and cannot be set."
         # PROXY=False
@@ -125,27 +199,17 @@ class Users:
         #             data_after["proxyAddresses"]      = new_proxyaddresses
         #             FLIP=True
 
-        if FLIP:
-            next_uri = f"{self.client.graph_api_url}/v1.0/users/{id}"
-            combined_dict = {
-                "next_url": next_uri,
-                "before": data_before,
-                "payload": data_after
-            }
-            self.client.logger.debug(json.dumps(combined_dict, indent=4))
+        return data_before, data_after
 
-            # actually update
-            response = requests.patch(next_uri, headers=self.client.headers, json=data_after)
-            if response.status_code != 204:
-                self.client.logger.warning(f"Failed to lowercase for user {id}: {response.status_code} - {response.text}")
-                return False
+    def __update_cache__(self, user_data, payload):
+        ## apply a successful PATCH payload to the in memory (and disk) cache rather than fetching the user again
+        user_data.update(payload)
+        if 'userPrincipalName' in payload:
+            self.cache[payload['userPrincipalName'].lower()] = user_data
+        if self.users_cache_dir is not None:
+            self.client.__write_to_cache__(f"{self.users_cache_dir}/{urllib.parse.quote(user_data['id'], safe='').lower()}.json", user_data)
+        self.client.__cache_changed__("users")
 
-            # force update the cache
-            user_data = self.get_details(id, True)
-            if user_data is None: return False
-            return True
-        return False
-    
     def reset_password(self, id):
         if id is None: return False
         user_data = self.get_details(id)
@@ -159,11 +223,64 @@ class Users:
             }
         }
         next_uri = f"{self.client.graph_api_url}/v1.0/users/{id}"
-        response = requests.patch(next_uri, headers=self.client.headers, json=payload)
+        response = self.client.session.patch(next_uri, headers=self.client.headers, json=payload)
         if response.status_code != 202:
             self.client.logger.warning(f"Failed to reset password for user {id}: {response.status_code} - {response.text}")
             return False
         return True
+
+    def __bulk_users__(self, ids):
+        ## enabled users to work on - from the cache (get_all() when no ids are given) so planning costs no round trips
+        if ids is None:
+            users = self.get_all()
+            if users is None: return []
+        else:
+            users = [self.get_details(id) for id in ids if id is not None]
+        return [user_data for user_data in users if user_data is not None and user_data.get('accountEnabled') is not False]
+
+    def __bulk_patch__(self, plan, ok_status, DRY_RUN, report_file, update_cache=True):
+        ## plan is a list of (user_data, before, payload) - writes the diff report and then sends the PATCHes through $batch
+        report = []
+        for user_data, data_before, data_after in plan:
+            report.append({ "id": user_data['id'], "userPrincipalName": user_data.get('userPrincipalName'), "before": data_before, "payload": data_after })
+        if DRY_RUN or len(plan) == 0:
+            self.log.info("() %s users to change (DRY_RUN=%s)", len(plan), DRY_RUN)
+        else:
+            batch_requests = [{ "id": str(i), "method": "PATCH", "url": f"/users/{user_data['id']}", "body": data_after } for i, (user_data, data_before, data_after) in enumerate(plan)]
+            results = self.client.__batch__(batch_requests)
+            failed = 0
+            for i, (user_data, data_before, data_after) in enumerate(plan):
+                status = results.get(str(i), {}).get('status')
+                report[i]['status'] = status
+                if status in ok_status:
+                    if update_cache:
+                        self.__update_cache__(user_data, data_after)
+                else:
+                    failed += 1
+                    self.log.warning("(%s) FAILURE_USER_UPDATE %s - %s", user_data['id'], status, results.get(str(i), {}).get('body'))
+            self.log.info("() %s/%s users changed", len(plan) - failed, len(plan))
+        if report_file is not None:
+            with open(report_file, "w") as f:
+                json.dump(report, f, indent=4)
+        return report
+
+    def bulk_fields_lower_case(self, ids=None, DRY_RUN=False, report_file=None):
+        ## user_fields_lower_case() for many users - every change is planned from the cache first and then sent via $batch
+        ##   returns the diff report (list of id/before/payload/status), also written to report_file if given
+        plan = []
+        for user_data in self.__bulk_users__(ids):
+            data_before, data_after = self.__plan_lower_case__(user_data)
+            if data_after:
+                plan.append((user_data, data_before, data_after))
+        return self.__bulk_patch__(plan, (204,), DRY_RUN, report_file)
+
+    def bulk_reset_password(self, ids, DRY_RUN=False, report_file=None):
+        ## reset_password() for many users through $batch - same report as bulk_fields_lower_case
+        ##   the passwordProfile is write only so there is nothing to put back in the cache
+        plan = []
+        for user_data in self.__bulk_users__(ids):
+            plan.append((user_data, {}, { "passwordProfile": { "forceChangePasswordNextSignIn": True } }))
+        return self.__bulk_patch__(plan, (202, 204), DRY_RUN, report_file, update_cache=False)
     
     def get_mfa_status(self, id):
         if id is None: return None
@@ -173,7 +290,7 @@ class Users:
             self.client.logger.debug(f"Skipping disabled user {id} / {user_data['userPrincipalName']}")
             return None
         next_uri = f"{self.client.graph_api_url}/v1.0/users/{id}/authentication/methods"
-        response = requests.get(next_uri, headers=self.client.headers)
+        response = self.client.session.get(next_uri, headers=self.client.headers)
         if response.status_code != 200:
             self.client.logger.warning(f"Failed to get MFA status for user {id}: {response.status_code} - {response.text}")
             return None
@@ -182,7 +299,7 @@ class Users:
     
     def get_mfa_report(self):
         next_uri = f"{self.client.graph_api_url}/beta/reports/credentialUserRegistrationDetails"
-        response = requests.get(next_uri, headers=self.client.headers)
+        response = self.client.session.get(next_uri, headers=self.client.headers)
         if response.status_code != 200:
             self.client.logger.warning(f"Failed to get MFA report: {response.status_code} - {response.text}")
             return None
@@ -231,7 +348,7 @@ class Users:
             payload["companyName"] = company_name
 
         next_uri = f"{self.client.graph_api_url}/v1.0/users"
-        response = requests.post(next_uri, headers=self.client.headers, json=payload)
+        response = self.client.session.post(next_uri, headers=self.client.headers, json=payload)
         if response.status_code != 201:
             self.client.logger.warning(f"Failed to create user: {response.status_code} - {response.text}")
             return None
@@ -243,7 +360,7 @@ class Users:
         if user_oid is None: return False
         next_uri = f"{self.client.graph_api_url}/v1.0/users/{user_oid}"
         print(f"Deleting user {principal_name} ({user_oid})")
-        response = requests.delete(next_uri, headers=self.client.headers)
+        response = self.client.session.delete(next_uri, headers=self.client.headers)
         if response.status_code != 204:
             self.client.logger.warning(f"Failed to delete user {principal_name} ({user_oid}): {response.status_code} - {response.text}")
             return False
@@ -0,0 +1,635 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## Local stand in for the Graph and Okta endpoints pythonEntraLib / pythonOktaLib call, so load and
+##   regression runs can be done without a live tenant. One server answers both apis:
+##     /v1.0/...   graph - nextLink paging, $filter (eq / startswith), $select, $count, $batch, users delta,
+##                 429 + Retry-After every throttle_every requests
+##     /api/v1/... okta  - Link header paging, X-Rate-Limit-* headers and 429 past okta_rate_limit per token per minute
+##   the data is a seeded synthetic tenant (MockTenant) so runs are repeatable
+##
+##   with MockServer(MockTenant(users=10000)) as server:
+##       client = EntraClient("mock", graph_api_url=server.url, access_token="mock")
+##       okta   = OktaInfo(cache_dir, OKTA_DOMAIN=server.url, OKTA_TOKEN="mock")
+##
+##   python3 pythonMockServer.py --users 10000 runs the benchmark suite (run_benchmarks) end to end
+##
+##############################################################
+
+import json
+import re
+import time
+import uuid
+import random
+import threading
+import argparse
+import tempfile
+import shutil
+import logging
+import urllib.parse
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+###################################################################################
+class MockTenant:
+    ## synthetic tenant with the same object shapes the real apis return - graph and okta side are independent
+    ##   user logins are mixed case on purpose so the lower case functions have work to do
+    def __init__(self, users=1000, groups=100, apps=50, members_per_group=20, owners_per_object=2, seed=1):
+        self.random   = random.Random(seed)
+        self.lock     = threading.RLock()
+        self.sequence = 0                   # bumped on every change - the graph delta token
+        self.changed  = {}                  # graph id -> sequence of its last change
+
+        ## graph
+        self.graph        = { "users": {}, "groups": {}, "applications": {}, "servicePrincipals": {} }
+        self.owners       = {}              # object id -> [user ids]
+        self.members      = {}              # group id -> [user ids]
+        self.assignments  = {}              # service principal id -> { assignment id: assignment }
+        user_ids = []
+        for i in range(users):
+            id = self.new_id()
+            self.graph["users"][id] = {
+                "id": id, "userPrincipalName": f"Mock.User{i}@Mock.example.com", "displayName": f"Mock User {i}",
+                "givenName": "Mock", "surname": f"User{i}", "mail": f"Mock.User{i}@Mock.example.com",
+                "mailNickname": f"Mock.User{i}", "proxyAddresses": [f"SMTP:Mock.User{i}@Mock.example.com"],
+                "accountEnabled": i % 50 != 0, "jobTitle": None, "mobilePhone": None, "officeLocation": None,
+                "preferredLanguage": None, "businessPhones": [],
+                "signInActivity": { "lastSignInDateTime": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T10:00:00Z",
+                                    "lastNonInteractiveSignInDateTime": f"2024-{1 + (i + 3) % 12:02d}-{1 + i % 28:02d}T10:00:00Z" } if i % 7 else None,
+                "lastPasswordChangeDateTime": "2023-06-01T00:00:00Z",
+            }
+            user_ids.append(id)
+        for i in range(groups):
+            id = self.new_id()
+            self.graph["groups"][id] = { "id": id, "displayName": f"MockGroup-{i:05d}", "mailEnabled": False,
+                                         "mailNickname": f"MockGroup-{i:05d}", "securityEnabled": True }
+            self.members[id] = self.sample(user_ids, members_per_group)
+            self.owners[id]  = self.sample(user_ids, owners_per_object)
+        for i in range(apps):
+            app, sp = self.new_app(f"MockApp-{i:05d}")
+            self.owners[app["id"]] = self.sample(user_ids, owners_per_object)
+            self.owners[sp["id"]]  = self.sample(user_ids, owners_per_object)
+
+        ## okta
+        self.okta             = { "users": {}, "groups": {}, "apps": {} }
+        self.okta_group_users = {}          # group id -> [user ids]
+        self.okta_app_users   = {}          # app id -> [user ids]
+        self.okta_app_groups  = {}          # app id -> [group ids]
+        okta_user_ids = []
+        for i in range(users):
+            id = f"00u{i:017d}"
+            self.okta["users"][id] = {
+                "id": id, "status": "DEPROVISIONED" if i % 40 == 0 else "ACTIVE",
+                "profile": { "login": f"Mock.User{i}@Mock.example.com", "email": f"Mock.User{i}@Mock.example.com",
+                             "firstName": "Mock", "lastName": f"User{i}", "employeeNumber": f"E{i:06d}",
+                             "proxyaddresses": [f"SMTP:Mock.User{i}@Mock.example.com"] },
+                "credentials": { "provider": { "type": "OKTA", "name": "OKTA" } },
+            }
+            okta_user_ids.append(id)
+        okta_group_ids = []
+        for i in range(groups):
+            id = f"00g{i:017d}"
+            self.okta["groups"][id] = { "id": id, "type": "OKTA_GROUP", "profile": { "name": f"MockGroup-{i:05d}", "description": None } }
+            self.okta_group_users[id] = self.sample(okta_user_ids, members_per_group)
+            okta_group_ids.append(id)
+        for i in range(apps):
+            id = f"0oa{i:017d}"
+            self.okta["apps"][id] = { "id": id, "name": "template_swa", "label": f"MockApp-{i:05d}", "status": "ACTIVE",
+                                      "signOnMode": "BROWSER_PLUGIN", "credentials": { "scheme": "EDIT_USERNAME_AND_PASSWORD", "revealPassword": False },
+                                      "settings": { "app": { "url": f"https://mockapp{i}.example.com/login" } } }
+            self.okta_app_users[id]  = self.sample(okta_user_ids, members_per_group)
+            self.okta_app_groups[id] = self.sample(okta_group_ids, 3)
+
+    def new_id(self):
+        ## v4 shaped so EntraClient.__is_valid_uuid__ accepts them, but seeded so every run has the same ids
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def sample(self, ids, count):
+        return self.random.sample(ids, min(count, len(ids)))
+
+    def touch(self, id):
+        self.sequence += 1
+        self.changed[id] = self.sequence
+
+    def new_app(self, name):
+        app = { "id": self.new_id(), "appId": self.new_id(), "displayName": name, "appRoles": [], "notes": None,
+                "signInAudience": "AzureADMyOrg" }
+        sp  = { "id": self.new_id(), "appId": app["appId"], "displayName": name, "appRoles": [],
+                "preferredSingleSignOnMode": "password", "servicePrincipalType": "Application" }
+        self.graph["applications"][app["id"]]    = app
+        self.graph["servicePrincipals"][sp["id"]] = sp
+        self.owners[app["id"]]     = []
+        self.owners[sp["id"]]      = []
+        self.assignments[sp["id"]] = {}
+        self.touch(app["id"])
+        self.touch(sp["id"])
+        return app, sp
+
+###################################################################################
+class MockServer:
+    ## ThreadingHTTPServer in a background thread around a MockTenant
+    ##   latency         - seconds added to every request (outside the tenant lock) to look like a real round trip
+    ##   page_size       - graph default page when there is no $top
+    ##   throttle_every  - every Nth graph request (or $batch sub request) gets 429 + Retry-After (0 = never)
+    ##   okta_rate_limit - okta requests per token per minute before 429
+    def __init__(self, tenant=None, host='127.0.0.1', port=0, latency=0.0, page_size=100, throttle_every=0, retry_after=1, okta_rate_limit=600):
+        self.logger          = logging.getLogger('__COMMONLOGGER__')
+        self.tenant          = tenant if tenant is not None else MockTenant()
+        self.host            = host
+        self.port            = port
+        self.latency         = latency
+        self.page_size       = page_size
+        self.throttle_every  = throttle_every
+        self.retry_after     = retry_after
+        self.okta_rate_limit = okta_rate_limit
+        self.counts          = Counter()    # "GET /v1.0/users" -> requests (batch sub requests counted as their own)
+        self.graph_requests  = 0
+        self.okta_calls      = {}           # token -> deque of request times in the last minute
+        self.stats_lock      = threading.Lock()
+        self.httpd           = None
+        self.thread          = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.debug(f"{self.__class__.__name__} listening on {self.url}")
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.counts.clear()
+
+    def request_count(self):
+        with self.stats_lock:
+            return sum(self.counts.values())
+
+    def __count__(self, method, path):
+        ## ids are folded out of the path so the counts group by endpoint
+        endpoint = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/{id}', path.split('?')[0])
+        endpoint = re.sub(r'/0[0-9a-z]{2}\d{17}', '/{id}', endpoint)
+        with self.stats_lock:
+            self.counts[f"{method} {endpoint}"] += 1
+
+    ###################################################################################
+    def dispatch(self, method, path, body, headers):
+        ## -> (status, json payload or None, response headers)
+        if self.latency:
+            time.sleep(self.latency)
+        self.__count__(method, path)
+        parsed = urllib.parse.urlsplit(path)
+        query  = { key: values[-1] for key, values in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items() }
+        if parsed.path.startswith('/v1.0/'):
+            if parsed.path == '/v1.0/$batch' and method == 'POST':
+                return self.__graph_batch__(body)
+            return self.__graph_throttled__(method, parsed.path[len('/v1.0'):], query, body)
+        if parsed.path.startswith('/api/v1/'):
+            return self.__okta__(method, parsed.path[len('/api/v1'):], query, body, headers)
+        return 404, { "error": { "code": "NotFound", "message": path } }, {}
+
+    ###################################################################################
+    ## graph
+    def __graph_error__(self, status, code, message):
+        return status, { "error": { "code": code, "message": message } }, {}
+
+    def __graph_throttled__(self, method, path, query, body):
+        with self.stats_lock:
+            self.graph_requests += 1
+            throttle = self.throttle_every and self.graph_requests % self.throttle_every == 0
+        if throttle:
+            status, payload, headers = self.__graph_error__(429, "TooManyRequests", "mock throttle")
+            return status, payload, { "Retry-After": str(self.retry_after) }
+        with self.tenant.lock:
+            return self.__graph__(method, path, query, body)
+
+    def __graph_batch__(self, body):
+        requests = (body or {}).get('requests', [])
+        if len(requests) > 20:
+            return self.__graph_error__(400, "BadRequest", "batch limited to 20 requests")
+        responses = []
+        for request in requests:
+            url = request['url'] if request['url'].startswith('/') else f"/{request['url']}"
+            self.__count__(f"BATCH {request['method']}", f"/v1.0{url}")
+            parsed = urllib.parse.urlsplit(url)
+            query  = { key: values[-1] for key, values in urllib.parse.parse_qs(parsed.query).items() }
+            status, payload, headers = self.__graph_throttled__(request['method'], parsed.path, query, request.get('body'))
+            responses.append({ "id": request['id'], "status": status, "headers": headers, "body": payload })
+        return 200, { "responses": responses }, {}
+
+    def __graph_match__(self, item, filter):
+        ## the two $filter forms the libraries send: "field eq 'x'" and "startswith(field, 'x')" (case insensitive like graph)
+        match = re.match(r"^startswith\((\w+),\s*'(.*)'\)$", filter)
+        if match:
+            value = item.get(match.group(1))
+            return isinstance(value, str) and value.lower().startswith(match.group(2).replace("''", "'").lower())
+        match = re.match(r"^(\w+) eq '(.*)'$", filter)
+        if match:
+            value = item.get(match.group(1))
+            return isinstance(value, str) and value.lower() == match.group(2).replace("''", "'").lower()
+        return True
+
+    def __graph_select__(self, item, query):
+        if '$select' not in query:
+            return dict(item)
+        fields = set(query['$select'].split(',')) | { "id" }
+        return { key: value for key, value in item.items() if key in fields }
+
+    def __graph_page__(self, path, items, query, extra=None):
+        ## $top / $skiptoken paging with an absolute nextLink like graph
+        top    = min(int(query.get('$top', self.page_size)), 999)
+        offset = int(query.get('$skiptoken', 0))
+        page   = { "value": [self.__graph_select__(item, query) for item in items[offset:offset + top]] }
+        if query.get('$count') == 'true':
+            page["@odata.count"] = len(items)
+        if offset + top < len(items):
+            next_query = dict(query, **{ "$skiptoken": str(offset + top) })
+            page["@odata.nextLink"] = f"{self.url}/v1.0{path}?{urllib.parse.urlencode(next_query)}"
+        elif extra:
+            page.update(extra)
+        return 200, page, {}
+
+    def __graph_ref__(self, url):
+        ## "@odata.id": ".../directoryObjects/{id}" (or /users/{id}) -> id
+        return (url or '').rstrip('/').rsplit('/', 1)[-1]
+
+    def __graph__(self, method, path, query, body):
+        tenant = self.tenant
+        parts  = [part for part in path.split('/') if part]
+        if not parts:
+            return self.__graph_error__(404, "NotFound", path)
+        collection = parts[0]
+
+        if collection == "applicationTemplates" and len(parts) == 3 and parts[2] == "instantiate" and method == 'POST':
+            app, sp = tenant.new_app((body or {}).get('displayName', 'MockApp'))
+            return 201, { "application": dict(app), "servicePrincipal": dict(sp) }, {}
+
+        if collection == "reports":
+            return 200, { "value": [] }, {}
+
+        if collection not in tenant.graph:
+            return self.__graph_error__(404, "NotFound", path)
+        objects = tenant.graph[collection]
+
+        if len(parts) == 1:
+            if method == 'GET':
+                items = [item for item in objects.values() if self.__graph_match__(item, query.get('$filter', ''))]
+                return self.__graph_page__(path, items, query)
+            if method == 'POST':
+                id = tenant.new_id()
+                objects[id] = dict(body or {}, id=id)
+                tenant.owners[id] = []
+                tenant.members[id] = []
+                tenant.touch(id)
+                return 201, dict(objects[id]), {}
+            return self.__graph_error__(405, "MethodNotAllowed", path)
+
+        if parts[1] == "delta" and collection == "users":
+            ## no token - everything (and a deltaLink), with a token - only what changed since
+            since = int(query.get('$deltatoken', 0))
+            items = [item for id, item in objects.items() if tenant.changed.get(id, 0) > since or since == 0]
+            delta = { "@odata.deltaLink": f"{self.url}/v1.0/users/delta?$deltatoken={tenant.sequence}" }
+            return self.__graph_page__(path, items, { key: value for key, value in query.items() if key != '$deltatoken' }, delta)
+
+        id = parts[1]
+        if id not in objects:
+            return self.__graph_error__(404, "Request_ResourceNotFound", f"{collection}/{id}")
+        item = objects[id]
+
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, self.__graph_select__(item, query), {}
+            if method == 'PATCH':
+                item.update(body or {})
+                tenant.touch(id)
+                return 204, None, {}
+            if method == 'DELETE':
+                del objects[id]
+                tenant.touch(id)
+                return 204, None, {}
+            return self.__graph_error__(405, "MethodNotAllowed", path)
+
+        relation = parts[2]
+        if relation in ("owners", "members"):
+            my_map = tenant.owners if relation == "owners" else tenant.members
+            current = my_map.setdefault(id, [])
+            if len(parts) == 3 and method == 'GET':
+                users = tenant.graph["users"]
+                items = [dict(users[oid], **{ "@odata.type": "#microsoft.graph.user" }) for oid in current if oid in users]
+                return self.__graph_page__(path, items, query)
+            if len(parts) == 4 and parts[3] == '$ref' and method == 'POST':
+                oid = self.__graph_ref__((body or {}).get('@odata.id'))
+                if oid in current:
+                    return self.__graph_error__(400, "Request_BadRequest", "One or more added object references already exist")
+                current.append(oid)
+                return 204, None, {}
+            if len(parts) == 5 and parts[4] == '$ref' and method == 'DELETE':
+                if parts[3] not in current:
+                    return self.__graph_error__(404, "Request_ResourceNotFound", parts[3])
+                current.remove(parts[3])
+                return 204, None, {}
+
+        if relation == "appRoleAssignedTo" and collection == "servicePrincipals":
+            assignments = tenant.assignments.setdefault(id, {})
+            if len(parts) == 3 and method == 'GET':
+                return self.__graph_page__(path, list(assignments.values()), query)
+            if len(parts) == 4 and method == 'DELETE':
+                if assignments.pop(parts[3], None) is None:
+                    return self.__graph_error__(404, "Request_ResourceNotFound", parts[3])
+                return 204, None, {}
+
+        if relation == "appRoleAssignments" and collection == "groups" and method == 'POST':
+            sp_id = (body or {}).get('resourceId')
+            if sp_id not in tenant.assignments:
+                return self.__graph_error__(404, "Request_ResourceNotFound", sp_id)
+            assignment = { "id": tenant.new_id(), "principalId": id, "principalType": "Group", "principalDisplayName": item.get('displayName'),
+                           "resourceId": sp_id, "appRoleId": body.get('appRoleId') }
+            tenant.assignments[sp_id][assignment["id"]] = assignment
+            return 201, dict(assignment), {}
+
+        if relation == "authentication" and method == 'GET':
+            return 200, { "value": [{ "@odata.type": "#microsoft.graph.passwordAuthenticationMethod", "id": tenant.new_id() }] }, {}
+
+        return self.__graph_error__(404, "NotFound", path)
+
+    ###################################################################################
+    ## okta
+    def __okta_error__(self, status, summary):
+        return status, { "errorCode": f"E{status:09d}", "errorSummary": summary }, {}
+
+    def __okta_rate__(self, headers):
+        ## sliding minute per token, the headers okta sends on every response
+        token = headers.get('Authorization', '')
+        now   = time.time()
+        with self.stats_lock:
+            calls = self.okta_calls.setdefault(token, deque())
+            while calls and calls[0] < now - 60:
+                calls.popleft()
+            reset = int((calls[0] if calls else now) + 60)
+            if len(calls) >= self.okta_rate_limit:
+                return False, { "X-Rate-Limit-Limit": str(self.okta_rate_limit), "X-Rate-Limit-Remaining": "0", "X-Rate-Limit-Reset": str(reset) }
+            calls.append(now)
+            return True, { "X-Rate-Limit-Limit": str(self.okta_rate_limit),
+                           "X-Rate-Limit-Remaining": str(self.okta_rate_limit - len(calls)), "X-Rate-Limit-Reset": str(reset) }
+
+    def __okta_page__(self, path, items, query, max_limit=200):
+        ## after / limit cursor paging with Link headers like okta (rel="self" always, rel="next" while there is more)
+        limit  = min(int(query.get('limit', max_limit)), max_limit)
+        offset = int(query.get('after', 0))
+        links  = [f'<{self.url}/api/v1{path}?{urllib.parse.urlencode(query)}>; rel="self"']
+        if offset + limit < len(items):
+            next_query = dict(query, after=str(offset + limit), limit=str(limit))
+            links.append(f'<{self.url}/api/v1{path}?{urllib.parse.urlencode(next_query)}>; rel="next"')
+        return 200, items[offset:offset + limit], { "Link": ", ".join(links) }
+
+    def __okta__(self, method, path, query, body, headers):
+        allowed, rate_headers = self.__okta_rate__(headers)
+        if not allowed:
+            status, payload, extra = self.__okta_error__(429, "API call exceeded rate limit due to too many requests.")
+            return status, payload, rate_headers
+        with self.tenant.lock:
+            status, payload, extra = self.__okta_route__(method, path, query, body)
+        extra.update(rate_headers)
+        return status, payload, extra
+
+    def __okta_route__(self, method, path, query, body):
+        tenant = self.tenant
+        parts  = [part for part in path.split('/') if part]
+        if not parts:
+            return self.__okta_error__(404, path)
+        collection = parts[0]
+
+        if collection == "logs":
+            return self.__okta_page__(path, [], query, 1000)
+        if collection not in tenant.okta:
+            return self.__okta_error__(404, path)
+        objects = tenant.okta[collection]
+
+        if len(parts) == 1 and method == 'GET':
+            items = list(objects.values())
+            if collection == "users":
+                ## the default list leaves out DEPROVISIONED users, the library asks for them with a filter
+                if 'filter' in query:
+                    status = re.search(r'status eq "(\w+)"', query['filter'])
+                    items = [item for item in items if status is None or item['status'] == status.group(1)]
+                else:
+                    items = [item for item in items if item['status'] != "DEPROVISIONED"]
+            if 'q' in query:
+                q = query['q'].lower()
+                fields = ("login", "email", "firstName", "lastName") if collection == "users" else ("name", "label")
+                items = [item for item in items
+                         if any(str(item.get('profile', {}).get(field, '')).lower().startswith(q) for field in fields)
+                         or str(item.get('label', '')).lower().startswith(q)]
+            return self.__okta_page__(path, items, query)
+
+        id = parts[1] if len(parts) > 1 else None
+        if id not in objects:
+            return self.__okta_error__(404, f"Not found: Resource not found: {id} ({collection})")
+        item = objects[id]
+
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, item, {}
+            if method == 'POST' and collection == "users":
+                ## partial update - profile fields merged, credentials accepted and not stored
+                item["profile"].update((body or {}).get("profile", {}))
+                return 200, item, {}
+            if method == 'PUT':
+                objects[id] = dict(body or {}, id=id)
+                return 200, objects[id], {}
+            return self.__okta_error__(405, path)
+
+        relation = parts[2]
+        if relation == "lifecycle" and method == 'POST' and len(parts) == 4:
+            if collection == "users":
+                item["status"] = { "activate": "ACTIVE", "reactivate": "ACTIVE", "deactivate": "DEPROVISIONED", "suspend": "SUSPENDED",
+                                   "unsuspend": "ACTIVE", "unlock": "ACTIVE", "expire_password": "PASSWORD_EXPIRED" }.get(parts[3], item["status"])
+            else:
+                item["status"] = "ACTIVE" if parts[3] == "activate" else "INACTIVE"
+            return 200, {}, {}
+        if collection == "users" and relation == "appLinks":
+            return 200, [{ "appInstanceId": app_id, "label": tenant.okta["apps"][app_id]["label"] }
+                         for app_id, user_ids in tenant.okta_app_users.items() if id in user_ids], {}
+        if collection == "groups" and relation == "users":
+            if len(parts) == 4 and method == 'PUT':
+                if parts[3] not in tenant.okta_group_users[id]:
+                    tenant.okta_group_users[id].append(parts[3])
+                return 204, None, {}
+            users = tenant.okta["users"]
+            return self.__okta_page__(path, [users[user_id] for user_id in tenant.okta_group_users[id] if user_id in users], query, 1000)
+        if collection == "apps" and relation == "users":
+            users = tenant.okta["users"]
+            items = [{ "id": user_id, "scope": "USER", "status": "ACTIVE", "credentials": { "userName": users[user_id]["profile"]["login"] } }
+                     for user_id in tenant.okta_app_users[id] if user_id in users]
+            return self.__okta_page__(path, items, query, 500)
+        if collection == "apps" and relation == "groups":
+            return self.__okta_page__(path, [{ "id": group_id, "priority": 0 } for group_id in tenant.okta_app_groups[id]], query)
+        return self.__okta_error__(404, path)
+
+###################################################################################
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'       # keep alive - clients reuse connections the same way they would against the real apis
+    disable_nagle_algorithm = True      # headers and body go out in two writes - without this a reused connection stalls on delayed ack
+
+    def log_message(self, format, *args):
+        return
+
+    def __handle__(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw    = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+        status, payload, headers = self.server.mock.dispatch(method, self.path, body, self.headers)
+        data = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self.__handle__('GET')
+
+    def do_POST(self):
+        self.__handle__('POST')
+
+    def do_PUT(self):
+        self.__handle__('PUT')
+
+    def do_PATCH(self):
+        self.__handle__('PATCH')
+
+    def do_DELETE(self):
+        self.__handle__('DELETE')
+
+###################################################################################
+## benchmarks - full syncs, lookups and bulk mutations end to end through the real client code
+def __timed__(results, server, name, function):
+    server.reset_stats()
+    start   = time.perf_counter()
+    value   = function()
+    seconds = time.perf_counter() - start
+    items   = len(value) if isinstance(value, (list, dict)) else None
+    results.append({ "name": name, "seconds": round(seconds, 3), "requests": server.request_count(), "items": items,
+                     "endpoints": dict(server.counts.most_common(5)) })
+    return value
+
+def run_benchmarks(users=1000, groups=100, apps=50, latency=0.0, throttle_every=0, workers=5, ENTRA=True, OKTA=True):
+    ## returns a list of { name, seconds, requests, items, endpoints } - every run starts from a fresh tenant and empty caches
+    from pythonEntraLib import EntraClient
+    from pythonOktaLib import OktaInfo
+
+    results   = []
+    cache_dir = tempfile.mkdtemp(prefix="mock-bench-")
+    tenant    = MockTenant(users=users, groups=groups, apps=apps)
+    try:
+        with MockServer(tenant, latency=latency, throttle_every=throttle_every, okta_rate_limit=10**9) as server:
+            if ENTRA:
+                client = EntraClient("mock", graph_api_url=server.url, cache_dir=cache_dir, access_token="mock")
+                all_users = __timed__(results, server, "entra users full sync", lambda: client.Users.get_all(FORCE_NEW=True))
+                __timed__(results, server, "entra users cached load", lambda: EntraClient("mock", graph_api_url=server.url, cache_dir=cache_dir, access_token="mock").Users.get_all())
+                all_groups = __timed__(results, server, "entra groups full sync", client.Groups.get_all)
+                __timed__(results, server, "entra apps full sync", client.Applications.get_all)
+
+                cold = EntraClient("mock", graph_api_url=server.url, access_token="mock")
+                upns = [user['userPrincipalName'] for user in all_users[:min(200, len(all_users))]]
+                __timed__(results, server, f"entra user lookups cold ({len(upns)})", lambda: [cold.Users.get_details(upn) for upn in upns])
+                __timed__(results, server, f"entra user lookups warm ({len(upns)})", lambda: [cold.Users.get_details(upn) for upn in upns])
+                __timed__(results, server, "entra group prefix (graph)", lambda: cold.Groups.get_prefix("MockGroup-000"))
+                __timed__(results, server, "entra group prefix (local)", lambda: client.Groups.get_prefix("MockGroup-000"))
+
+                __timed__(results, server, "entra bulk lower case", lambda: client.Users.bulk_fields_lower_case())
+                owners = { group['id']: [all_users[0]['id'], all_users[1]['id']] for group in all_groups }
+                __timed__(results, server, "entra groups set owners bulk", lambda: client.Groups.set_owners_bulk(owners, max_workers=workers))
+                app_name    = "MockApp-00000"
+                app_details = client.Applications.get_details(app_name)
+                group_names = [group['displayName'] for group in all_groups[:min(50, len(all_groups))]]
+                __timed__(results, server, f"entra assign {len(group_names)} groups to app", lambda: client.Applications.add_group(group_names, app_name, app_details['id'], app_details))
+
+            if OKTA:
+                okta = OktaInfo(cache_dir, OKTA_DOMAIN=server.url, OKTA_TOKEN="mock", GLOBAL_RATE_LIMIT=10**9)
+                okta_users = __timed__(results, server, "okta users full sync", okta.users_fetch_all)
+                __timed__(results, server, "okta groups full sync", okta.groups_fetch_all)
+                okta_apps = __timed__(results, server, "okta apps full sync", okta.apps_fetch)
+                __timed__(results, server, "okta group members", lambda: okta.groups_users_fetch_all() or okta.cache_groups_users)
+                __timed__(results, server, "okta app users + groups", lambda: [(okta.app_get_users(app['id']), okta.app_get_groups(app['id'])) for app in okta_apps])
+                user_ids = [user['id'] for user in okta_users]
+                __timed__(results, server, "okta bulk lower case", lambda: okta.users_bulk(user_ids, "lower_case", max_workers=workers))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pythonEntraLib / pythonOktaLib against the local mock graph / okta server')
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users (graph and okta)')
+    parser.add_argument('--groups', type=int, default=100, help='synthetic groups')
+    parser.add_argument('--apps', type=int, default=50, help='synthetic apps')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--throttle-every', type=int, default=0, help='429 every Nth graph request')
+    parser.add_argument('--workers', type=int, default=5, help='threads for the bulk functions')
+    parser.add_argument('--only', choices=['entra', 'okta'], help='run just one side')
+    parser.add_argument('--output', help='also write the results as json here')
+    parser.add_argument('--serve', action='store_true', help='just run the server (ctrl-c to stop) and print its url')
+    parser.add_argument('--port', type=int, default=0, help='port for --serve')
+    args = parser.parse_args()
+
+    if args.serve:
+        server = MockServer(MockTenant(users=args.users, groups=args.groups, apps=args.apps), port=args.port,
+                            latency=args.latency, throttle_every=args.throttle_every).start()
+        print(f"mock graph / okta on {server.url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        results = run_benchmarks(args.users, args.groups, args.apps, args.latency, args.throttle_every, args.workers,
+                                 ENTRA=args.only in (None, 'entra'), OKTA=args.only in (None, 'okta'))
+        for result in results:
+            print(f"{result['name']:<40} {result['seconds']:>9.3f}s {result['requests']:>8} requests {str(result['items']):>8} items")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=4)
@@ -21,10 +21,9 @@ SOFTWARE.
 """
 
 from collections import deque
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
 import logging
-import requests
 import json
 import os
 import sys
@@ -32,13 +31,59 @@ import math
 import glob
 import re
 import gzip
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pythonCommonMetrics import CommonMetrics, metricsSession
+from pythonCommonLogger import CommonLoggerAdapter, LazyJson
+from pythonCommonCache import CommonCache
+try:
+    import orjson       # optional - much faster and writes NaN/Inf as null on its own
+except ImportError:
+    orjson = None
+
+###################################################################################
+class OktaRateBudget:
+    ## calls per token in a sliding minute - acquire() hands out the next token with room (round robin) or says how
+    ##   long until one has room. plain python so a multiprocessing manager can host one for several processes
+    def __init__(self, tokens, rate_limit):
+        self.rate_limit = rate_limit
+        self.calls      = [deque() for _ in range(tokens)]
+        self.next_index = 0
+        self.lock       = threading.Lock()
+
+    def acquire(self):
+        ## (token index, 0) - the call is counted, go ahead. (None, seconds) - every token is used up, wait and ask again
+        with self.lock:
+            now       = time.time()
+            wait_time = 60.0
+            for offset in range(len(self.calls)):
+                index = (self.next_index + offset) % len(self.calls)
+                calls = self.calls[index]
+                while calls and calls[0] <= now - 60:
+                    calls.popleft()  # Remove timestamps older than 1 minute
+                if len(calls) < self.rate_limit:
+                    calls.append(now)
+                    self.next_index = (index + 1) % len(self.calls)
+                    return index, 0
+                wait_time = min(wait_time, calls[0] + 60 - now)
+            return None, max(wait_time, 0.05)
 
 ###################################################################################
 class OktaInfo:
-    def __init__ (self, CACHE_DIR, OKTA_DOMAIN=None, OKTA_TOKEN=None, GLOBAL_RATE_LIMIT=250, FLUSH=False):
+    def __init__ (self, CACHE_DIR, OKTA_DOMAIN=None, OKTA_TOKEN=None, GLOBAL_RATE_LIMIT=250, FLUSH=False, CACHE_CODEC=None, RATE_BUDGET=None):
         ## make sure that other modules are calling with same logger name
         self.logger                  = logging.getLogger('__COMMONLOGGER__')
+        self.log                     = CommonLoggerAdapter(self.logger, self.__class__.__name__)
+        self.metrics                 = CommonMetrics()
+        self.session                 = metricsSession("okta")   # every okta call goes through here - keep alive + metrics
+        self.cache_io                = CommonCache(CACHE_CODEC) # cache files: codec none/gzip/zstd, atomic writes (see pythonCommonCache)
         self.OKTA_DOMAIN             = OKTA_DOMAIN
+        ## OKTA_DOMAIN is normally just the host - a full url (e.g. http://127.0.0.1:8080 for pythonMockServer) is used as is
+        if OKTA_DOMAIN is not None and re.match(r'^https?://', OKTA_DOMAIN):
+            self.OKTA_URL            = OKTA_DOMAIN.rstrip('/')
+        else:
+            self.OKTA_URL            = f"https://{OKTA_DOMAIN}"
         self.GLOBAL_RATE_LIMIT       = GLOBAL_RATE_LIMIT   # rate limits are fairly low anything from 50/min to 100/min per token
         self.total_apps_to_fetch     = 999999
         self.LIMIT_APPS              = 200
@@ -56,18 +101,17 @@ class OktaInfo:
         self.__mkdirs__()
 
         ## OKTA_TOKEN can come in a few ways depending how we are called
-        self.last_api_index          = 0
-        self.api_call_timestamps     = []
         if (type(OKTA_TOKEN) is str):
             self.OKTA_TOKEN          = [ OKTA_TOKEN ]
-            self.api_call_timestamps.append(deque()) # Initialize a queue to track API call timestamps
         elif (type(OKTA_TOKEN) is list):
             self.OKTA_TOKEN          = OKTA_TOKEN
-            for i in range(len(OKTA_TOKEN)):
-                self.api_call_timestamps.append(deque()) # Initialize a queue to track API call timestamps
         else:
             self.OKTA_TOKEN          = None
-            self.api_call_timestamps = None        
+        ## per token call budget - RATE_BUDGET shares one between OktaInfo instances (e.g. a multiprocessing manager proxy
+        ##   in Tenant-Export.py), it has to cover the same tokens in the same order
+        self.rate_budget             = RATE_BUDGET
+        if self.rate_budget is None and self.OKTA_TOKEN is not None:
+            self.rate_budget         = OktaRateBudget(len(self.OKTA_TOKEN), GLOBAL_RATE_LIMIT)
 
     def __mkdirs__(self):
         if self.CACHE_DIR is None:
@@ -93,22 +137,21 @@ class OktaInfo:
     def __get_headers__(self):
         ## This is called for getting headers and is a good place to check rate limits and wait here
         ##    If we have multiple tokens we will rotate through them here to speed up responses
-        if self.api_call_timestamps is None:
+        if self.rate_budget is None:
             self.logger.error(f"API Token is not set - should not have gotten here. Exiting.")
             sys.exit(1)
-        if len(self.api_call_timestamps) > 1:
-            self.last_api_index = (self.last_api_index + 1) % len(self.api_call_timestamps)
-        current_time = datetime.now()
-        self.api_call_timestamps[self.last_api_index].append(current_time)  # Append current timestamp here
-        while len(self.api_call_timestamps[self.last_api_index]) >= self.GLOBAL_RATE_LIMIT:
-            current_time = datetime.now()
-            self.logger.debug(f"RATE_LIMIT_PAUSE: {len(self.api_call_timestamps[self.last_api_index])} / {self.GLOBAL_RATE_LIMIT} / {self.last_api_index} in last minute")
-            while self.api_call_timestamps[self.last_api_index] and self.api_call_timestamps[self.last_api_index][self.last_api_index] < current_time - timedelta(seconds=60):
-                self.api_call_timestamps[self.last_api_index].popleft()  # Remove timestamps older than 1 minute
-            time.sleep(2)
+        while True:
+            ## the budget only does the bookkeeping - the wait happens here so other threads can still take budget
+            ##   that frees up on another token (or earlier than our wait)
+            api_index, wait_time = self.rate_budget.acquire()
+            if api_index is not None:
+                break
+            self.logger.debug(f"RATE_LIMIT_PAUSE: {self.GLOBAL_RATE_LIMIT} / {len(self.OKTA_TOKEN)} tokens in last minute - waiting {wait_time:.2f}s")
+            self.metrics.throttle("okta_client", wait_time)
+            time.sleep(wait_time)
 
         headers = {
-            'Authorization': f'SSWS {self.OKTA_TOKEN[self.last_api_index]}',
+            'Authorization': f'SSWS {self.OKTA_TOKEN[api_index]}',
             'Accept': 'application/json',
             'Content-Type': 'application/json'
         }
@@ -121,38 +164,56 @@ class OktaInfo:
     def __https_get__(self, url, params=None):
         while True:
             if params is None:
-                response = requests.get(url, headers=self.__get_headers__())
+                response = self.session.get(url, headers=self.__get_headers__())
             else:
-                response = requests.get(url, headers=self.__get_headers__(), params=params)
+                response = self.session.get(url, headers=self.__get_headers__(), params=params)
             if response.status_code == 200:
                 return response
             elif response.status_code == 429:
                 ## in theory we take care of this with the __get_headers__ function but have found not always perfect
-                reset_time = int(response.headers.get('X-Rate-Limit-Reset', time.time() + 60))
-                wait_time = reset_time - int(time.time())
-                self.logger.warning(f"RATE_LIMIT_EXCEEDED - Waiting for {wait_time} seconds before retrying.")
-                time.sleep(wait_time)
+                self.__rate_limit_pause__(response)
             else:
                 self.logger.error(f"Failed to retrieve {url}\tStatus code: {response.status_code} ({response.text})")
                 return None
 
+    def __https_post__(self, url, **kwargs):
+        ## POST that waits out a 429 and tries again - any other response goes back to the caller
+        while True:
+            response = self.session.post(url, headers=self.__get_headers__(), **kwargs)
+            if response.status_code != 429:
+                return response
+            self.__rate_limit_pause__(response)
+
+    def __rate_limit_pause__(self, response):
+        ## okta sends X-Rate-Limit-Reset (epoch seconds) with a 429 - Retry-After (seconds) is honoured when that is missing
+        reset_time = response.headers.get('X-Rate-Limit-Reset')
+        if reset_time is not None:
+            wait_time = max(int(reset_time) - int(time.time()), 1)   # reset can already be past (clock skew / whole seconds) - sleep() refuses negatives
+        else:
+            wait_time = max(int(response.headers.get('Retry-After', 60)), 1)
+        self.logger.warning(f"RATE_LIMIT_EXCEEDED - Waiting for {wait_time} seconds before retrying.")
+        self.metrics.retry("okta", "429")
+        self.metrics.throttle("okta", wait_time)
+        time.sleep(wait_time)
+
     def __fetch_to_cache__(self, url, filename, force=False):
         if os.path.exists(filename):
             if force is True:
                 os.remove(filename)  ## this will force a refresh
             else:
                 # self.logger.debug(f"-o-o-o- Reading from disk cache: {filename}")
-                with open(filename, 'r') as f:
-                    json_info = json.load(f)
+                json_info = self.cache_io.read(filename)
+                if json_info is not None:
+                    self.metrics.cache(f"okta.{os.path.basename(os.path.dirname(filename))}", "disk")
                     return json_info
+        self.metrics.cache(f"okta.{os.path.basename(os.path.dirname(filename))}", "miss")
         response = self.__https_get__(url)
         if response is None:
             my_json = { "status": "NOT_FOUND" }
         else: 
             my_json = response.json()
         self.logger.debug(f"+o+o+o+ Writing into disk cache: {filename} ({url})")
-        with open(filename, 'w') as f:
-            json.dump(my_json, f)
+        self.cache_io.write(filename, my_json)
         return my_json
         
     def __is_email_address__(self, id):
@@ -161,7 +222,7 @@ class OktaInfo:
         return re.match(email_pattern, id) is not None
     
     def __get_user_id_by_email__(self, email):
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/users?q={email}'
+        url = f'{self.OKTA_URL}/api/v1/users?q={email}'
         response = self.__https_get__(url)
         if response:
             users = response.json()
@@ -176,8 +237,9 @@ class OktaInfo:
             if id is None:
                 return None
         if FORCE is False and id in self.cache_user:
+            self.metrics.cache("okta.users", "memory")
             return self.cache_user[id]
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/users/{id}'
+        url = f'{self.OKTA_URL}/api/v1/users/{id}'
         filename = f"{self.dir_users}/{id}.json"
         user_info = self.__fetch_to_cache__(url, filename, FORCE)
         self.cache_user[id] = user_info
@@ -188,8 +250,8 @@ class OktaInfo:
     #   oktaUserGetData(OKTA_DOMAIN, OKTA_TOKEN, 'grants', json_user_data['id'])
 
     def user_add_to_group(self, user_id, group_id):
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/groups/{group_id}/users/{user_id}'
-        response = requests.put(url, headers=self.__get_headers__())
+        url = f'{self.OKTA_URL}/api/v1/groups/{group_id}/users/{user_id}'
+        response = self.session.put(url, headers=self.__get_headers__())
         if response.status_code != 204:
             self.logger.warning(f"Failed to add user to group: {url} - response: {response.status_code} / {response.text}")
             return False
@@ -197,10 +259,9 @@ class OktaInfo:
    
     def get_logs(self, id, days_back=15):
         filename = f"{self.dir_syslogs}/{id}.json.gz"
-        if os.path.exists(filename):
-            with gzip.open(filename, "rt") as f:
-                log = json.load(f)
-                return log
+        log = self.cache_io.read(filename)
+        if log is not None:
+            return log
         now = datetime.now()
         start_date = now - timedelta(days=days_back)
         period = timedelta(days=15)
@@ -218,34 +279,32 @@ class OktaInfo:
                 "until": iso8601_end,
                 "limit": 1000
             }
-            url = f'https://{self.OKTA_DOMAIN}/api/v1/logs'
-            response = self.__hash__get__(url, query)   
+            url = f'{self.OKTA_URL}/api/v1/logs'
+            response = self.__https_get__(url, query)
             if response is None:
                 return None
             logs = response.json()
             all_logs.extend(logs)
             start_date = end_date
-        with gzip.open(filename, "wt") as f:
-            f.write(json.dumps(all_logs))
+        self.cache_io.write(filename, all_logs)
         return all_logs
     
     def __fetch_all_sub__(self, my_function, my_cache, my_cache_dir, STOP_LIMIT, url, query, my_list, count):
         while True:
             if count >= STOP_LIMIT:
                 break
-            self.logger.info(f"========== Fetching {my_function}: {url} ==========")
+            self.log.info("========== Fetching %s: %s ==========", my_function, url)
             response = self.__https_get__(url, query)
             items = response.json()
             my_list.extend(items)
             for item in items:
                 filename = f"{my_cache_dir}/{item.get('id')}.json"
                 my_cache[item.get('id')] = item
-                with open(filename, 'w') as f:
-                    json.dump(item, f)
+                self.cache_io.write(filename, item)
 
             count += len(items)
             if 'next' in response.links:
-                self.logger.debug(f"                          {response.links['next']} ")
+                self.log.debug("(%s) next %s", my_function, response.links['next'])
                 url = response.links['next']['url']
                 query = None
             else:
@@ -259,28 +318,36 @@ class OktaInfo:
         if STOP_LIMIT is not None:
             my_limit = STOP_LIMIT
         json_files = glob.glob(os.path.join(my_cache_dir, '*.json'))
-        if (len(json_files) > 0):
+        from_disk  = len(json_files) > 0
+        if from_disk:
             self.logger.debug(f"USING CACHED {my_function}: {len(json_files)}")
+            self.metrics.cache(f"okta.{my_function}.all", "disk")
             for json_file in json_files:
                 if count >= my_limit:
                     break
-                with open(json_file, 'r') as f:
-                    data = json.load(f)
-                    my_list.append(data)
-                    my_cache[data.get('id')] = data
-                    count += 1
-        else:
-            url = f'https://{self.OKTA_DOMAIN}/api/v1/{my_function}'
+                data = self.cache_io.read(json_file)
+                if data is None:
+                    ## damaged file - the listing can't be trusted to be whole any more, pull it again
+                    my_list   = []
+                    count     = 0
+                    from_disk = False
+                    break
+                my_list.append(data)
+                my_cache[data.get('id')] = data
+                count += 1
+        if not from_disk:
+            self.metrics.cache(f"okta.{my_function}.all", "miss")
+            url = f'{self.OKTA_URL}/api/v1/{my_function}'
             query = {
                 "limit": my_limit
             }
-            self.__fetch_all_sub__(my_function, my_cache, my_cache_dir, STOP_LIMIT, url, query, my_list, count)
+            self.__fetch_all_sub__(my_function, my_cache, my_cache_dir, my_limit, url, query, my_list, count)
             if my_function == "users":
                 query = {
                     "limit": my_limit,
                     "filter": "status eq \"DEPROVISIONED\""   ## we need to get deprovisioned users as well
                 }
-                self.__fetch_all_sub__(my_function, my_cache, my_cache_dir, STOP_LIMIT, url, query, my_list, count)
+                self.__fetch_all_sub__(my_function, my_cache, my_cache_dir, my_limit, url, query, my_list, count)
             ## apps DELETED status seems to only return active/inactive apps anyway?
         return my_list
     
@@ -290,7 +357,7 @@ class OktaInfo:
     def user_login_lower_case(self, id):
         ## this is a special case where we are changing the login name to lower case
         ## we need to refetch from the API and then change and then a PUT
-        self.logger.debug(f"Getting user: {id}")
+        self.log.debug("(%s) Getting user", id)
         response_json = self.user(id)
         if response_json:
             if response_json['status'] == "DEPROVISIONED": 
@@ -353,12 +420,11 @@ class OktaInfo:
                     "before": before,
                     "payload": payload
                 }
-                self.logger.debug(json.dumps(combined_dict, indent=4))
-                self.logger.debug("=-"*40)
-                url = f'https://{self.OKTA_DOMAIN}/api/v1/users/{id}'
-                response = requests.post(url, json=payload, headers=self.__get_headers__(), params=query)
+                self.log.debug("(%s) %s", id, LazyJson(combined_dict))
+                url = f'{self.OKTA_URL}/api/v1/users/{id}'
+                response = self.__https_post__(url, json=payload, params=query)
                 if response.status_code != 200:
-                    self.logger.error(f"Failed to update ({url}) Status: {response.status_code} / {response.json()}")
+                    self.log.error("(%s) Failed to update (%s) Status: %s / %s", id, url, response.status_code, response.text)
                     return False
                        
                 ## clear cache file && re-write so in local cache as updated
@@ -371,8 +437,8 @@ class OktaInfo:
     def user_set_password(self, id, password):
         ## MIGHT want to instead use this endpoint: https://developer.okta.com/docs/reference/api/authn/#reset-password
         ##    which (should?) force a password reset on next time they login
-        self.logger.debug(f"setting user: {id}")        
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/users/{id}'
+        self.log.debug("(%s) setting user", id)
+        url = f'{self.OKTA_URL}/api/v1/users/{id}'
         query = { "strict": "false" }
         payload = { 
             "credentials": {
@@ -380,38 +446,114 @@ class OktaInfo:
                     { "value": password }
             } 
         }
-        response = requests.post(url, json=payload, headers=self.__get_headers__(), params=query)
+        response = self.__https_post__(url, json=payload, params=query)
         if response.status_code != 200:
-            self.logger.error(f"Failed to update ({url}) Status: {response.status_code} / {response.json()}")
+            self.log.error("(%s) Failed to update (%s) Status: %s / %s", id, url, response.status_code, response.text)
             return False
         return True
                     
     def user_get_apps(self, id):
         ## this returns "official" apps assigned to the user - not private on-the-fly ones
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/users/{id}/appLinks'
+        url = f'{self.OKTA_URL}/api/v1/users/{id}/appLinks'
         response = self.__https_get__(url)
         return response.json()
     
     def user_lifecycle_change(self, id, lifecycle):
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/users/{id}/lifecycle/{lifecycle}'
+        url = f'{self.OKTA_URL}/api/v1/users/{id}/lifecycle/{lifecycle}'
         while True:
-            response = requests.post(url, headers=self.__get_headers__())
+            response = self.session.post(url, headers=self.__get_headers__())
             if response.status_code == 200:
                 self.logger.info(f"User status changed: {url} - response: {response.status_code} / {response.text}")
                 return True
             elif response.status_code == 429:
-                reset_time = int(response.headers.get('X-Rate-Limit-Reset', time.time() + 60))
-                wait_time = reset_time - int(time.time())
-                self.logger.warning(f"RATE_LIMIT_EXCEEDED - Waiting for {wait_time} seconds before retrying.")
-                time.sleep(wait_time)
+                self.__rate_limit_pause__(response)
             else:
                 self.logger.warning(f"Failed to flip user: {url} - response: {response.status_code} / {response.text}")
                 return False
 
+    def __users_bulk_checkpoint__(self, results_file, retry_failed):
+        ## returns the user ids already handled in a previous (possibly crashed) run
+        done = set()
+        if results_file is None or not os.path.exists(results_file):
+            return done
+        with open(results_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue    # partial line from a crash mid-write
+                if record.get('status') == "ERROR":
+                    continue
+                if retry_failed and record.get('status') in (False, None):
+                    continue
+                done.add(record.get('id'))
+        return done
+
+    def users_bulk(self, user_ids, operation, results_file=None, max_workers=5, retry_failed=False, **kwargs):
+        ## runs one of the single user functions over a list of users in parallel
+        ##    operation: "lower_case" -> user_login_lower_case(id)
+        ##               "lifecycle"  -> user_lifecycle_change(id, lifecycle=...)
+        ##               "password"   -> user_set_password(id, password=...)
+        ##    all threads go through __get_headers__ so they share the same rate limit budget (and tokens)
+        ##    a 429 that still gets through is waited out and retried in the worker (__https_post__ / the lifecycle loop)
+        ##      so it never lands in results_file as a failure
+        ##    results_file is json lines, one record per user, and is also the checkpoint - a rerun with the same
+        ##      file skips every user already in there (use retry_failed=True to redo the ones that returned False)
+        operations = {
+            "lower_case": self.user_login_lower_case,
+            "lifecycle":  self.user_lifecycle_change,
+            "password":   self.user_set_password,
+        }
+        if operation not in operations:
+            self.logger.error(f"users_bulk({operation}) unknown operation - expected one of {list(operations)}")
+            return None
+        my_function = operations[operation]
+
+        done = self.__users_bulk_checkpoint__(results_file, retry_failed)
+        todo = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in done]
+        self.logger.info(f"users_bulk({operation}) {len(todo)} users to process, {len(done)} already done in ({results_file})")
+
+        stats = { "processed": 0, "skipped": len(done), "true": 0, "false": 0, "error": 0 }
+        results_lock = threading.Lock()
+        results_fh = open(results_file, 'a') if results_file is not None else None
+        start_time = time.time()
+
+        def run_one(user_id):
+            user_start = time.time()
+            try:
+                status = my_function(user_id, **kwargs)
+                if status is None:
+                    status = False      # e.g. user not found - a failure, not something done
+            except Exception as e:
+                self.logger.warning(f"users_bulk({operation})({user_id}) FAILURE_USER_BULK {e}")
+                status = "ERROR"
+            record = { "id": user_id, "operation": operation, "status": status, "seconds": round(time.time() - user_start, 3) }
+            with results_lock:
+                stats["processed"] += 1
+                stats["error" if status == "ERROR" else ("true" if status else "false")] += 1
+                if results_fh is not None:
+                    results_fh.write(json.dumps(record) + "\n")
+                    results_fh.flush()
+                if stats["processed"] % 1000 == 0:
+                    self.logger.info(f"users_bulk({operation}) {stats['processed']}/{len(todo)} {stats['processed'] / (time.time() - start_time):.1f} users/s")
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(run_one, todo))
+        finally:
+            if results_fh is not None:
+                results_fh.close()
+
+        stats["seconds"] = round(time.time() - start_time, 3)
+        stats["per_second"] = round(stats["processed"] / stats["seconds"], 2) if stats["seconds"] > 0 else 0
+        self.logger.info(f"users_bulk({operation}) done: {stats}")
+        return stats
+
     def groups(self, id):
         if id in self.cache_groups:
+            self.metrics.cache("okta.groups", "memory")
             return self.cache_groups[id]
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/groups/{id}'
+        url = f'{self.OKTA_URL}/api/v1/groups/{id}'
         filename = f"{self.dir_groups}/{id}.json"
         group_info = self.__fetch_to_cache__(url, filename)
         self.cache_groups[id] = group_info
@@ -424,7 +566,7 @@ class OktaInfo:
                 return group_id
     
         # If not found in cache, call the Okta API
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/groups?q={name}'
+        url = f'{self.OKTA_URL}/api/v1/groups?q={name}'
         response = self.__https_get__(url)
         if response:
             groups = response.json()
@@ -441,17 +583,19 @@ class OktaInfo:
 
     def groups_users(self, id):
         if id in self.cache_groups_users:
+            self.metrics.cache("okta.groups_users", "memory")
             return self.cache_groups_users[id]
         
         filename = f"{self.dir_groups_users}/{id}.json"
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                group_users = json.load(f)
-                self.cache_groups_users[id] = group_users
-                return group_users     
+        group_users = self.cache_io.read(filename)
+        if group_users is not None:
+            self.metrics.cache("okta.groups_users", "disk")
+            self.cache_groups_users[id] = group_users
+            return group_users     
         
+        self.metrics.cache("okta.groups_users", "miss")
         group_users = []
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/groups/{id}/users'
+        url = f'{self.OKTA_URL}/api/v1/groups/{id}/users'
         while True:
             self.logger.debug(f"Fetching group_users from {url}")
             response = self.__https_get__(url)
@@ -462,8 +606,7 @@ class OktaInfo:
             else:
                 break
 
-        with open(filename, 'w') as f:
-            json.dump(group_users, f)
+        self.cache_io.write(filename, group_users)
         self.cache_groups_users[id] = group_users
         return group_users
     
@@ -484,8 +627,9 @@ class OktaInfo:
         ##    - and that has a displayName of "On The Fly App" then you can get the id
         ##    - then you can grab the app info from the api 
         if force is False and id in self.cache_apps:
+            self.metrics.cache("okta.apps", "memory")
             return self.cache_apps[id]
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}' ## GET
+        url = f'{self.OKTA_URL}/api/v1/apps/{id}' ## GET
         if user_id is not None:
             self.__mkdir_p__(f"{self.dir_users_apps}/{user_id}")
             filename = f"{self.dir_users_apps}/{user_id}/{id}.json"
@@ -497,25 +641,22 @@ class OktaInfo:
 
     def flip_status(self, id, activate):
         if activate:
-            url = f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}/lifecycle/activate'   ## POST
+            url = f'{self.OKTA_URL}/api/v1/apps/{id}/lifecycle/activate'   ## POST
         else:
-            url =  f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}/lifecycle/deactivate' ## POST
+            url =  f'{self.OKTA_URL}/api/v1/apps/{id}/lifecycle/deactivate' ## POST
         self.logger.debug(f"========== Flipping APP: {url} ==========")
         while True:
-            response = requests.post(url, headers=self.__get_headers__())
+            response = self.session.post(url, headers=self.__get_headers__())
             if response.status_code == 200:
                 return True
             elif response.status_code == 429:
-                reset_time = int(response.headers.get('X-Rate-Limit-Reset', time.time() + 60))
-                wait_time = reset_time - int(time.time())
-                self.logger.warning(f"RATE_LIMIT_EXCEEDED - Waiting for {wait_time} seconds before retrying.")
-                time.sleep(wait_time)
+                self.__rate_limit_pause__(response)
             else:
                 self.logger.warning(f"with change: {url} - response: {response}")
                 return False
     
     def app_allow_reveal(self, id):
-        url = f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}'
+        url = f'{self.OKTA_URL}/api/v1/apps/{id}'
         headers = self.__get_headers__()
         
         # Get the current app settings
@@ -528,7 +669,7 @@ class OktaInfo:
         app_settings['credentials']['revealPassword'] = True
         
         # Send the update request
-        response = requests.put(url, headers=headers, json=app_settings)
+        response = self.session.put(url, headers=headers, json=app_settings)
         if response.status_code != 200:
             self.logger.warning(f"Failed to update app settings: {url} - response: {response}")
             return False
@@ -542,13 +683,14 @@ class OktaInfo:
 
     # Function to get users for a given app ID
     def app_get_users(self, id):
-        users     = []
         filename = f"{self.dir_app_users}/{id}.json.gz"
-        if os.path.exists(filename):
-            with gzip.open(filename, 'rt') as f:
-                users = json.load(f)
+        users    = self.cache_io.read(filename)
+        if users is not None:
+            self.metrics.cache("okta.app_users", "disk")
         else:
-            url = f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}/users?limit={self.LIMIT_USERS}'       
+            users = []
+            self.metrics.cache("okta.app_users", "miss")
+            url = f'{self.OKTA_URL}/api/v1/apps/{id}/users?limit={self.LIMIT_USERS}'       
             while url:
                 self.logger.info(f"      Fetching {id} USERS:  {url} ")
                 response = self.__https_get__(url)
@@ -565,18 +707,18 @@ class OktaInfo:
                 else:
                     self.logger.warning(f"Failed to retrieve users for app {id}. Status code: {response.status_code}")
                     break
-            with gzip.open(filename, 'wt') as f:
-                json.dump(users, f)
+            self.cache_io.write(filename, users)
         return users
 
     def app_get_groups(self, id):
-        groups    = []
         filename = f"{self.dir_app_groups}/{id}.json"
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                groups = json.load(f)
+        groups   = self.cache_io.read(filename)
+        if groups is not None:
+            self.metrics.cache("okta.app_groups", "disk")
         else:
-            url = f'https://{self.OKTA_DOMAIN}/api/v1/apps/{id}/groups?limit={self.LIMIT_GROUPS}'
+            groups = []
+            self.metrics.cache("okta.app_groups", "miss")
+            url = f'{self.OKTA_URL}/api/v1/apps/{id}/groups?limit={self.LIMIT_GROUPS}'
             while url:
                 self.logger.info(f"      Fetching {id} GROUPS: {url} ")
                 response = self.__https_get__(url)
@@ -594,8 +736,7 @@ class OktaInfo:
                     self.logger.warning(f"Failed to retrieve groups for app {id}. Status code: {response.status_code}")
                     url = None
                     break
-            with open(filename, 'w') as f:
-                json.dump(groups, f)
+            self.cache_io.write(filename, groups)
         return groups
 
     def app_get_group_names(self, id):
@@ -611,6 +752,108 @@ class OktaInfo:
             ret_groups.append(group_name)
         return ret_groups
     
+    def __inventory_checkpoint__(self, inventory_file):
+        ## app ids already in the inventory - a crash can leave a cut off last gzip member, everything before it is good
+        ##   but anything appended after it could never be read back, so the file is first rewritten with the good records
+        done = set()
+        if inventory_file is None or not os.path.exists(inventory_file):
+            return done
+        damaged = False
+        try:
+            with gzip.open(inventory_file, 'rb') as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line).get('okta_id'))
+                    except json.JSONDecodeError:
+                        damaged = True
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            damaged = True
+        if damaged:
+            self.logger.warning(f"apps_inventory({inventory_file}) damaged tail from an earlier run - rewriting with the {len(done)} good records")
+            tmp_file = f"{inventory_file}.tmp"
+            with gzip.open(tmp_file, 'wb') as f:
+                for record in self.apps_inventory_read(inventory_file):
+                    f.write(self.__inventory_line__(record))
+            os.replace(tmp_file, inventory_file)
+        return done
+
+    def __inventory_line__(self, record):
+        return orjson.dumps(record) + b"\n" if orjson is not None else (json.dumps(record) + "\n").encode()
+
+    def apps_inventory_read(self, inventory_file):
+        ## the records apps_inventory() wrote - each one is ready for AppTracker.write(**record)
+        if inventory_file is None or not os.path.exists(inventory_file):
+            return
+        try:
+            with gzip.open(inventory_file, 'rt') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # partial line from a crash mid-write
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            self.logger.warning(f"apps_inventory_read({inventory_file}) stopped at a damaged tail: {e}")
+
+    def apps_inventory(self, inventory_file, app_ids=None, max_workers=5):
+        ## one consolidated record per app (app info, assigned users, assigned groups with their names) as gzip json lines
+        ##    { "okta_id": id, "okta_info": { "app": .., "users": [..], "groups": [{ "id", "priority", "name" }], "group_names": [..] } }
+        ##    the group names come from one groups_fetch_all() shared by every thread instead of a groups() call per group
+        ##    apps run max_workers at a time and all calls share the __get_headers__ rate limit budget (and tokens)
+        ##    the file is also the checkpoint - a rerun appends only the apps that are not in there yet
+        self.groups_fetch_all()
+        if app_ids is None:
+            app_ids = [app.get('id') for app in self.apps_fetch()]
+        done = self.__inventory_checkpoint__(inventory_file)
+        todo = [app_id for app_id in dict.fromkeys(app_ids) if app_id not in done]
+        self.logger.info(f"apps_inventory() {len(todo)} apps to fetch, {len(done)} already in ({inventory_file}), {len(self.cache_groups)} groups indexed")
+
+        stats = { "processed": 0, "skipped": len(done), "users": 0, "groups": 0, "error": 0 }
+        write_lock = threading.Lock()
+        start_time = time.time()
+
+        def strip(items):
+            return [{ key: value for key, value in item.items() if key != '_links' } for item in items]
+
+        def group_name(group_id):
+            group_info = self.groups(group_id)     # memory hit unless the group was made after the listing
+            if not group_info:
+                return None
+            return group_info.get('profile', {}).get('name')
+
+        def run_one(app_id):
+            try:
+                app_info = self.app(app_id)
+                users    = strip(self.app_get_users(app_id))
+                groups   = strip(self.app_get_groups(app_id))
+                for group in groups:
+                    group['name'] = group_name(group.get('id'))
+            except Exception as e:
+                self.logger.warning(f"apps_inventory({app_id}) FAILURE_APP_INVENTORY {e}")
+                with write_lock:
+                    stats["error"] += 1
+                return
+            record = { "okta_id": app_id, "okta_info": { "app": app_info, "users": users, "groups": groups,
+                                                         "group_names": [group['name'] for group in groups if group['name']] } }
+            line = self.__inventory_line__(record)
+            with write_lock:
+                inventory_fh.write(line)
+                stats["processed"] += 1
+                stats["users"]     += len(users)
+                stats["groups"]    += len(groups)
+                if stats["processed"] % 500 == 0:
+                    inventory_fh.flush()
+                    self.logger.info(f"apps_inventory() {stats['processed']}/{len(todo)} {stats['processed'] / (time.time() - start_time):.1f} apps/s")
+
+        ## appending starts a new gzip member - gzip readers carry on across members
+        with gzip.open(inventory_file, 'ab') as inventory_fh:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(run_one, todo))
+
+        stats["seconds"] = round(time.time() - start_time, 3)
+        stats["per_second"] = round(stats["processed"] / stats["seconds"], 2) if stats["seconds"] > 0 else 0
+        self.logger.info(f"apps_inventory() done: {stats}")
+        return stats
+
     def app_cache_rename(self, id, new_extension):
         filename = f"{self.dir_app_info}/{id}.json"
         if os.path.exists(filename):
@@ -618,9 +861,93 @@ class OktaInfo:
             os.rename(filename, new_filename)
             self.logger.info(f"renamed {filename} {new_filename}")
 
+########################################################################################
+class AppTrackerSnapshot:
+    ## the apptracker records indexed by okta_id, tenant_id and entra app id (both the appId and the object id
+    ##   of entra_app_info point at the record) so lookups don't have to scan the fetchAll list
+    def __init__(self):
+        self.loaded          = False
+        self.by_okta_id      = {}
+        self.by_tenant       = {}
+        self.by_entra_app_id = {}
+
+    def __contains__(self, okta_id):
+        return okta_id in self.by_okta_id
+
+    def __len__(self):
+        return len(self.by_okta_id)
+
+    def __entra_ids__(self, record):
+        entra_app_info = record.get("entra_app_info") or {}
+        if not isinstance(entra_app_info, dict):
+            return []
+        return [ entra_id for entra_id in (entra_app_info.get("appId"), entra_app_info.get("id")) if entra_id ]
+
+    def __remove_index__(self, record):
+        tenant_records = self.by_tenant.get(record.get("tenant_id"))
+        if tenant_records is not None:
+            tenant_records.pop(record.get("okta_id"), None)
+        for entra_id in self.__entra_ids__(record):
+            if self.by_entra_app_id.get(entra_id) is record:
+                del self.by_entra_app_id[entra_id]
+
+    def __add_index__(self, record):
+        self.by_tenant.setdefault(record.get("tenant_id"), {})[record.get("okta_id")] = record
+        for entra_id in self.__entra_ids__(record):
+            self.by_entra_app_id[entra_id] = record
+
+    def load(self, records):
+        self.by_okta_id      = {}
+        self.by_tenant       = {}
+        self.by_entra_app_id = {}
+        for record in records:
+            self.put(record)
+        self.loaded = True
+
+    def put(self, record):
+        ## insert or replace a whole record
+        okta_id = record.get("okta_id")
+        old = self.by_okta_id.get(okta_id)
+        if old is not None:
+            self.__remove_index__(old)
+        self.by_okta_id[okta_id] = record
+        self.__add_index__(record)
+
+    def merge(self, okta_id, fields):
+        ## apply the fields of a write to the record (creating it if needed)
+        record = dict(self.by_okta_id.get(okta_id) or { "okta_id": okta_id })
+        record.update(fields)
+        self.put(record)
+        return record
+
+    def get(self, okta_id):
+        return self.by_okta_id.get(okta_id)
+
+    def find_by_tenant(self, tenant_id):
+        return list(self.by_tenant.get(tenant_id, {}).values())
+
+    def find_by_entra_app_id(self, entra_app_id):
+        return self.by_entra_app_id.get(entra_app_id)
+
+    def records(self):
+        return list(self.by_okta_id.values())
+
+########################################################################################
+class FiniteJSONEncoder(json.JSONEncoder):
+    ## json.JSONEncoder that writes NaN / Inf as null instead of the invalid NaN / Infinity tokens
+    ##   the C encoder has no float hook, so this is the python iterencode with our own float formatting
+    def iterencode(self, o, _one_shot=False):
+        def floatstr(value, _repr=float.__repr__):
+            return _repr(value) if math.isfinite(value) else 'null'
+        return json.encoder._make_iterencode(
+            {} if self.check_circular else None, self.default, json.encoder.encode_basestring_ascii if self.ensure_ascii else json.encoder.encode_basestring,
+            self.indent, floatstr, self.key_separator, self.item_separator, self.sort_keys, self.skipkeys, _one_shot)(o, 0)
+
 ########################################################################################
 class AppTracker:
-    def __init__(self, apptracker_url, apptracker_bearer):
+    FIELDS = ("entra_app_info", "entra_sp_info", "okta_info", "sso_info", "tenant_id")
+
+    def __init__(self, apptracker_url, apptracker_bearer, queue_path=None):
         ## make sure that other modules are calling with same logger name
         self.logger                  = logging.getLogger('__COMMONLOGGER__')
         if apptracker_url is None:
@@ -633,17 +960,46 @@ class AppTracker:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {apptracker_bearer}"
         }
+        self.session = metricsSession("apptracker")
+        self.cache_io = CommonCache()
+        ## snapshot is the indexed in memory copy from cache_all() and is kept current by our own writes
+        ##   pending holds the write_buffered() updates coalesced per okta_id until flush()
+        ##   queue_path is a json lines write-ahead log of pending so a crash before flush() loses nothing
+        self.snapshot     = AppTrackerSnapshot()
+        self.pending      = {}
+        self.pending_lock = threading.Lock()
+        self.queue_path   = queue_path
+        if queue_path is not None and os.path.exists(queue_path):
+            with open(queue_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # partial line from a crash mid-write
+                    self.__coalesce__(entry.get("okta_id"), entry.get("fields", {}))
+            if self.pending:
+                self.logger.info(f"AppTracker({queue_path}) {len(self.pending)} pending writes recovered from queue - call flush()")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def __encode_json__(self, data):
+        ## NaN / Inf are not valid json - they go out as null
+        ##   orjson does that natively, otherwise the C encoder is tried as is (the normal case, no bad floats, and
+        ##   it stops at the first bad one) and a payload that has them is encoded by FiniteJSONEncoder - no copy
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass    # e.g. ints over 64 bits - let the standard encoder deal with it
+        try:
+            return json.dumps(data, allow_nan=False)
+        except ValueError:
+            return FiniteJSONEncoder().encode(data)
 
-    def __sanitize_json__(self, data):
-        if isinstance(data, dict):
-                return {k: self.__sanitize_json__(v) for k, v in data.items()}
-        elif isinstance(data, list):
-                return [self.__sanitize_json__(v) for v in data]
-        elif isinstance(data, float) and (math.isnan(data) or math.isinf(data)):
-                return None
-        else:
-                return data
-           
     def write(self, okta_id, **kwargs):
         entra_app_info = kwargs.get('entra_app_info', None)
         entra_sp_info = kwargs.get('entra_sp_info', None)
@@ -654,54 +1010,167 @@ class AppTracker:
         json_data = { "okta_id": okta_id }
         if entra_app_info: json_data["entra_app_info"] = entra_app_info
         if entra_sp_info: json_data["entra_sp_info"] = entra_sp_info
-        if okta_info: json_data["okta_info"] = self.__sanitize_json__(okta_info)
+        if okta_info: json_data["okta_info"] = okta_info
         if sso_info: json_data["sso_info"] = sso_info
         if tenant_id: json_data["tenant_id"] = tenant_id
         
         self.logger.debug(f"oktaAppTracker({okta_id}) Sending data to apptracker")
-        response = requests.post(f"{self.apptracker_url}/v1/ingestMessage/{okta_id}", headers=self.headers, json=json_data)
+        response = self.session.post(f"{self.apptracker_url}/v1/ingestMessage/{okta_id}", headers=self.headers, data=self.__encode_json__(json_data))
         if response.status_code != 200:
             self.logger.error(f"oktaAppTracker({okta_id}) FAILURE_APP_TRACKER: {response.text}")
             return False
+        self.__remember__(okta_id, json_data)
         return True
 
-    def set_sso_info(self, okta_id, key, value):
-        url = f"{self.apptracker_url}/v1/fetch/{okta_id}/sso_info"
-        response = requests.get(url, headers=self.headers)
-        if response.status_code != 200:
-            self.logger.warning(f"set_sso_info({okta_id}) FAILURE_APP_TRACKER: {response.text}")
+    def __remember__(self, okta_id, fields):
+        ## keep the in memory copy in line with what we wrote - only for records we know, or once cache_all() has run,
+        ##   otherwise a partial record would hide the server side fields from set_sso_info()
+        if okta_id not in self.snapshot and not self.snapshot.loaded:
+            return
+        self.snapshot.merge(okta_id, { key: fields[key] for key in self.FIELDS if fields.get(key) })
+
+    def __coalesce__(self, okta_id, fields):
+        ## later values for the same field replace earlier ones, fields not in this update are kept
+        current = self.pending.setdefault(okta_id, {})
+        for key in self.FIELDS:
+            if fields.get(key):
+                current[key] = fields[key]
+
+    def __queue_rewrite__(self):
+        ## called with pending_lock held - the queue file becomes exactly what is still pending
+        if self.queue_path is None:
+            return
+        tmp_path = f"{self.queue_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            for okta_id, fields in self.pending.items():
+                f.write(json.dumps({ "okta_id": okta_id, "fields": fields }) + "\n")
+        os.replace(tmp_path, self.queue_path)
+
+    def write_buffered(self, okta_id, **kwargs):
+        ## same arguments as write() but only queued - nothing is sent until flush()
+        ##   multiple updates for the same okta_id go out as a single write
+        fields = { key: kwargs[key] for key in self.FIELDS if kwargs.get(key) }
+        with self.pending_lock:
+            self.__coalesce__(okta_id, fields)
+            if self.queue_path is not None:
+                with open(self.queue_path, 'a') as f:
+                    f.write(json.dumps({ "okta_id": okta_id, "fields": fields }) + "\n")
+                    f.flush()
+        self.__remember__(okta_id, fields)
+        return True
+
+    def flush(self, max_workers=5):
+        with self.pending_lock:
+            to_send      = self.pending
+            self.pending = {}
+        if not to_send:
+            return True
+        self.logger.info(f"AppTracker.flush() sending {len(to_send)} writes")
+
+        def send(item):
+            okta_id, fields = item
+            return okta_id, self.write(okta_id, **fields)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(send, to_send.items()))
+
+        failed = [okta_id for okta_id, status in results if not status]
+        with self.pending_lock:
+            ## anything queued while we were sending is newer than the failed write so it wins
+            for okta_id in failed:
+                newer = self.pending.pop(okta_id, {})
+                self.__coalesce__(okta_id, to_send[okta_id])
+                self.__coalesce__(okta_id, newer)
+            self.__queue_rewrite__()
+        if failed:
+            self.logger.warning(f"AppTracker.flush() FAILURE_APP_TRACKER {len(failed)}/{len(to_send)} writes failed - kept in queue")
             return False
-        json_data = response.json()
-        sso_info = json_data.get("sso_info", {})
-        if sso_info is None:
-            sso_info = {}
+        return True
+
+    def set_sso_info(self, okta_id, key, value, BUFFERED=False):
+        ## a buffered sso_info not yet flushed is the newest copy (it already holds what the server had), then the
+        ##   copy from cache_all() saves the GET when we have it
+        with self.pending_lock:
+            pending_sso_info = self.pending.get(okta_id, {}).get("sso_info")
+        record = self.snapshot.get(okta_id)
+        if pending_sso_info is not None:
+            sso_info = dict(pending_sso_info)
+        elif record is not None:
+            sso_info = dict(record.get("sso_info") or {})
+        else:
+            url = f"{self.apptracker_url}/v1/fetch/{okta_id}/sso_info"
+            response = self.session.get(url, headers=self.headers)
+            if response.status_code != 200:
+                self.logger.warning(f"set_sso_info({okta_id}) FAILURE_APP_TRACKER: {response.text}")
+                return False
+            json_data = response.json()
+            sso_info = json_data.get("sso_info", {})
+            if sso_info is None:
+                sso_info = {}
         sso_info[key] = value
+        if BUFFERED:
+            return self.write_buffered(okta_id, sso_info=sso_info)
         return self.write(okta_id, sso_info=sso_info)
 
     def delete(self, okta_id):
         url = f"{self.apptracker_url}/v1/deleteMessage/{okta_id}"
-        response = requests.delete(url, headers=self.headers)
+        response = self.session.delete(url, headers=self.headers)
         if response.status_code != 200:
             self.logger.warning(f"delete({okta_id}) FAILURE_APP_TRACKER: {response.text}")
             return False
         return True
 
-    def cache_all(self, apptracker_json_path):
-        if self.__check_file_newer_than__(apptracker_json_path, 1):
-            self.logger.info(f"USING CACHED APPTRACKER INFO: {apptracker_json_path}")
-            with open(apptracker_json_path, 'r') as f:
-                apptracker_json_info = json.load(f)
+    def cache_all(self, apptracker_json_path, FULL_REFRESH_HOURS=24):
+        ## under an hour old the file is used as is, otherwise we only ask for records changed since the file was written
+        ##   (fetchAll?since=) and merge them in - a full fetchAll if the service refuses that, or every FULL_REFRESH_HOURS
+        ##   since that is the only way deletes get picked up. every write of the file moves its mtime so the last full
+        ##   refresh is kept in a "<path>.full" stamp file next to it
+        ## NOTE: fetchAll?since= only returns records that still exist - a record deleted in apptracker stays in what this
+        ##   returns (and in the snapshot) until the next full refresh, up to FULL_REFRESH_HOURS later. callers that act on
+        ##   the absence of a record (clean ups, "not tracked yet") should pass FULL_REFRESH_HOURS=0 - always a full fetch
+        full_stamp_path = f"{apptracker_json_path}.full"
+        if FULL_REFRESH_HOURS > 0 and self.__check_file_newer_than__(apptracker_json_path, 1):
+            apptracker_json_info = self.cache_io.read(apptracker_json_path)
+            if apptracker_json_info is not None:
+                self.logger.info(f"USING CACHED APPTRACKER INFO: {apptracker_json_path}")
+                self.snapshot.load(apptracker_json_info)
+                return self.snapshot.records()
+
+        changed = None
+        if self.__check_file_newer_than__(full_stamp_path, FULL_REFRESH_HOURS) and os.path.exists(apptracker_json_path):
+            ## back off a few minutes from the file time to cover writes that landed while it was being fetched
+            since = datetime.fromtimestamp(os.path.getmtime(apptracker_json_path) - 300, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            response = self.session.get(f"{self.apptracker_url}/v1/fetchAll", headers=self.headers, params={ "since": since })
+            if response.status_code == 200:
+                changed = response.json()
+            else:
+                self.logger.info(f"cache_all() incremental refresh not available ({response.status_code}) - full refresh")
+
+        if changed is not None:
+            cached = self.cache_io.read(apptracker_json_path)
+            if cached is None:
+                changed = None      # damaged file - nothing to merge into, full refresh below
+        if changed is not None:
+            self.snapshot.load(cached)
+            for record in changed:
+                self.snapshot.put(record)
+            self.logger.info(f"cache_all() {len(changed)} apptracker records changed since last refresh")
+            self.logger.warning(f"cache_all() incremental refresh - records deleted since the last full refresh ({full_stamp_path}) "
+                                f"are still listed until the next one, within {FULL_REFRESH_HOURS}h (FULL_REFRESH_HOURS=0 forces it)")
         else:
             url = f"{self.apptracker_url}/v1/fetchAll"
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=self.headers)
             if response.status_code != 200:
                 self.logger.error(f"Failed to fetch app info from apptracker for all records")
                 exit(1)
-            apptracker_json_info = response.json()
-            with open(apptracker_json_path, 'w') as output_file:
-                json.dump(apptracker_json_info, output_file)
+            self.snapshot.load(response.json())
+        apptracker_json_info = self.snapshot.records()
+        self.cache_io.write(apptracker_json_path, apptracker_json_info)
+        if changed is None:
+            with open(full_stamp_path, 'w') as f:
+                f.write(datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") + "\n")
         return apptracker_json_info
-  
+
     def __check_file_newer_than__(self, filename, hours):
         if os.path.exists(filename):
             file_mod_time = os.path.getmtime(filename)
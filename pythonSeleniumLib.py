@@ -21,12 +21,19 @@ SOFTWARE.
 """
 
 import logging
+import json
 import time
 import os
+import queue
+import shutil
+import tempfile
+import threading
 import urllib.parse
 import socket
 import pycurl
-from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -34,11 +41,17 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.common.exceptions import WebDriverException, StaleElementReferenceException
 
 ############################# GENERAL LOGGER ITEMS ######################################################
 ## make sure that other modules are calling with same logger name
 logger                  = logging.getLogger('__COMMONLOGGER__')
 
+## raised when a flow lands on the sign in page - it is a SystemExit so callers that don't handle it still end the
+##   run exactly like the exit(0) it replaces, while selenium_provision_app() can catch it, sign in and carry on
+class SeleniumSignInRequired(SystemExit):
+	pass
+
 ###################################################################################
 def selenium_screen_shot(driver, file_name, calling_tag):
 	save_as = f"{file_name}." + datetime.now().strftime("%Y%m%d_%H%M%S") + f".{calling_tag}.png"
@@ -63,7 +76,7 @@ def selenium_profile_dir(profile_dir, tenant_id, FIREFOX):
 			return os.path.join(os.getenv("HOME"), "__selenium__", "profile_chrome", tenant_id)
 	return None
 
-def selenium_firefox_setup(profile_dir, tenant_id, firefox_driver_path, firefox_binary_location):
+def selenium_firefox_setup(profile_dir, tenant_id, firefox_driver_path, firefox_binary_location, HEADLESS=False):
 	my_profile_dir = selenium_profile_dir(profile_dir, tenant_id, True)
 	if not os.path.exists(my_profile_dir):
 		logger.critical(f"Firefox profile directory does not exist: {my_profile_dir}")
@@ -81,12 +94,66 @@ def selenium_firefox_setup(profile_dir, tenant_id, firefox_driver_path, firefox_
 		firefox_options.add_argument(my_profile_dir)
 		firefox_options.add_argument("--width=1920")
 		firefox_options.add_argument("--height=1080")
+	if HEADLESS:
+		firefox_options.add_argument("-headless")
 
 	firefox_options.binary_location = firefox_binary_location
 	service = FirefoxService(firefox_driver_path)
 	driver = webdriver.Firefox(service=service, options=firefox_options)
 	return driver
 
+###################################################################################
+## readiness waits used in place of fixed sleeps, plus per step timing
+##   the portal keeps loading after document.readyState is complete, these are its blade / progress markers
+PORTAL_LOADING_XPATH = "//*[contains(@class, 'fxs-blade-progress') or contains(@class, 'fxs-progress') or contains(@class, 'azc-progress')]"
+selenium_timing_log  = None
+selenium_timing_lock = threading.Lock()
+
+def selenium_timing_log_set(file_name):
+	## every SeleniumTimer.lap() is also appended to file_name as a json line (None to turn it off)
+	global selenium_timing_log
+	selenium_timing_log = file_name
+
+class SeleniumTimer:
+	## lap(step) records the time since the previous lap (or since the flow started) under that step name
+	def __init__(self, flow, tag):
+		self.flow       = flow
+		self.tag        = tag
+		self.start_time = time.time()
+		self.last_time  = self.start_time
+
+	def lap(self, step):
+		now            = time.time()
+		seconds        = now - self.last_time
+		self.last_time = now
+		logger.debug(f"SELENIUM_TIMING {self.flow}({self.tag}) {step} {seconds:.2f}s")
+		if selenium_timing_log is not None:
+			record = { "time": datetime.now().isoformat(), "flow": self.flow, "tag": self.tag, "step": step, "seconds": round(seconds, 3) }
+			with selenium_timing_lock:
+				with open(selenium_timing_log, "a") as f:
+					f.write(json.dumps(record) + "\n")
+		return seconds
+
+def selenium_portal_loading(driver):
+	try:
+		return any(element.is_displayed() for element in driver.find_elements(By.XPATH, PORTAL_LOADING_XPATH))
+	except StaleElementReferenceException:
+		return True     # the blade re-rendered under us - check again
+
+def selenium_wait_ready(driver, timeout=30):
+	## page loaded and no blade still showing its progress indicator
+	try:
+		WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+		WebDriverWait(driver, timeout).until(lambda d: not selenium_portal_loading(d))
+		return True
+	except Exception as e:
+		logger.debug(f"selenium_wait_ready() still loading after {timeout}s")
+		return False
+
+def selenium_open(driver, url, timeout=30):
+	driver.get(url)
+	return selenium_wait_ready(driver, timeout)
+
 ###################################################################################
 def selenium_click_text(driver, text_to_click):
 	try:
@@ -99,7 +166,7 @@ def selenium_click_text(driver, text_to_click):
 		if driver.title == "Sign in to your account":
 			logger.error(f"selenium_click_text({text_to_click}) FAILURE_CLICK_SIGNIN")
 			logger.critical(f"selenium_click_text({text_to_click}) FAILURE_CLICK_SIGNIN")
-			exit(0)
+			raise SeleniumSignInRequired(0)
 
 		element.click()
 		logger.debug(f"selenium_click_text({text_to_click}) - got_it")
@@ -118,25 +185,29 @@ def selenium_entra_signin(admin_account, driver):
 	# Perform login steps
 	driver.find_element(By.ID, "i0116").send_keys(admin_account)  # Enter email
 	driver.find_element(By.ID, "idSIButton9").click()  # Click Next button
-	logger.info("Once you are signed in you can ctrl-c this, sleeping for 60s")
-	time.sleep(60)  ## should be long enough to signin
+	logger.info("Waiting (up to 5 minutes) for you to finish signing in")
+	try:
+		WebDriverWait(driver, 300).until(
+			lambda d: d.title != "Sign in to your account" and "login.microsoftonline.com" not in d.current_url
+		)
+		selenium_wait_ready(driver)
+	except Exception as e:
+		logger.warning("selenium_entra_signin() still on the sign in page after 5 minutes")
 
 ###################################################################################
 def selenium_entra_app_create(app_name, driver):
 	url = "https://entra.microsoft.com/#view/Microsoft_AAD_IAM/AppGalleryBladeV2"
+	timer = SeleniumTimer("selenium_entra_app_create", app_name)
 	logger.debug(f"selenium_entra_app_create({app_name}) Opening URL: {url}")
-	driver.get(url)
-	time.sleep(2)
-	driver.get(url)   ## honestly not sure why need this extra one but seems to help (caching??)
-	time.sleep(2)
+	selenium_open(driver, url)
+	timer.lap("gallery_blade")
 	if not selenium_click_text(driver, "Create your own application"):
-		logger.warning(f"selenium_entra_app_create({app_name}) FAILURE_APP_CREATE Failed to get to the create page - sleep and try again")
-		time.sleep(2)
-		driver.get(url)
-		time.sleep(2)
+		logger.warning(f"selenium_entra_app_create({app_name}) FAILURE_APP_CREATE Failed to get to the create page - reload and try again")
+		selenium_open(driver, url)
 		if not selenium_click_text(driver, "Create your own application"):
 			logger.warning(f"selenium_entra_app_create({app_name}) FAILURE_APP_CREATE Failed to get to the create page")
 			return False
+	timer.lap("create_blade")
 
 	# Insert app_name into the text box
 	try:
@@ -156,6 +227,7 @@ def selenium_entra_app_create(app_name, driver):
 		)
 		create_button.click()
 		logger.debug(f"selenium_entra_app_create({app_name}) Clicked on the 'Create' button")
+		timer.lap("create_click")
 	except Exception as e:
 		logger.warning(f"selenium_entra_app_create({app_name}) FAILURE_APP_CREATE clicking on the 'Create' button")
 		return False
@@ -166,6 +238,7 @@ def selenium_entra_app_create(app_name, driver):
         	EC.presence_of_element_located((By.XPATH, "//div[@class='fxc-menu-listView-item' and @data-telemetryname='Menu-SignOn' and contains(text(), 'Single sign-on')]"))
 		)
 		logger.debug(f"selenium_entra_app_create({app_name}) SUCCESS_APP_CREATE Application created")
+		timer.lap("app_blade")
 	except Exception as e:
 		logger.warning(f"selenium_entra_app_create({app_name}) FAILURE_APP_CREATE waiting for application name to appear")
 		return False	
@@ -173,65 +246,162 @@ def selenium_entra_app_create(app_name, driver):
 	return True
 
 ###################################################################################
-def selenium_verify_sso_url(sso_url):
+## verdict caches for selenium_verify_sso_urls() - hostname -> (time, dns ok) and url -> (time, result)
+SSO_URL_VALID_STATUS = (200, 301, 302, 403)
+sso_url_dns_cache    = {}
+sso_url_http_cache   = {}
+
+def selenium_sso_url_result(sso_url, hostname, valid, reason, status_code=None, attempts=0, seconds=0.0):
+	return { "url": sso_url, "hostname": hostname, "valid": valid, "reason": reason, "status_code": status_code,
+			 "attempts": attempts, "seconds": round(seconds, 3), "cached": False }
+
+def selenium_sso_url_precheck(sso_url):
+	## the checks that don't need the network - returns (hostname, failure reason or None)
 	if not sso_url:
-		logger.warning(f"selenium_verify_sso_url(NONE) FAILURE_SSO_URL DNS_INVALID: (none)")
-		return False
+		return None, "EMPTY"
 	if len(sso_url) >= 255:
-		logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL INVALID string too long - max 255 characters")
-		return False
-	
-	parsed_url = urllib.parse.urlparse(sso_url)
-	hostname = parsed_url.hostname
-	if not hostname: 
-		logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL DNS_INVALID (none)")
-		return False
+		return None, "TOO_LONG"
+	hostname = urllib.parse.urlparse(sso_url).hostname
+	if not hostname:
+		return None, "NO_HOSTNAME"
 	if hostname == "localhost":
-		logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL DNS_INVALID (localhost)")
-		return False
-	
-	socket.setdefaulttimeout(60)
-	try:
-		socket.gethostbyname(hostname)
-		logger.debug(f"selenium_verify_sso_url({sso_url}) SSO_PASSWORD_APP_URL VALID DNS_ADDRESS")
-	except socket.timeout:
-		logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL TIMEOUT")
-		return False
-	except socket.error:
-		logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL INVALID DNS_ADDRESS")
-		return False
-	finally:
-        # Reset the default timeout to None (no timeout)
-		socket.setdefaulttimeout(None)
-
-	buffer = BytesIO()
-	c = pycurl.Curl()
-	c.setopt(c.URL, sso_url)
-	c.setopt(c.WRITEDATA, buffer)
-	c.setopt(c.FOLLOWLOCATION, True)  # Follow redirects
-	c.setopt(c.SSL_VERIFYPEER, False)  # Disable SSL verification
-	c.setopt(c.TIMEOUT, 90)
-
-	for attempt in range(3):
+		return hostname, "LOCALHOST"
+	return hostname, None
+
+def selenium_sso_url_resolve(hostnames, dns_workers=50, dns_timeout=60, ttl=3600):
+	## resolves on a thread pool (getaddrinfo has no timeout of its own, so no more global socket.setdefaulttimeout)
+	##   returns hostname -> "DNS_VALID" / "DNS_INVALID" / "DNS_TIMEOUT" - timeouts are not cached
+	verdicts = {}
+	futures  = {}
+	now      = time.time()
+	executor = ThreadPoolExecutor(max_workers=dns_workers)
+	for hostname in hostnames:
+		cached = sso_url_dns_cache.get(hostname)
+		if cached and now - cached[0] < ttl:
+			verdicts[hostname] = cached[1]
+		else:
+			futures[hostname] = executor.submit(socket.getaddrinfo, hostname, None)
+	deadline = time.time() + dns_timeout
+	for hostname, future in futures.items():
 		try:
-			c.perform()
-			status_code = c.getinfo(pycurl.RESPONSE_CODE)
-			if status_code == 200 or status_code == 301 or status_code == 302 or status_code == 403:
-				logger.debug(f"selenium_verify_sso_url({sso_url}) SSO_PASSWORD_APP_URL is VALID ({status_code})")
-				return True
-			logger.debug(f"selenium_verify_sso_url({sso_url}) SSO_PASSWORD_APP_URL attempt {attempt} - status_code: {status_code}")
-		except Exception as e:
-			logger.debug(f"selenium_verify_sso_url({sso_url}) SSO_PASSWORD_APP_URL attempt {attempt} ({str(e)})")
-	c.close()
-	logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL INVALID after 3 attempts")
-	return False
+			future.result(timeout=max(0, deadline - time.time()))
+			verdicts[hostname] = "DNS_VALID"
+		except FutureTimeoutError:
+			verdicts[hostname] = "DNS_TIMEOUT"
+			continue
+		except OSError:
+			verdicts[hostname] = "DNS_INVALID"
+		sso_url_dns_cache[hostname] = (time.time(), verdicts[hostname])
+	executor.shutdown(wait=False, cancel_futures=True)
+	return verdicts
+
+def selenium_sso_url_fetch(sso_urls, max_connections=100, timeout=90, attempts=3):
+	## pycurl CurlMulti - up to max_connections transfers in flight, a url that fails goes back on the queue until
+	##   it runs out of attempts. handles are reset() before reuse so nothing leaks from the previous url
+	results = {}
+	if not sso_urls:
+		return results
+	queue   = deque((sso_url, 1) for sso_url in sso_urls)
+	multi   = pycurl.CurlMulti()
+	handles = [pycurl.Curl() for _ in range(min(max_connections, len(sso_urls)))]
+	free    = list(handles)
+	active  = 0
+
+	def finished(c, status_code, error):
+		nonlocal active
+		multi.remove_handle(c)
+		free.append(c)
+		active -= 1
+		seconds = time.time() - c.start_time
+		if status_code in SSO_URL_VALID_STATUS:
+			results[c.sso_url] = selenium_sso_url_result(c.sso_url, c.hostname, True, "HTTP_VALID", status_code, c.attempt, seconds)
+			return
+		logger.debug(f"selenium_verify_sso_url({c.sso_url}) SSO_PASSWORD_APP_URL attempt {c.attempt} - status_code: {status_code} ({error})")
+		if c.attempt < attempts:
+			queue.append((c.sso_url, c.attempt + 1))
+		else:
+			results[c.sso_url] = selenium_sso_url_result(c.sso_url, c.hostname, False, "HTTP_INVALID", status_code, c.attempt, seconds)
+
+	while queue or active:
+		while queue and free:
+			sso_url, attempt = queue.popleft()
+			c = free.pop()
+			c.reset()
+			c.setopt(c.URL, sso_url)
+			c.setopt(c.WRITEFUNCTION, lambda data: None)   # only the status code matters
+			c.setopt(c.FOLLOWLOCATION, True)  # Follow redirects
+			c.setopt(c.SSL_VERIFYPEER, False)  # Disable SSL verification
+			c.setopt(c.TIMEOUT, timeout)
+			c.setopt(c.NOSIGNAL, 1)
+			c.sso_url    = sso_url
+			c.hostname   = urllib.parse.urlparse(sso_url).hostname
+			c.attempt    = attempt
+			c.start_time = time.time()
+			multi.add_handle(c)
+			active += 1
+		while True:
+			ret, _ = multi.perform()
+			if ret != pycurl.E_CALL_MULTI_PERFORM:
+				break
+		while True:
+			num_queued, ok_list, err_list = multi.info_read()
+			for c in ok_list:
+				finished(c, c.getinfo(pycurl.RESPONSE_CODE), None)
+			for c, errno, errmsg in err_list:
+				finished(c, None, errmsg)
+			if num_queued == 0:
+				break
+		multi.select(1.0)
+
+	for c in handles:
+		c.close()
+	multi.close()
+	return results
+
+def selenium_verify_sso_urls(sso_urls, max_connections=100, dns_workers=50, timeout=90, attempts=3, ttl=3600):
+	## bulk selenium_verify_sso_url() - returns url -> result dict (see selenium_sso_url_result())
+	##   DNS verdicts are cached per hostname and HTTP verdicts per url for ttl seconds
+	results    = {}
+	to_resolve = {}
+	now        = time.time()
+	for sso_url in dict.fromkeys(sso_urls):
+		hostname, reason = selenium_sso_url_precheck(sso_url)
+		if reason is not None:
+			results[sso_url] = selenium_sso_url_result(sso_url, hostname, False, reason)
+			continue
+		cached = sso_url_http_cache.get(sso_url)
+		if cached and now - cached[0] < ttl:
+			results[sso_url] = dict(cached[1], cached=True)
+			continue
+		to_resolve.setdefault(hostname, []).append(sso_url)
+
+	to_fetch = []
+	for hostname, verdict in selenium_sso_url_resolve(to_resolve.keys(), dns_workers, ttl=ttl).items():
+		for sso_url in to_resolve[hostname]:
+			if verdict == "DNS_VALID":
+				to_fetch.append(sso_url)
+			else:
+				results[sso_url] = selenium_sso_url_result(sso_url, hostname, False, verdict)
+
+	for sso_url, result in selenium_sso_url_fetch(to_fetch, max_connections, timeout, attempts).items():
+		sso_url_http_cache[sso_url] = (time.time(), result)
+		results[sso_url] = result
+
+	for sso_url, result in results.items():
+		if result["valid"]:
+			logger.debug(f"selenium_verify_sso_url({sso_url}) SSO_PASSWORD_APP_URL is VALID ({result['status_code']})")
+		else:
+			logger.warning(f"selenium_verify_sso_url({sso_url}) FAILURE_SSO_URL {result['reason']}")
+	return results
+
+def selenium_verify_sso_url(sso_url):
+	return selenium_verify_sso_urls([sso_url])[sso_url]["valid"]
 
 def selenium_app2_passwd_sso(app_name, sso_url, driver):
 	url = "https://entra.microsoft.com/#view/Microsoft_AAD_IAM/StartboardApplicationsMenuBlade/~/AppAppsPreview"
-	driver.get(url)
-	time.sleep(5)
-	## issues with driver.refresh() - so we just quit and start again
-	driver.get(url)
+	timer = SeleniumTimer("selenium_app2_passwd_sso", app_name)
+	selenium_open(driver, url)
+	timer.lap("apps_blade")
 	try:
 		text_box = WebDriverWait(driver, 15).until(
 			EC.any_of(
@@ -242,7 +412,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 		if driver.title == "Sign in to your account":
 			logger.error(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_CLICK_SIGNIN")
 			logger.critical(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_CLICK_SIGNIN")
-			exit(0)
+			raise SeleniumSignInRequired(0)
 		text_box.send_keys(app_name)
 		logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SSO_PASSWORD_APP_URL Entered app_name into the text box")
 	except Exception as e:
@@ -256,6 +426,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 		)
 		link.click()
 		logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SSO_PASSWORD_APP_URL Clicked on the app")
+		timer.lap("search")
 	except Exception as e:
 		logger.warning(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_SSO_URL clicking on the link with the specified text")
 		return False
@@ -267,6 +438,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 		)
 		sso_link.click()
 		logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SSO_PASSWORD_APP_URL Into SSO for application")
+		timer.lap("app_blade")
 	except Exception as e:
 		logger.warning(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_SSO_URL waiting to get into SSO for application")
 		return False
@@ -278,6 +450,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 		)
 		password_based_button.click()
 		logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SSO_PASSWORD_APP_URL Clicked on the 'Password-based' button for app")
+		timer.lap("sso_blade")
 	except Exception as e:
 		logger.warning(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_SSO_URL clicking on the 'Password-based' button for application")
 		return False
@@ -296,8 +469,8 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 	
 	# Click on the "Save" button
 	try:
-		### NOT WORKING RELIABLY...
-		time.sleep(2)
+		### NOT WORKING RELIABLY... the button shows before the blade has settled so wait that out first
+		selenium_wait_ready(driver, 15)
 		save_button = WebDriverWait(driver, 20).until(
 			# EC.element_to_be_clickable((By.XPATH, "//li[@title='Save']//div[@role='button' and @aria-label='Save']"))
 			# EC.element_to_be_clickable((By.XPATH, "//div[@class='azc-toolbarButton-label fxs-commandBar-item-text' and @data-telemetryname='Command-Save' and contains(text(), 'Save')]"))
@@ -310,6 +483,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 		# driver.execute_script("arguments[0].scrollIntoView(true);", save_button)
 		# driver.execute_script("arguments[0].click();", save_button)
 		logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SSO_PASSWORD_APP_URL Clicked on the 'Save' button")
+		timer.lap("url_entry")
 	except Exception as e:
 		logger.warning(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_SSO_URL clicking on the 'Save' button")
 		return False
@@ -338,6 +512,7 @@ def selenium_app2_passwd_sso(app_name, sso_url, driver):
 	except Exception as e:
 		logger.warning(f"selenium_app2_passwd_sso({app_name})({sso_url}) FAILURE_SSO_URL exception on turning on SSO password")
 		return False
+	timer.lap("save")
 	logger.debug(f"selenium_app2_passwd_sso({app_name})({sso_url}) SUCCESS_SSO_URL")
 	return True
 
@@ -356,9 +531,8 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 	
 	url = (f"https://entra.microsoft.com/#view/Microsoft_AAD_IAM/ManagedAppMenuBlade/~/Users/objectId/{sp_id}/appId/{app_aid}/preferredSingleSignOnMode/password/servicePrincipalType/Application/fromNav/")
 	browser_name = driver.capabilities['browserName'].lower()
-	driver.get(url)
-	time.sleep(2)
-	driver.get(url)
+	timer = SeleniumTimer("selenium_passwd_sso_set", f"{app_name}/{group_name}")
+	selenium_open(driver, url)
 
 	try:
 		WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
@@ -371,7 +545,7 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 		if driver.title == "Sign in to your account":
 			logger.error(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_CLICK_SIGNIN")
 			logger.critical(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_CLICK_SIGNIN")
-			exit(0)
+			raise SeleniumSignInRequired(0)
 
 		# Locate the row containing the group name using a more specific XPath
 		row_xpath = f"//tr[.//div[contains(text(), '{group_name}')]]"
@@ -379,6 +553,7 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 			EC.presence_of_element_located((By.XPATH, row_xpath))
 		)
 		logger.debug(f"selenium_passwd_sso_set_sub({app_name})({group_name}) SSO_CREDENTIAL Found the row containing {group_name}")
+		timer.lap("users_blade")
 	except Exception as e:
 		logger.warning(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_SSO_CREDENTIAL INTERFACE finding the parent row for {group_name} {e}")
 		return False
@@ -390,7 +565,6 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 	except Exception as e:
 		logger.warning(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_SSO_CREDENTIAL clicking on the checkbox for group {group_name} {e}")
 		return False
-	time.sleep(1)
 
 	try:
 		xpath = "//div[contains(text(), 'Update credentials')]"
@@ -405,8 +579,8 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 		return False
 	
 	###################################################################################
-	# Wait for the elements to appear
-	time.sleep(2)  
+	# the credentials pane opens as a new blade - the username field wait below covers it appearing
+	timer.lap("select_group")
 	try: 
 		# Switch back to the default content - we need to go up a level to see the popover
 		driver.switch_to.default_content()
@@ -435,6 +609,7 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 		password_field.clear()
 		password_field.send_keys(user_pass_json.get("password"))
 		logger.debug(f"selenium_passwd_sso_set_sub({app_name})({group_name}) SSO_CREDENTIAL  passwd entered")
+		timer.lap("credentials_blade")
 	except Exception as e:
 		logger.warning(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_SSO_CREDENTIAL  password failed")
 		return False
@@ -499,17 +674,107 @@ def selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, user_pass_
 	except Exception as e:
 		logger.warning(f"selenium_passwd_sso_set_sub({app_name})({group_name}) FAILURE_SSO_CREDENTIAL waiting for the success message for ({group_name})")
 		return False
+	timer.lap("save")
 	return True
 
 def selenium_passwd_sso_set(app_name, group_name, app_aid, sp_id, userPassword_json, driver):
 	if not selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, userPassword_json, driver):
-		logger.warning(f"selenium_passwd_sso_set({app_name})({group_name}) FAILURE_SSO_CREDENTIAL failed to set - sleep for 10s / try again")
-		time.sleep(10)
+		logger.warning(f"selenium_passwd_sso_set({app_name})({group_name}) FAILURE_SSO_CREDENTIAL failed to set - wait for the portal to settle / try again")
+		selenium_wait_ready(driver)
 		if not selenium_passwd_sso_set_sub(app_name, group_name, app_aid, sp_id, userPassword_json, driver):
 			logger.warning(f"selenium_passwd_sso_set({app_name})({group_name}) FAILURE_SSO_CREDENTIAL Failed to set")
 			return False
 	return True
 
+###################################################################################
+class SeleniumJournal:
+	## durable per app progress through the provisioning steps (json lines, appended as each step finishes)
+	##   steps: "create" -> "sso_url" -> "credential:<group_name>" (one per group)
+	##   a rerun against the same file skips every step already marked done
+	def __init__(self, journal_file):
+		self.journal_file = journal_file
+		self.lock         = threading.Lock()
+		self.steps        = {}      # app_name -> { step: status }
+		if os.path.exists(journal_file):
+			with open(journal_file, "r") as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except json.JSONDecodeError:
+						continue    # partial line from a crash mid-write
+					self.steps.setdefault(entry["app"], {})[entry["step"]] = entry["status"]
+
+	def is_done(self, app_name, step):
+		return self.steps.get(app_name, {}).get(step) == "done"
+
+	def mark(self, app_name, step, status, detail=None):
+		entry = { "time": datetime.now().isoformat(), "app": app_name, "step": step, "status": status, "detail": detail }
+		with self.lock:
+			self.steps.setdefault(app_name, {})[step] = status
+			with open(self.journal_file, "a") as f:
+				f.write(json.dumps(entry) + "\n")
+				f.flush()
+
+def selenium_provision_step(journal, app_name, step, driver, admin_account, step_function, *args):
+	## runs one step unless the journal has it done - a sign in page means sign in again (if we know the account)
+	##   and retry the step once, otherwise the SeleniumSignInRequired goes up with the journal intact for a rerun
+	if journal.is_done(app_name, step):
+		logger.debug(f"selenium_provision_step({app_name})({step}) already done")
+		return True
+	for attempt in (1, 2):
+		try:
+			status = step_function(*args)
+			break
+		except SeleniumSignInRequired:
+			journal.mark(app_name, step, "signin")
+			if admin_account is None or attempt == 2:
+				raise
+			logger.warning(f"selenium_provision_step({app_name})({step}) FAILURE_CLICK_SIGNIN signing in again")
+			selenium_entra_signin(admin_account, driver)
+	journal.mark(app_name, step, "done" if status else "failed")
+	return status
+
+def selenium_provision_app(journal, entra_client, app_name, sso_url, credentials, driver, admin_account=None):
+	## create -> password sso url -> credentials for each (group_name, user_pass_json) in credentials
+	##   the create goes through graph (Applications.create_non_gallery(), which also returns an app made by an
+	##   earlier run) and only falls back to the portal if that fails - password sso has no graph api so stays here
+	def create():
+		if entra_client.Applications.create_non_gallery(app_name) is not None:
+			return True
+		logger.warning(f"selenium_provision_app({app_name}) graph create failed - using the portal")
+		return selenium_entra_app_create(app_name, driver)
+
+	if not selenium_provision_step(journal, app_name, "create", driver, admin_account, create):
+		return False
+	if not selenium_provision_step(journal, app_name, "sso_url", driver, admin_account, selenium_app2_passwd_sso, app_name, sso_url, driver):
+		return False
+
+	pending = [group_name for group_name, user_pass_json in credentials if not journal.is_done(app_name, f"credential:{group_name}")]
+	if not pending:
+		return True
+	app_aid = entra_client.Applications.get_aid(app_name, True)
+	sp_info = entra_client.Applications.get_service_principal_details(app_name, True)
+	if app_aid is None or sp_info is None:
+		logger.warning(f"selenium_provision_app({app_name}) FAILURE_SSO_CREDENTIAL app or service principal not found")
+		return False
+	status = True
+	for group_name, user_pass_json in credentials:
+		if not selenium_provision_step(journal, app_name, f"credential:{group_name}", driver, admin_account,
+									   selenium_passwd_sso_set, app_name, group_name, app_aid, sp_info["id"], user_pass_json, driver):
+			status = False
+	return status
+
+def selenium_provision_run(journal_file, entra_client, apps, driver, admin_account=None):
+	## apps: [{"app_name": .., "sso_url": .., "credentials": [(group_name, user_pass_json), ...]}]
+	##   safe to rerun with the same journal_file - finished steps are skipped
+	journal   = SeleniumJournal(journal_file)
+	succeeded = 0
+	for app in apps:
+		if selenium_provision_app(journal, entra_client, app["app_name"], app["sso_url"], app.get("credentials", []), driver, admin_account):
+			succeeded += 1
+	logger.info(f"selenium_provision_run({journal_file}) {succeeded}/{len(apps)} apps fully provisioned")
+	return succeeded
+
 ###################################################################################
 ###################################################################################
 from selenium.webdriver.chrome.service import Service
@@ -522,16 +787,17 @@ def selenium_chrome_getver(chrome_binary_location):
     except Exception as e:
         logger.warning(f"Failed to get Chrome version: {str(e)}")
         return None
-def selenium_chrome_setup(user_data_dir, profile_dir, chrome_driver_path, chrome_binary_location):
+def selenium_chrome_setup(user_data_dir, profile_dir, chrome_driver_path, chrome_binary_location, HEADLESS=False, debug_port=9222):
 	## had issues with Chrome and screen saving that did not have time to sort - firefox works so ...
 	chrome_options = Options()
 	chrome_options.add_argument("enable-automation")
 	chrome_options.add_argument("--no-sandbox")
 	chrome_options.add_argument('--disable-gpu')
 	chrome_options.add_argument('--dns-prefetch-disable')
-	chrome_options.add_argument("--remote-debugging-port=9222")  # This is important
+	chrome_options.add_argument(f"--remote-debugging-port={debug_port}")  # This is important (and unique per browser in a pool)
 	chrome_options.add_argument("--window-size=1920,1080")
-	# chrome_options.add_argument("--headless")
+	if HEADLESS:
+		chrome_options.add_argument("--headless=new")
 	# chrome_options.add_argument("--start-maximized")
 	chrome_options.add_argument("--disable-dev-shm-usage")
 
@@ -549,4 +815,89 @@ def selenium_chrome_setup(user_data_dir, profile_dir, chrome_driver_path, chrome
 	driver.set_page_load_timeout(30)
 	return driver
 ###################################################################################
+def selenium_pool_clone_profile(profile_dir, worker):
+	## every browser needs a profile of its own (both firefox and chrome lock theirs) - copy the signed in one, minus the locks
+	clone_dir = tempfile.mkdtemp(prefix=f"selenium_pool_{worker}_")
+	shutil.copytree(profile_dir, clone_dir, dirs_exist_ok=True,
+		ignore=shutil.ignore_patterns("lock", ".parentlock", "parent.lock", "SingletonLock", "SingletonCookie", "SingletonSocket"))
+	return clone_dir
+
+def selenium_pool_launch(worker, profile_dir, tenant_id, driver_path, binary_location, FIREFOX, HEADLESS):
+	clone_dir = selenium_pool_clone_profile(selenium_profile_dir(profile_dir, tenant_id, FIREFOX), worker)
+	if FIREFOX:
+		driver = selenium_firefox_setup(clone_dir, tenant_id, driver_path, binary_location, HEADLESS)
+	else:
+		driver = selenium_chrome_setup(clone_dir, None, driver_path, binary_location, HEADLESS, 9222 + worker)
+	logger.debug(f"selenium_pool_launch({worker}) browser started on profile {clone_dir}")
+	return driver, clone_dir
+
+def selenium_pool_quit(driver, clone_dir):
+	if driver is not None:
+		try:
+			driver.quit()
+		except Exception as e:
+			logger.debug(f"selenium_pool_quit() {str(e)}")
+	if clone_dir is not None:
+		shutil.rmtree(clone_dir, ignore_errors=True)
+
+def selenium_pool_run(jobs, job_function, workers, profile_dir, tenant_id, driver_path, binary_location, FIREFOX=True, HEADLESS=True):
+	## runs job_function(*job, driver) for every job across `workers` browsers, each on its own copy of the profile
+	##   e.g. selenium_pool_run([(app_name, sso_url), ...], selenium_app2_passwd_sso, 4, ...)
+	##   a browser that dies under a job (WebDriverException) is quit, relaunched and the job tried once more
+	##   a worker that lands on the sign-in page (or can't set up its browser) stops taking jobs - whatever is left is marked NOT_RUN
+	##   returns [{"job", "result", "error", "seconds", "worker"}] in the same order as jobs
+	job_queue = queue.Queue()
+	for index, job in enumerate(jobs):
+		job_queue.put((index, tuple(job) if isinstance(job, (list, tuple)) else (job,)))
+	results = [None] * len(jobs)
+
+	def worker_loop(worker):
+		driver, clone_dir = None, None
+		try:
+			while True:
+				try:
+					index, job = job_queue.get_nowait()
+				except queue.Empty:
+					break
+				start_time = time.time()
+				result, error = False, None
+				for attempt in (1, 2):
+					try:
+						if driver is None:
+							driver, clone_dir = selenium_pool_launch(worker, profile_dir, tenant_id, driver_path, binary_location, FIREFOX, HEADLESS)
+						result, error = job_function(*job, driver), None
+						break
+					except WebDriverException as e:
+						logger.warning(f"selenium_pool_run({worker})({job}) FAILURE_BROWSER attempt {attempt} - relaunching: {str(e)}")
+						result, error = False, str(e)
+						selenium_pool_quit(driver, clone_dir)
+						driver, clone_dir = None, None
+					except SeleniumSignInRequired:
+						results[index] = { "job": job, "result": False, "error": "SIGNIN_REQUIRED", "seconds": round(time.time() - start_time, 3), "worker": worker }
+						return
+					except SystemExit as e:
+						## setup exit(1) - missing profile / driver / binary, every relaunch would hit it again
+						logger.error(f"selenium_pool_run({worker})({job}) FAILURE_BROWSER_SETUP exit({e.code}) - worker stopped")
+						results[index] = { "job": job, "result": False, "error": f"EXIT_{e.code}", "seconds": round(time.time() - start_time, 3), "worker": worker }
+						return
+					except Exception as e:
+						result, error = False, str(e)
+						break
+				results[index] = { "job": job, "result": result, "error": error, "seconds": round(time.time() - start_time, 3), "worker": worker }
+		finally:
+			selenium_pool_quit(driver, clone_dir)
+
+	threads = [threading.Thread(target=worker_loop, args=(worker,), daemon=True) for worker in range(workers)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	for index, job in enumerate(jobs):
+		if results[index] is None:
+			results[index] = { "job": job, "result": False, "error": "NOT_RUN", "seconds": 0, "worker": None }
+	succeeded = sum(1 for result in results if result["result"])
+	logger.info(f"selenium_pool_run({job_function.__name__}) {succeeded}/{len(jobs)} jobs succeeded with {workers} browsers")
+	return results
+###################################################################################
 ###################################################################################
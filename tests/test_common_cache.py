@@ -0,0 +1,100 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+##############################################################
+##
+## CacheIO round trips for every codec, and cut off / damaged files read back as None (removed, so the caller
+##   fetches them again) instead of raising
+##
+##############################################################
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pythonCommonCache
+from pythonCommonCache import CacheIO
+
+DATA = { "id": "00000000-0000-0000-0000-000000000001", "displayName": "Mock Group", "members": [f"user{i}" for i in range(500)] }
+
+class CacheIOTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="test-cache-")
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def truncated(self, codec):
+        filename = self.path(f"{codec}.json")
+        CacheIO(codec).write(filename, DATA)
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        with open(filename, 'wb') as f:
+            f.write(raw[:len(raw) // 2])
+        return filename
+
+    def assert_corrupt(self, filename):
+        with self.assertLogs('__COMMONLOGGER__', level='WARNING'):
+            self.assertIsNone(CacheIO().read(filename))
+        self.assertFalse(os.path.exists(filename))
+
+    def test_round_trip(self):
+        for codec in pythonCommonCache.CODECS:
+            if codec == "zstd" and pythonCommonCache.zstandard is None:
+                continue
+            filename = self.path(f"{codec}.json")
+            CacheIO(codec).write(filename, DATA)
+            self.assertEqual(CacheIO().read(filename), DATA)
+
+    def test_missing(self):
+        self.assertIsNone(CacheIO().read(self.path("missing.json")))
+
+    def test_empty(self):
+        filename = self.path("empty.json")
+        open(filename, 'wb').close()
+        self.assert_corrupt(filename)
+
+    def test_truncated_json(self):
+        self.assert_corrupt(self.truncated("none"))
+
+    def test_truncated_gzip(self):
+        self.assert_corrupt(self.truncated("gzip"))
+
+    @unittest.skipIf(pythonCommonCache.zstandard is None, "zstandard not installed")
+    def test_truncated_zstd(self):
+        self.assert_corrupt(self.truncated("zstd"))
+
+    @unittest.skipIf(pythonCommonCache.zstandard is None, "zstandard not installed")
+    def test_damaged_zstd(self):
+        filename = self.path("zstd.json")
+        CacheIO("zstd").write(filename, DATA)
+        with open(filename, 'r+b') as f:
+            f.seek(8)
+            f.write(b'\xff' * 16)
+        self.assert_corrupt(filename)
+
+if __name__ == '__main__':
+    unittest.main()
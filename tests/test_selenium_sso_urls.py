@@ -0,0 +1,156 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## selenium_verify_sso_urls() against a local http.server stub - OK, redirect, DNS failure and timeouts.
+##   getaddrinfo is patched so the DNS cases never leave the machine
+##
+##   python3 -m pytest tests/test_selenium_sso_urls.py   (or python3 -m unittest discover tests)
+##
+##############################################################
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SKIP_REASON = None
+try:
+    import pythonSeleniumLib
+except ImportError as e:     # selenium / pycurl not installed
+    pythonSeleniumLib = None
+    SKIP_REASON = f"pythonSeleniumLib needs selenium and pycurl ({e})"
+
+SLOW_SECONDS = 3
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/ok":
+            self.send_response(200)
+        elif self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/ok")
+        elif self.path == "/redirect-missing":
+            self.send_response(302)
+            self.send_header("Location", "/missing")
+        elif self.path == "/slow":
+            time.sleep(SLOW_SECONDS)
+            self.send_response(200)
+        else:
+            self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+real_getaddrinfo = socket.getaddrinfo
+
+def fake_getaddrinfo(host, *args, **kwargs):
+    if host.endswith(".invalid"):
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+    if host.startswith("slow-dns."):
+        time.sleep(SLOW_SECONDS)
+    return real_getaddrinfo("127.0.0.1", *args, **kwargs)
+
+@unittest.skipIf(pythonSeleniumLib is None, SKIP_REASON)
+class VerifySsoUrlsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        pythonSeleniumLib.sso_url_dns_cache.clear()
+        pythonSeleniumLib.sso_url_http_cache.clear()
+        patcher = mock.patch("socket.getaddrinfo", side_effect=fake_getaddrinfo)
+        self.getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def verify(self, sso_url, **kwargs):
+        return pythonSeleniumLib.selenium_verify_sso_urls([sso_url], **kwargs)[sso_url]
+
+    def test_ok(self):
+        result = self.verify(f"{self.base}/ok")
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["reason"], "HTTP_VALID")
+        self.assertEqual(result["status_code"], 200)
+        self.assertEqual(result["attempts"], 1)
+
+    def test_ok_is_cached(self):
+        self.verify(f"{self.base}/ok")
+        result = self.verify(f"{self.base}/ok")
+        self.assertTrue(result["valid"])
+        self.assertTrue(result["cached"])
+
+    def test_redirect_followed(self):
+        result = self.verify(f"{self.base}/redirect")
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["status_code"], 200)
+
+    def test_redirect_to_missing_page(self):
+        result = self.verify(f"{self.base}/redirect-missing", attempts=2)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["reason"], "HTTP_INVALID")
+        self.assertEqual(result["status_code"], 404)
+        self.assertEqual(result["attempts"], 2)
+
+    def test_dns_failure(self):
+        result = self.verify("https://no-such-app.invalid/login")
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["reason"], "DNS_INVALID")
+        self.assertIn("no-such-app.invalid", pythonSeleniumLib.sso_url_dns_cache)
+
+    def test_dns_timeout_not_cached(self):
+        verdicts = pythonSeleniumLib.selenium_sso_url_resolve(["slow-dns.example.com"], dns_timeout=0.5)
+        self.assertEqual(verdicts["slow-dns.example.com"], "DNS_TIMEOUT")
+        self.assertNotIn("slow-dns.example.com", pythonSeleniumLib.sso_url_dns_cache)
+
+    def test_http_timeout(self):
+        result = self.verify(f"{self.base}/slow", timeout=1, attempts=1)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["reason"], "HTTP_INVALID")
+        self.assertIsNone(result["status_code"])
+
+    def test_precheck_failures_skip_the_network(self):
+        results = pythonSeleniumLib.selenium_verify_sso_urls(["", "http://localhost/login", "not a url"])
+        self.assertEqual(results[""]["reason"], "EMPTY")
+        self.assertEqual(results["http://localhost/login"]["reason"], "LOCALHOST")
+        self.assertEqual(results["not a url"]["reason"], "NO_HOSTNAME")
+        self.getaddrinfo.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
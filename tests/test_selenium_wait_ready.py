@@ -0,0 +1,104 @@
+"""
+MIT License
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+##############################################################
+##
+## selenium_open() / selenium_wait_ready() in a real headless browser against the pages in tests/fixtures,
+##   which mimic the portal blade progress indicators (settling, re-rendering, never settling)
+##
+##   firefox is tried first, then chrome - skipped when neither browser / driver can be started
+##
+##############################################################
+
+import os
+import sys
+import time
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pythonSeleniumLib
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import WebDriverException
+except ImportError:     # selenium / pycurl not installed
+    pythonSeleniumLib = None
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def fixture_url(name):
+    return f"file://{os.path.join(FIXTURES, name)}"
+
+def headless_driver():
+    firefox_options = webdriver.FirefoxOptions()
+    firefox_options.add_argument("--headless")
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    for launch in (lambda: webdriver.Firefox(options=firefox_options), lambda: webdriver.Chrome(options=chrome_options)):
+        try:
+            return launch()
+        except WebDriverException:
+            continue
+    return None
+
+@unittest.skipIf(pythonSeleniumLib is None, "pythonSeleniumLib needs selenium and pycurl")
+class WaitReadyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.driver = headless_driver()
+        if cls.driver is None:
+            raise unittest.SkipTest("no headless firefox or chrome available")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.driver.quit()
+
+    def settled(self):
+        return len(self.driver.find_elements(By.ID, "settled")) == 1
+
+    def test_ready_page(self):
+        start = time.time()
+        self.assertTrue(pythonSeleniumLib.selenium_open(self.driver, fixture_url("ready.html"), timeout=5))
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(self.settled())
+
+    def test_waits_for_the_progress_indicator(self):
+        self.assertTrue(pythonSeleniumLib.selenium_open(self.driver, fixture_url("loading.html"), timeout=10))
+        self.assertTrue(self.settled())
+
+    def test_progress_indicator_rerendered(self):
+        self.assertTrue(pythonSeleniumLib.selenium_open(self.driver, fixture_url("rerender.html"), timeout=10))
+        self.assertTrue(self.settled())
+
+    def test_gives_up_after_timeout(self):
+        start = time.time()
+        self.assertFalse(pythonSeleniumLib.selenium_open(self.driver, fixture_url("stuck.html"), timeout=2))
+        self.assertLess(time.time() - start, 10)
+
+    def test_wait_ready_on_current_page(self):
+        self.driver.get(fixture_url("loading.html"))
+        self.assertTrue(pythonSeleniumLib.selenium_wait_ready(self.driver, timeout=10))
+        self.assertTrue(self.settled())
+
+if __name__ == '__main__':
+    unittest.main()